@@ -0,0 +1,103 @@
+"""
+Database connection profile for the settings module.
+
+Every knob comes from the environment so one build can run under
+gunicorn, an ASGI server or a single-process SQLite deployment:
+
+Postgres (``DATABASE_URL=postgres://...``)
+    DB_POOL=True           server-side pooling through psycopg_pool; required
+                           for ASGI, where persistent connections are never reused
+    DB_POOL_MIN_SIZE       connections each worker keeps open (default 1)
+    DB_POOL_MAX_SIZE       per-worker cap; defaults to DB_MAX_CONNECTIONS split
+                           across WEB_CONCURRENCY workers, or 4
+    DB_POOL_TIMEOUT        seconds a request waits for a free connection (default 10)
+    DB_CONN_MAX_AGE        persistent connection lifetime when not pooling (default 600)
+
+SQLite (no DATABASE_URL, or a sqlite:// one)
+    DB_SQLITE_BUSY_TIMEOUT  milliseconds a writer waits for the lock (default 5000)
+
+Health checks (DB_CONN_HEALTH_CHECKS, on by default) make Django ping a
+reused connection before the first query of a request instead of failing
+it when the server has dropped the connection.
+"""
+import os
+import dj_database_url
+
+# Applied to every new SQLite connection. WAL lets readers run alongside
+# the single writer, and NORMAL sync is crash-safe in WAL mode.
+SQLITE_PRAGMAS = (
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA cache_size = -20000",
+    "PRAGMA mmap_size = 134217728",
+)
+
+
+def env_flag(name, default):
+    return os.getenv(name, str(default)) == 'True'
+
+
+def env_int(name, default):
+    value = os.getenv(name)
+    return int(value) if value else default
+
+
+def pool_max_size():
+    """Per-worker pool cap, so that all workers together stay under the server's limit"""
+    if os.getenv('DB_POOL_MAX_SIZE'):
+        return int(os.getenv('DB_POOL_MAX_SIZE'))
+    max_connections = env_int('DB_MAX_CONNECTIONS', 0)
+    if max_connections:
+        return max(1, max_connections // env_int('WEB_CONCURRENCY', 1))
+    return 4
+
+
+def sqlite_options(busy_timeout):
+    return {
+        # Passed to sqlite3.connect(), which installs the busy handler
+        'timeout': busy_timeout / 1000,
+        'init_command': '; '.join(SQLITE_PRAGMAS),
+        # Take the write lock when the transaction starts instead of failing
+        # with "database is locked" when a reader later tries to write
+        'transaction_mode': 'IMMEDIATE',
+    }
+
+
+def postgres_options(pool):
+    if not pool:
+        return {}
+    from psycopg_pool import ConnectionPool
+    return {
+        'pool': {
+            'min_size': env_int('DB_POOL_MIN_SIZE', 1),
+            'max_size': pool_max_size(),
+            'timeout': env_int('DB_POOL_TIMEOUT', 10),
+            # Recycle connections so server-side memory and failovers settle
+            'max_lifetime': env_int('DB_POOL_MAX_LIFETIME', 1800),
+            'max_idle': env_int('DB_POOL_MAX_IDLE', 300),
+            'check': ConnectionPool.check_connection,
+        },
+    }
+
+
+def database_config(url, sqlite_path):
+    """Build the ``default`` entry of DATABASES for the current environment"""
+    pool = env_flag('DB_POOL', False)
+    if url:
+        config = dj_database_url.parse(url)
+    else:
+        config = {'ENGINE': 'django.db.backends.sqlite3', 'NAME': sqlite_path}
+
+    options = config.setdefault('OPTIONS', {})
+    if config['ENGINE'] == 'django.db.backends.sqlite3':
+        options.update(sqlite_options(env_int('DB_SQLITE_BUSY_TIMEOUT', 5000)))
+        config['CONN_MAX_AGE'] = env_int('DB_CONN_MAX_AGE', 600)
+    elif config['ENGINE'] == 'django.db.backends.postgresql':
+        options.update(postgres_options(pool))
+        # The pool owns connection lifetime; Django refuses persistent connections on top of it
+        config['CONN_MAX_AGE'] = 0 if pool else env_int('DB_CONN_MAX_AGE', 600)
+    else:
+        config['CONN_MAX_AGE'] = env_int('DB_CONN_MAX_AGE', 600)
+    config['CONN_HEALTH_CHECKS'] = env_flag('DB_CONN_HEALTH_CHECKS', True)
+    return config
@@ -11,8 +11,9 @@ https://docs.djangoproject.com/en/6.0/ref/settings/
 """
 
 from pathlib import Path
+from decimal import Decimal
 import os
-import dj_database_url
+from .database import database_config
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -47,6 +48,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.RequestMetricsMiddleware',
+    'core.middleware.ReplicaPinMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -81,20 +84,22 @@ WSGI_APPLICATION = 'bankapp.wsgi.application'
 # https://docs.djangoproject.com/en/6.0/ref/settings/#databases
 
 # Use PostgreSQL on Render, SQLite locally
-if os.getenv('DATABASE_URL'):
-    DATABASES = {
-        'default': dj_database_url.config(
-            default=os.getenv('DATABASE_URL'),
-            conn_max_age=600
-        )
-    }
-else:
-    DATABASES = {
-        'default': {
-            'ENGINE': 'django.db.backends.sqlite3',
-            'NAME': BASE_DIR / 'db.sqlite3',
-        }
-    }
+# Connection pooling, SQLite pragmas and per-worker limits are configured
+# from the environment, see bankapp/database.py
+DATABASES = {
+    'default': database_config(os.getenv('DATABASE_URL'), BASE_DIR / 'db.sqlite3'),
+}
+
+# Optional read replica for history and reporting views (core/routers.py).
+# A second SQLite file works for trying the routing out locally.
+if os.getenv('DATABASE_REPLICA_URL'):
+    DATABASES['replica'] = database_config(os.getenv('DATABASE_REPLICA_URL'), None)
+    DATABASES['replica']['TEST'] = {'MIRROR': 'default'}
+
+DATABASE_ROUTERS = ['core.routers.ReplicaRouter']
+
+# Seconds a client keeps reading from the primary after it writes
+REPLICA_PIN_SECONDS = int(os.getenv('REPLICA_PIN_SECONDS', '5'))
 
 
 # Password validation
@@ -115,6 +120,30 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# Password hashing profile (core/hashers.py): 'pbkdf2', 'scrypt' or 'argon2'
+# (needs argon2-cffi). Passwords move to the chosen hasher as users log in.
+PASSWORD_HASHER = os.getenv('PASSWORD_HASHER', 'pbkdf2')
+_PASSWORD_HASHER_PROFILES = {
+    'pbkdf2': 'core.hashers.PBKDF2PasswordHasher',
+    'scrypt': 'core.hashers.ScryptPasswordHasher',
+    'argon2': 'core.hashers.Argon2PasswordHasher',
+}
+PASSWORD_HASHERS = [_PASSWORD_HASHER_PROFILES[PASSWORD_HASHER]] + [
+    path for name, path in _PASSWORD_HASHER_PROFILES.items() if name != PASSWORD_HASHER
+]
+# 0 keeps Django's default iteration count
+PBKDF2_ITERATIONS = int(os.getenv('PBKDF2_ITERATIONS', '0'))
+SCRYPT_WORK_FACTOR = int(os.getenv('SCRYPT_WORK_FACTOR', str(2 ** 14)))
+SCRYPT_BLOCK_SIZE = int(os.getenv('SCRYPT_BLOCK_SIZE', '8'))
+SCRYPT_PARALLELISM = int(os.getenv('SCRYPT_PARALLELISM', '1'))
+ARGON2_TIME_COST = int(os.getenv('ARGON2_TIME_COST', '2'))
+ARGON2_MEMORY_COST = int(os.getenv('ARGON2_MEMORY_COST', '19456'))
+ARGON2_PARALLELISM = int(os.getenv('ARGON2_PARALLELISM', '1'))
+
+AUTHENTICATION_BACKENDS = ['core.hashers.PasswordCheckBackend']
+# Threads per process that run login password hashing; 0 hashes on the request's thread
+PASSWORD_HASH_WORKERS = int(os.getenv('PASSWORD_HASH_WORKERS', str(os.cpu_count() or 1)))
+
 
 # Internationalization
 # https://docs.djangoproject.com/en/6.0/topics/i18n/
@@ -156,3 +185,63 @@ CSRF_TRUSTED_ORIGINS = []
 # Session settings
 SESSION_ENGINE = 'django.contrib.sessions.backends.db'
 
+# Request metrics
+# Scrapers authenticate with "Authorization: Bearer <METRICS_TOKEN>"; without a
+# token the /metrics/ endpoint is only open to staff users.
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+SERVER_TIMING = os.getenv('SERVER_TIMING', 'True') == 'True'
+
+# Throttling for login and money movement (core/ratelimit.py). Buckets live
+# in RATE_LIMIT_CACHE; give it a shared backend (file or database cache) when
+# running several workers. Set RATE_LIMIT_ENABLED=False for load tests.
+RATE_LIMIT_ENABLED = os.getenv('RATE_LIMIT_ENABLED', 'True') == 'True'
+RATE_LIMIT_CACHE = os.getenv('RATE_LIMIT_CACHE', 'default')
+# Number of reverse proxies in front of the app that append to X-Forwarded-For
+RATE_LIMIT_PROXY_COUNT = int(os.getenv('RATE_LIMIT_PROXY_COUNT', '0'))
+RATE_LIMITS = {
+    'login': {'ip': '10/m'},
+    'transfer': {'user': '10/m', 'ip': '30/m'},
+    'withdraw': {'user': '10/m', 'ip': '30/m'},
+    'pay_bill': {'user': '10/m', 'ip': '30/m'},
+    'change_pin': {'user': '5/m'},
+}
+# Per-account limits on outgoing money, 0 turns a rule off
+VELOCITY_LIMITS = {
+    'transfers_per_minute': int(os.getenv('VELOCITY_TRANSFERS_PER_MINUTE', '5')),
+    'amount_per_hour': Decimal(os.getenv('VELOCITY_AMOUNT_PER_HOUR', '10000')),
+}
+
+# Risk scoring of outgoing payments (core/fraud.py); scores at or above
+# FRAUD_ALERT_SCORE send the customer a security notification
+FRAUD_SCORING_ENABLED = os.getenv('FRAUD_SCORING_ENABLED', 'True') == 'True'
+FRAUD_ALERT_SCORE = float(os.getenv('FRAUD_ALERT_SCORE', '0.6'))
+# Seconds an account's in-memory history is trusted before it is reloaded
+FRAUD_PROFILE_TTL = int(os.getenv('FRAUD_PROFILE_TTL', '900'))
+FRAUD_PROFILE_CACHE_SIZE = int(os.getenv('FRAUD_PROFILE_CACHE_SIZE', '100000'))
+
+# Transaction PINs (core/pins.py). The pepper is what protects stored PINs,
+# so set PIN_PEPPER in production and keep it out of the database. When it
+# is rotated, list the old ones (comma separated) in PIN_PEPPER_FALLBACKS
+# until every PIN has been used once and rehashed.
+PIN_PEPPER = os.getenv('PIN_PEPPER', '')
+PIN_PEPPER_FALLBACKS = [pepper for pepper in os.getenv('PIN_PEPPER_FALLBACKS', '').split(',') if pepper]
+PIN_HASH_ITERATIONS = int(os.getenv('PIN_HASH_ITERATIONS', '5000'))
+PIN_MAX_ATTEMPTS = int(os.getenv('PIN_MAX_ATTEMPTS', '5'))
+PIN_LOCKOUT_SECONDS = int(os.getenv('PIN_LOCKOUT_SECONDS', '900'))
+
+# Multi-currency accounts (core/fx.py). FX_RATES_FILE holds currency,rate
+# rows giving the value of one unit in BASE_CURRENCY; workers re-read it
+# within FX_RATES_CHECK_SECONDS of it changing.
+BASE_CURRENCY = os.getenv('BASE_CURRENCY', 'USD')
+FX_RATES_FILE = os.getenv('FX_RATES_FILE', BASE_DIR / 'fx_rates.csv')
+FX_RATES_CHECK_SECONDS = int(os.getenv('FX_RATES_CHECK_SECONDS', '30'))
+
+# Savings interest (core/interest.py): annual rate in percent, accrued
+# daily on each day's average balance and credited monthly
+SAVINGS_INTEREST_RATE = Decimal(os.getenv('SAVINGS_INTEREST_RATE', '3.50'))
+INTEREST_DAY_COUNT = int(os.getenv('INTEREST_DAY_COUNT', '365'))
+
+# Receipts are served immutable for a year (web/views.py); bump this to
+# invalidate every cached copy when something outside the receipt template
+# that it renders changes
+RECEIPT_CACHE_VERSION = os.getenv('RECEIPT_CACHE_VERSION', '1')
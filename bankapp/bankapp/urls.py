@@ -16,8 +16,10 @@ Including another URLconf
 """
 from django.contrib import admin
 from django.urls import path, include
+from core import views as core_views
 
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path('metrics/', core_views.metrics, name='metrics'),
     path('', include('web.urls')),
 ]
@@ -1,9 +1,120 @@
-from django.contrib import admin
+from django.contrib import admin, messages
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Count, Sum
+from django.http import StreamingHttpResponse
+from django.utils.functional import cached_property
 from django.utils import timezone
-from .models import User, BankAccount, Transaction, ProfileUpdate, Notification, DebitCard, CardApplication, Loan, BankStatement, BillPayment, Review, Receipt
+from django.utils.decorators import method_decorator
+from .models import User, BankAccount, Transaction, ProfileUpdate, Notification, DebitCard, CardApplication, Loan, BankStatement, BillPayment, Review, Receipt, TransactionArchive, ReceiptArchive, JournalEntry, Posting, DailyActivity, ScheduledTransfer, FxRevaluation, InterestAccrual, FeedImport, FeedDeposit
+from .routers import replica_reads
+from .search import search, parse_search_terms
+from .services import disburse_loans
+import csv
+
+def estimated_row_count(model, using):
+    """The planner's idea of a table's size, or None where the database has no cheap estimate"""
+    connection = connections[using]
+    table = model._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == "postgresql":
+            cursor.execute("SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass", [table])
+        elif connection.vendor == "sqlite":
+            # Read straight off both ends of the B-tree; never below the row count, and
+            # equal to it until rows other than the oldest are deleted
+            cursor.execute(f"SELECT max(rowid) - min(rowid) + 1 FROM {connection.ops.quote_name(table)}")
+        elif connection.vendor == "mysql":
+            cursor.execute("SELECT table_rows FROM information_schema.tables WHERE table_schema = DATABASE() AND table_name = %s", [table])
+        else:
+            return None
+        row = cursor.fetchone()
+    # Postgres reports -1 for tables that were never analyzed
+    return row[0] if row and row[0] is not None and row[0] >= 0 else None
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator that doesn't COUNT(*) big tables.
+
+    Unfiltered changelists use the database's estimate once it passes
+    ``estimate_threshold`` rows and count exactly below that; filtered ones
+    count at most ``exact_limit + 1`` rows, so pages past the limit aren't
+    offered. An estimate that overshoots, as SQLite's does after archiving
+    deletes rows, is replaced by the exact count when a page past the last
+    row is asked for, and that last page is shown instead.
+    """
+    exact_limit = 10000
+    estimate_threshold = 1000000
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not queryset.query.where:
+            estimate = estimated_row_count(queryset.model, queryset.db)
+            if estimate is not None and estimate > self.estimate_threshold:
+                return estimate
+            if estimate is not None and estimate > self.exact_limit:
+                return queryset.count()
+        return min(queryset[:self.exact_limit + 1].count(), self.exact_limit)
+
+    def page(self, number):
+        page = super().page(number)
+        if page.number > 1 and not page.object_list:
+            self.__dict__["count"] = self.object_list.count()
+            self.__dict__.pop("num_pages", None)
+            return super().page(min(page.number, self.num_pages))
+        return page
+
+class Echo:
+    """Pseudo-buffer for csv.writer that hands each line back instead of storing it"""
+    def write(self, value):
+        return value
+
+def csv_safe(value):
+    # Spreadsheets run text starting with these as formulas
+    if isinstance(value, str) and value[:1] in ("=", "+", "-", "@", "\t", "\r"):
+        return "'" + value
+    return value
+
+class BaseAdmin(admin.ModelAdmin):
+    """Changelist defaults that hold up at millions of rows"""
+    paginator = EstimatedCountPaginator
+    # Skips the second, unfiltered COUNT(*) behind "N results (M total)"
+    show_full_result_count = False
+    # Columns of the CSV export, lookups allowed; defaults to the model's own columns
+    export_fields = None
+    export_chunk_size = 2000
+
+    def export_as_csv(self, request, queryset):
+        fields = self.export_fields or [field.attname for field in self.model._meta.concrete_fields]
+        writer = csv.writer(Echo())
+
+        def rows():
+            yield writer.writerow(fields)
+            # values_list + iterator keeps memory flat however many rows are selected
+            for row in queryset.values_list(*fields).iterator(chunk_size=self.export_chunk_size):
+                yield writer.writerow([csv_safe(value) for value in row])
+
+        response = StreamingHttpResponse(rows(), content_type='text/csv')
+        filename = f"{self.model._meta.model_name}_{timezone.now():%Y%m%d_%H%M%S}.csv"
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
+    export_as_csv.short_description = "Export selected as CSV"
+
+class IndexedSearchMixin:
+    """Changelist search through core.search's indexes instead of icontains over search_fields"""
+    search_help_text = "Reference, account number, email or words from the description. Also ref:, account:, amount:10..50, date:2025-01-01..2025-01-31"
+
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term.strip():
+            return queryset, False
+        try:
+            criteria = parse_search_terms(search_term)
+        except ValueError as e:
+            self.message_user(request, str(e), messages.ERROR)
+            return queryset.none(), False
+        return search(queryset, **criteria), False
 
 @admin.register(User)
-class UserAdmin(admin.ModelAdmin):
+class UserAdmin(BaseAdmin):
     list_display = ('email', 'first_name', 'last_name', 'is_approved', 'is_active', 'date_joined')
     list_filter = ('is_approved', 'is_active', 'date_joined')
     search_fields = ('email', 'first_name', 'last_name')
@@ -28,22 +139,94 @@ class UserAdmin(admin.ModelAdmin):
     disapprove_users.short_description = "Disapprove selected users"
 
 @admin.register(BankAccount)
-class BankAccountAdmin(admin.ModelAdmin):
-    list_display = ('account_number', 'user', 'account_type', 'balance', 'is_active')
-    list_filter = ('account_type', 'is_active')
+class BankAccountAdmin(BaseAdmin):
+    list_display = ('account_number', 'user', 'account_type', 'balance', 'currency', 'is_active')
+    list_filter = ('account_type', 'currency', 'is_active')
     search_fields = ('account_number', 'user__email')
+    list_select_related = ('user',)
+    ordering = ('account_number',)
+    autocomplete_fields = ('user',)
 
 @admin.register(Transaction)
-class TransactionAdmin(admin.ModelAdmin):
+class TransactionAdmin(IndexedSearchMixin, BaseAdmin):
     list_display = ('transaction_type', 'account', 'amount', 'timestamp')
     list_filter = ('transaction_type', 'timestamp')
-    search_fields = ('account__account_number', 'description')
+    search_fields = ('receipt__reference_number', 'description')
+    export_fields = ('id', 'timestamp', 'transaction_type', 'account__account_number', 'amount', 'description', 'receipt__reference_number')
+    actions = ['export_as_csv']
+    list_select_related = ('account__user',)
+    autocomplete_fields = ('account',)
+    raw_id_fields = ('receipt',)
+    date_hierarchy = 'timestamp'
+
+class PostingInline(admin.TabularInline):
+    model = Posting
+    fields = ('account', 'external_account', 'amount')
+    readonly_fields = ('account', 'external_account', 'amount')
+    extra = 0
+    can_delete = False
+
+@admin.register(JournalEntry)
+class JournalEntryAdmin(BaseAdmin):
+    list_display = ('entry_type', 'description', 'created_at')
+    list_filter = ('entry_type', 'created_at')
+    search_fields = ('description', 'postings__account__account_number')
+    export_fields = ('id', 'created_at', 'entry_type', 'description')
+    actions = ['export_as_csv']
+    date_hierarchy = 'created_at'
+    readonly_fields = ('id', 'entry_type', 'description', 'created_at')
+    inlines = [PostingInline]
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+@admin.register(DailyActivity)
+class DailyActivityAdmin(BaseAdmin):
+    list_display = ('day', 'account', 'category', 'money_in', 'money_out', 'count')
+    list_filter = ('category', 'day')
+    search_fields = ('account__account_number',)
+    export_fields = ('day', 'account__account_number', 'category', 'money_in', 'money_out', 'count')
+    actions = ['export_as_csv']
+    list_select_related = ('account__user',)
+    date_hierarchy = 'day'
+    readonly_fields = ('account', 'day', 'category', 'money_in', 'money_out', 'count')
+
+    # Days shown in the volume report above the changelist
+    report_days = 31
+
+    def has_add_permission(self, request):
+        return False
+
+    @method_decorator(replica_reads)
+    def changelist_view(self, request, extra_context=None):
+        response = super().changelist_view(request, extra_context)
+        changelist = getattr(response, 'context_data', {}).get('cl')
+        if changelist is not None:
+            latest = changelist.queryset.order_by('-day').values_list('day', flat=True).first()
+            if latest:
+                response.context_data['daily_volume'] = (
+                    changelist.queryset
+                    .filter(day__gt=latest - timezone.timedelta(days=self.report_days))
+                    .values('day', 'category')
+                    .annotate(
+                        money_in=Sum('money_in'),
+                        money_out=Sum('money_out'),
+                        count=Sum('count'),
+                        accounts=Count('account', distinct=True),
+                    )
+                    .order_by('-day', 'category')
+                )
+        return response
 
 @admin.register(ProfileUpdate)
-class ProfileUpdateAdmin(admin.ModelAdmin):
+class ProfileUpdateAdmin(BaseAdmin):
     list_display = ('user', 'status', 'requested_at', 'reviewed_by', 'reviewed_at')
     list_filter = ('status', 'requested_at')
     search_fields = ('user__email', 'user__first_name', 'user__last_name')
+    list_select_related = ('user', 'reviewed_by')
     readonly_fields = ('user', 'requested_at', 'reviewed_at', 'reviewed_by')
     fieldsets = (
         ('User Info', {'fields': ('user', 'requested_at')}),
@@ -65,10 +248,12 @@ class ProfileUpdateAdmin(admin.ModelAdmin):
     reject_updates.short_description = "Reject selected profile updates"
 
 @admin.register(Notification)
-class NotificationAdmin(admin.ModelAdmin):
+class NotificationAdmin(BaseAdmin):
     list_display = ('user', 'title', 'notification_type', 'is_read', 'created_at')
     list_filter = ('notification_type', 'is_read', 'created_at')
     search_fields = ('user__email', 'title', 'message')
+    list_select_related = ('user',)
+    date_hierarchy = 'created_at'
     readonly_fields = ('user', 'title', 'message', 'notification_type', 'created_at')
     
     actions = ['mark_as_read', 'mark_as_unread']
@@ -84,10 +269,12 @@ class NotificationAdmin(admin.ModelAdmin):
     mark_as_unread.short_description = "Mark selected as unread"
 
 @admin.register(DebitCard)
-class DebitCardAdmin(admin.ModelAdmin):
+class DebitCardAdmin(BaseAdmin):
     list_display = ('user', 'card_number', 'card_holder_name', 'status', 'card_fee_paid', 'issued_at')
     list_filter = ('status', 'card_fee_paid', 'created_at')
     search_fields = ('user__email', 'card_number', 'card_holder_name')
+    list_select_related = ('user',)
+    autocomplete_fields = ('user',)
     readonly_fields = ('card_number', 'cvv', 'expiry_date', 'created_at', 'issued_at', 'id')
     fieldsets = (
         ('Card Information', {'fields': ('id', 'user', 'card_number', 'card_holder_name')}),
@@ -110,10 +297,12 @@ class DebitCardAdmin(admin.ModelAdmin):
 
 
 @admin.register(CardApplication)
-class CardApplicationAdmin(admin.ModelAdmin):
+class CardApplicationAdmin(BaseAdmin):
     list_display = ('user', 'card_type', 'status', 'created_at', 'reviewed_at')
     list_filter = ('status', 'card_type', 'created_at')
     search_fields = ('user__email', 'purpose')
+    list_select_related = ('user',)
+    autocomplete_fields = ('user', 'reviewed_by')
     readonly_fields = ('id', 'created_at', 'updated_at', 'reviewed_at')
     fieldsets = (
         ('Application Info', {'fields': ('id', 'user', 'card_type', 'purpose')}),
@@ -139,10 +328,13 @@ class CardApplicationAdmin(admin.ModelAdmin):
 
 
 @admin.register(Loan)
-class LoanAdmin(admin.ModelAdmin):
+class LoanAdmin(BaseAdmin):
     list_display = ('user', 'loan_type', 'loan_amount', 'status', 'created_at', 'reviewed_at')
     list_filter = ('status', 'loan_type', 'created_at')
     search_fields = ('user__email', 'purpose')
+    export_fields = ('id', 'created_at', 'user__email', 'loan_type', 'loan_amount', 'interest_rate', 'loan_term_months', 'monthly_payment', 'total_repayment', 'status', 'reviewed_at', 'disbursed_amount', 'disbursed_at')
+    list_select_related = ('user',)
+    autocomplete_fields = ('user', 'reviewed_by')
     readonly_fields = ('id', 'created_at', 'updated_at', 'reviewed_at', 'monthly_payment', 'total_repayment', 'disbursed_at')
     fieldsets = (
         ('Application Info', {'fields': ('id', 'user', 'loan_type', 'loan_amount', 'interest_rate', 'loan_term_months')}),
@@ -153,7 +345,7 @@ class LoanAdmin(admin.ModelAdmin):
         ('Timestamps', {'fields': ('created_at', 'updated_at')}),
     )
 
-    actions = ['approve_loans', 'reject_loans', 'disburse_loans']
+    actions = ['approve_loans', 'reject_loans', 'disburse_loans', 'export_as_csv']
 
     def approve_loans(self, request, queryset):
         for loan in queryset.filter(status='PENDING'):
@@ -170,23 +362,21 @@ class LoanAdmin(admin.ModelAdmin):
     reject_loans.short_description = "Reject selected loan applications"
 
     def disburse_loans(self, request, queryset):
-        count = 0
-        for loan in queryset.filter(status='APPROVED'):
-            try:
-                loan.disburse()
-                count += 1
-            except Exception as e:
-                self.message_user(request, f"Error disbursing loan for {loan.user.email}: {str(e)}", level='error')
-        self.message_user(request, f"Disbursed {count} loan(s).")
+        disbursed, errors = disburse_loans(queryset.filter(status='APPROVED').values_list('pk', flat=True))
+        for loan in Loan.objects.filter(pk__in=errors).select_related('user'):
+            self.message_user(request, f"Error disbursing loan for {loan.user.email}: {errors[loan.pk]}", level='error')
+        self.message_user(request, f"Disbursed {len(disbursed)} loan(s).")
 
     disburse_loans.short_description = "Disburse approved loans"
 
 
 @admin.register(BankStatement)
-class BankStatementAdmin(admin.ModelAdmin):
+class BankStatementAdmin(BaseAdmin):
     list_display = ('user', 'start_date', 'end_date', 'status', 'transaction_count', 'requested_at')
     list_filter = ('status', 'format_type', 'requested_at')
     search_fields = ('user__email',)
+    list_select_related = ('user',)
+    autocomplete_fields = ('user',)
     readonly_fields = ('id', 'requested_at', 'generated_at', 'transaction_count', 'opening_balance', 'closing_balance')
     fieldsets = (
         ('Request Info', {'fields': ('id', 'user', 'start_date', 'end_date', 'format_type')}),
@@ -205,10 +395,14 @@ class BankStatementAdmin(admin.ModelAdmin):
 
 
 @admin.register(BillPayment)
-class BillPaymentAdmin(admin.ModelAdmin):
+class BillPaymentAdmin(IndexedSearchMixin, BaseAdmin):
     list_display = ('user', 'bill_type', 'provider_name', 'amount', 'status', 'due_date', 'created_at')
     list_filter = ('status', 'bill_type', 'due_date', 'created_at')
     search_fields = ('user__email', 'provider_name', 'account_number', 'reference_number')
+    export_fields = ('id', 'created_at', 'reference_number', 'user__email', 'bill_type', 'provider_name', 'account_number', 'amount', 'status', 'due_date', 'paid_at')
+    list_select_related = ('user',)
+    autocomplete_fields = ('user',)
+    date_hierarchy = 'created_at'
     readonly_fields = ('id', 'created_at', 'updated_at', 'paid_at', 'reference_number')
     fieldsets = (
         ('Payment Info', {'fields': ('id', 'user', 'bill_type', 'provider_name', 'account_number')}),
@@ -217,7 +411,7 @@ class BillPaymentAdmin(admin.ModelAdmin):
         ('Timestamps', {'fields': ('created_at', 'updated_at', 'paid_at')}),
     )
 
-    actions = ['mark_as_completed', 'mark_as_failed']
+    actions = ['mark_as_completed', 'mark_as_failed', 'export_as_csv']
 
     def mark_as_completed(self, request, queryset):
         queryset.update(status='COMPLETED', paid_at=timezone.now())
@@ -232,7 +426,7 @@ class BillPaymentAdmin(admin.ModelAdmin):
     mark_as_failed.short_description = "Mark selected payments as failed"
 
 @admin.register(Review)
-class ReviewAdmin(admin.ModelAdmin):
+class ReviewAdmin(BaseAdmin):
     list_display = ('name', 'rating', 'title', 'is_approved', 'created_at')
     list_filter = ('rating', 'is_approved', 'created_at')
     search_fields = ('name', 'email', 'title', 'message')
@@ -259,10 +453,14 @@ class ReviewAdmin(admin.ModelAdmin):
 
 
 @admin.register(Receipt)
-class ReceiptAdmin(admin.ModelAdmin):
+class ReceiptAdmin(IndexedSearchMixin, BaseAdmin):
     list_display = ('reference_number', 'user', 'transaction_type', 'amount', 'status', 'created_at')
     list_filter = ('transaction_type', 'status', 'created_at')
     search_fields = ('reference_number', 'user__email', 'from_account', 'to_account')
+    export_fields = ('id', 'created_at', 'reference_number', 'user__email', 'transaction_type', 'amount', 'from_account', 'to_account', 'recipient_name', 'status', 'description')
+    actions = ['export_as_csv']
+    list_select_related = ('user',)
+    date_hierarchy = 'created_at'
     readonly_fields = ('id', 'reference_number', 'created_at', 'user')
     
     fieldsets = (
@@ -275,4 +473,98 @@ class ReceiptAdmin(admin.ModelAdmin):
         return False
     
     def has_delete_permission(self, request, obj=None):
-        return False
\ No newline at end of file
+        return False
+
+
+@admin.register(ScheduledTransfer)
+class ScheduledTransferAdmin(BaseAdmin):
+    list_display = ('from_account', 'to_account', 'amount', 'frequency', 'status', 'next_run_at', 'runs', 'failures')
+    list_filter = ('status', 'frequency')
+    search_fields = ('from_account__account_number', 'to_account__account_number', 'from_account__user__email')
+    list_select_related = ('from_account__user', 'to_account__user')
+    autocomplete_fields = ('from_account', 'to_account')
+    readonly_fields = ('id', 'occurrence', 'runs', 'failures', 'last_run_at', 'last_error', 'created_at')
+    actions = ['cancel_orders']
+
+    def cancel_orders(self, request, queryset):
+        updated = queryset.filter(status='ACTIVE').update(status='CANCELLED', next_run_at=None)
+        self.message_user(request, f"Cancelled {updated} standing order(s).")
+
+    cancel_orders.short_description = "Cancel selected standing orders"
+
+@admin.register(FeedImport)
+class FeedImportAdmin(BaseAdmin):
+    list_display = ('file_name', 'source', 'status', 'rows_done', 'posted', 'duplicates', 'rejected', 'started_at', 'finished_at')
+    list_filter = ('status', 'source')
+    search_fields = ('file_name', 'checksum')
+    date_hierarchy = 'started_at'
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+@admin.register(FeedDeposit)
+class FeedDepositAdmin(BaseAdmin):
+    list_display = ('reference', 'source', 'account', 'amount', 'feed')
+    list_filter = ('source',)
+    search_fields = ('reference', 'account__account_number')
+    list_select_related = ('account__user', 'feed')
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+@admin.register(FxRevaluation)
+class FxRevaluationAdmin(BaseAdmin):
+    list_display = ('currency', 'rate', 'accounts', 'balance', 'base_value', 'gain', 'rates_version', 'created_at')
+    list_filter = ('currency',)
+    date_hierarchy = 'created_at'
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+@admin.register(InterestAccrual)
+class InterestAccrualAdmin(BaseAdmin):
+    list_display = ('account', 'day', 'average_balance', 'amount', 'credited')
+    list_filter = ('credited', 'day')
+    search_fields = ('account__account_number',)
+    list_select_related = ('account__user',)
+    date_hierarchy = 'day'
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+@admin.register(TransactionArchive)
+class TransactionArchiveAdmin(BaseAdmin):
+    list_display = ('account', 'period', 'row_count', 'archived_at')
+    list_filter = ('period',)
+    search_fields = ('account__account_number',)
+    list_select_related = ('account__user',)
+    readonly_fields = ('id', 'account', 'period', 'row_count', 'archived_at')
+    exclude = ('payload',)
+
+    def has_add_permission(self, request):
+        return False
+
+
+@admin.register(ReceiptArchive)
+class ReceiptArchiveAdmin(BaseAdmin):
+    list_display = ('user', 'period', 'row_count', 'archived_at')
+    list_filter = ('period',)
+    search_fields = ('user__email',)
+    list_select_related = ('user',)
+    readonly_fields = ('id', 'user', 'period', 'row_count', 'archived_at')
+    exclude = ('payload',)
+
+    def has_add_permission(self, request):
+        return False
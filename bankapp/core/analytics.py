@@ -0,0 +1,225 @@
+"""Daily activity rollups.
+
+Every journal posting against a customer account is folded into a
+DailyActivity row (account, day, category) as it is written, so
+insights and reports read a few dozen small rows instead of scanning
+ledger history. ``rebuild_activity`` recomputes a day from the postings
+for catch-up and repair.
+"""
+from .models import Posting, DailyActivity
+from django.db import IntegrityError, connections, router, transaction as db_transaction
+from django.db.models import Case, CharField, Count, F, Q, Sum, Value, When
+from collections import defaultdict
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+SPENDING_CATEGORIES = ("WITHDRAW", "BILL_PAYMENT", "TRANSFER_OUT")
+
+# SQL counterpart of posting_category()
+CATEGORY_EXPRESSION = Case(
+    When(entry__entry_type="TRANSFER", amount__gt=0, then=Value("TRANSFER_IN")),
+    When(entry__entry_type="TRANSFER", then=Value("TRANSFER_OUT")),
+    default=F("entry__entry_type"),
+    output_field=CharField(),
+)
+
+
+def posting_category(entry_type, amount):
+    if entry_type == "TRANSFER":
+        return "TRANSFER_IN" if amount > 0 else "TRANSFER_OUT"
+    return entry_type
+
+
+def day_bounds(day):
+    start = timezone.make_aware(datetime.combine(day, time.min))
+    return start, start + timedelta(days=1)
+
+
+def record_activity(entry, postings):
+    """Fold the customer-side postings of a new journal entry into the rollups"""
+    day = timezone.localdate(entry.created_at)
+    for posting in postings:
+        if posting.account_id is None:
+            continue
+        key = {
+            "account_id": posting.account_id,
+            "day": day,
+            "category": posting_category(entry.entry_type, posting.amount),
+        }
+        money_in = max(posting.amount, Decimal("0"))
+        money_out = max(-posting.amount, Decimal("0"))
+        increment = {
+            "money_in": F("money_in") + money_in,
+            "money_out": F("money_out") + money_out,
+            "count": F("count") + 1,
+        }
+        if DailyActivity.objects.filter(**key).update(**increment):
+            continue
+        try:
+            with db_transaction.atomic():
+                DailyActivity.objects.create(money_in=money_in, money_out=money_out, count=1, **key)
+        except IntegrityError:
+            # Another request created the row first
+            DailyActivity.objects.filter(**key).update(**increment)
+
+
+def increment_fields(model, increments, batch_size=500):
+    """Add to numeric fields of many rows, one UPDATE per batch.
+
+    ``increments`` maps primary keys to ``{field: amount}``. The additions
+    happen in SQL (``field = field + CASE pk ...``), so they compose with
+    concurrent updates of the same rows instead of overwriting them. The
+    statement is written by hand because compiling hundreds of When()
+    expressions costs more than running the UPDATE.
+    """
+    connection = connections[router.db_for_write(model)]
+    quote = connection.ops.quote_name
+    pk_field = model._meta.pk
+    pk_column = quote(pk_field.column)
+    pks = list(increments)
+    with connection.cursor() as cursor:
+        for start in range(0, len(pks), batch_size):
+            batch = pks[start:start + batch_size]
+            assignments, params = [], []
+            for name in sorted({field for pk in batch for field in increments[pk]}):
+                field = model._meta.get_field(name)
+                changed = [pk for pk in batch if name in increments[pk]]
+                whens = " ".join(["WHEN %s THEN %s"] * len(changed))
+                assignments.append(f"{quote(field.column)} = {quote(field.column)} + CASE {pk_column} {whens} ELSE 0 END")
+                for pk in changed:
+                    params += [pk_field.get_db_prep_value(pk, connection), field.get_db_prep_value(increments[pk][name], connection)]
+            params += [pk_field.get_db_prep_value(pk, connection) for pk in batch]
+            cursor.execute(
+                f"UPDATE {quote(model._meta.db_table)} SET {', '.join(assignments)} "
+                f"WHERE {pk_column} IN ({', '.join(['%s'] * len(batch))})",
+                params,
+            )
+
+
+def record_activity_bulk(entries, postings):
+    """record_activity() for many journal entries at once, in a handful of statements"""
+    entry_types = {entry.pk: entry for entry in entries}
+    totals = defaultdict(lambda: {"money_in": Decimal("0"), "money_out": Decimal("0"), "count": 0})
+    for posting in postings:
+        if posting.account_id is None:
+            continue
+        entry = entry_types[posting.entry_id]
+        key = (posting.account_id, timezone.localdate(entry.created_at), posting_category(entry.entry_type, posting.amount))
+        totals[key]["money_in"] += max(posting.amount, Decimal("0"))
+        totals[key]["money_out"] += max(-posting.amount, Decimal("0"))
+        totals[key]["count"] += 1
+    if not totals:
+        return
+    # Create missing rows empty, then add to every row, so racing writers only ever add
+    DailyActivity.objects.bulk_create(
+        [DailyActivity(account_id=account_id, day=day, category=category) for account_id, day, category in totals],
+        ignore_conflicts=True,
+        batch_size=2000,
+    )
+    rows = DailyActivity.objects.filter(
+        account_id__in={key[0] for key in totals}, day__in={key[1] for key in totals}
+    ).values_list("id", "account_id", "day", "category")
+    increment_fields(DailyActivity, {
+        pk: totals[(account_id, day, category)] for pk, account_id, day, category in rows if (account_id, day, category) in totals
+    })
+
+
+def rebuild_activity(day):
+    """Recompute every rollup row of one day from the journal, returns rows written.
+
+    The day's rows are locked before the postings are summed and are then
+    rewritten in place, so a writer that lands meanwhile either committed
+    before the sum, and is counted in it, or adds its increment to the
+    rebuilt row once the lock is released. Deleting and recreating rows
+    would drop increments aimed at the old primary keys.
+    """
+    start, end = day_bounds(day)
+    with db_transaction.atomic():
+        existing = {
+            (account_id, category): pk
+            for pk, account_id, category in DailyActivity.objects.select_for_update().filter(day=day).values_list("pk", "account_id", "category")
+        }
+        totals = (
+            Posting.objects.filter(account__isnull=False, created_at__gte=start, created_at__lt=end)
+            .annotate(category=CATEGORY_EXPRESSION)
+            .values("account_id", "category")
+            .annotate(
+                money_in=Coalesce(Sum("amount", filter=Q(amount__gt=0)), Decimal("0")),
+                money_out=Coalesce(Sum("amount", filter=Q(amount__lt=0)), Decimal("0")),
+                count=Count("id"),
+            )
+            .order_by()
+        )
+        rows = [
+            DailyActivity(
+                pk=existing.pop((row["account_id"], row["category"]), None),
+                account_id=row["account_id"],
+                day=day,
+                category=row["category"],
+                money_in=row["money_in"],
+                money_out=-row["money_out"],
+                count=row["count"],
+            )
+            for row in totals
+        ]
+        DailyActivity.objects.bulk_update([row for row in rows if row.pk], ["money_in", "money_out", "count"], batch_size=2000)
+        # A row a concurrent writer created after the lock holds only its own
+        # increment, so the rebuilt totals overwrite it
+        DailyActivity.objects.bulk_create(
+            [row for row in rows if not row.pk],
+            batch_size=2000,
+            update_conflicts=True,
+            unique_fields=["account", "day", "category"],
+            update_fields=["money_in", "money_out", "count"],
+        )
+        DailyActivity.objects.filter(pk__in=existing.values()).delete()
+    return len(rows)
+
+
+def spending_insights(account, today=None):
+    """Chart and breakdown data for the dashboard, read from the last month of rollups"""
+    today = today or timezone.localdate()
+    month_start = today.replace(day=1)
+    week_start = today - timedelta(days=6)
+    four_weeks_start = today - timedelta(days=27)
+
+    rows = account.daily_activity.filter(day__gte=min(month_start, four_weeks_start)).values_list(
+        "day", "category", "money_in", "money_out"
+    )
+
+    daily_spending = {week_start + timedelta(days=offset): Decimal("0") for offset in range(7)}
+    weekly_income = [Decimal("0")] * 4
+    weekly_expenses = [Decimal("0")] * 4
+    by_category = {}
+    for day, category, money_in, money_out in rows:
+        if category == "OPENING":
+            continue
+        if day in daily_spending and category in SPENDING_CATEGORIES:
+            daily_spending[day] += money_out
+        if day >= four_weeks_start:
+            week = (day - four_weeks_start).days // 7
+            weekly_income[week] += money_in
+            weekly_expenses[week] += money_out
+        if day >= month_start:
+            totals = by_category.setdefault(category, {"money_in": Decimal("0"), "money_out": Decimal("0")})
+            totals["money_in"] += money_in
+            totals["money_out"] += money_out
+
+    labels = dict(DailyActivity.CATEGORIES)
+    return {
+        "charts": {
+            "daily_labels": [day.strftime("%a") for day in daily_spending],
+            "daily_spending": [float(value) for value in daily_spending.values()],
+            "weekly_labels": [f"Week {week + 1}" for week in range(4)],
+            "weekly_income": [float(value) for value in weekly_income],
+            "weekly_expenses": [float(value) for value in weekly_expenses],
+        },
+        "month_categories": [
+            {"category": labels[category], **totals}
+            for category, totals in sorted(by_category.items(), key=lambda item: -(item[1]["money_out"] + item[1]["money_in"]))
+        ],
+        "month_spending": sum((totals["money_out"] for totals in by_category.values()), Decimal("0")),
+        "month_income": sum((totals["money_in"] for totals in by_category.values()), Decimal("0")),
+    }
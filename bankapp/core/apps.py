@@ -1,5 +1,20 @@
 from django.apps import AppConfig
+from django.db import connections
+from django.db.migrations.recorder import MigrationRecorder
+from django.db.models.signals import post_migrate
+
+
+def ensure_search_index(sender, using, **kwargs):
+    """Put back search triggers that a SQLite table rebuild dropped"""
+    from .search import install_search_index
+    connection = connections[using]
+    if MigrationRecorder(connection).migration_qs.filter(app="core", name="0017_search").exists():
+        install_search_index(connection)
 
 
 class CoreConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
     name = 'core'
+
+    def ready(self):
+        post_migrate.connect(ensure_search_index, sender=self)
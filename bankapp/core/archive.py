@@ -0,0 +1,190 @@
+"""Cold storage for closed ledger periods.
+
+Transactions and receipts from closed months are moved out of the hot
+tables into one compressed archive row per account (or user) per month.
+The history helpers merge archived rows back in, so views don't need to
+know where a row lives.
+"""
+from .models import Transaction, Receipt, TransactionArchive, ReceiptArchive
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction as db_transaction
+from django.utils import timezone
+from datetime import date, datetime, time, timedelta, timezone as dt_timezone
+import json
+import zlib
+
+ARCHIVE_BATCH_SIZE = 500
+
+
+def month_start(value):
+    return date(value.year, value.month, 1)
+
+
+def add_months(value, months):
+    index = value.year * 12 + value.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def period_start(period):
+    """Aware datetime at which a month begins, so range filters stay index-friendly"""
+    return timezone.make_aware(datetime.combine(period, time.min))
+
+
+def pack_rows(rows):
+    return zlib.compress(json.dumps(rows, cls=DjangoJSONEncoder).encode(), 9)
+
+
+def unpack_rows(model, payload):
+    """Rebuild unsaved model instances from an archive payload"""
+    fields = model._meta.concrete_fields
+    return [
+        model(**{field.attname: field.to_python(row[field.attname]) for field in fields})
+        for row in json.loads(zlib.decompress(bytes(payload)))
+    ]
+
+
+def _archive_period(model, archive_model, owner_field, time_field, period):
+    """Move one month of rows into per-owner archives, returns rows moved"""
+    owner_attname = f"{owner_field}_id"
+    attnames = [field.attname for field in model._meta.concrete_fields]
+    period_rows = model.objects.filter(**{
+        f"{time_field}__gte": period_start(period),
+        f"{time_field}__lt": period_start(add_months(period, 1)),
+    })
+
+    moved = 0
+    last_owner = None
+    while True:
+        owners = period_rows.order_by(owner_attname).values_list(owner_attname, flat=True).distinct()
+        if last_owner is not None:
+            owners = owners.filter(**{f"{owner_attname}__gt": last_owner})
+        owners = list(owners[:ARCHIVE_BATCH_SIZE])
+        if not owners:
+            return moved
+
+        with db_transaction.atomic():
+            for owner_id in owners:
+                rows = list(period_rows.filter(**{owner_attname: owner_id}).order_by(time_field).values(*attnames))
+                archive = archive_model.objects.select_for_update().filter(
+                    **{owner_attname: owner_id, "period": period}
+                ).first()
+                if archive:
+                    # Late rows for an already archived month are merged in
+                    rows = json.loads(zlib.decompress(bytes(archive.payload))) + rows
+                    archive.payload = pack_rows(rows)
+                    archive.row_count = len(rows)
+                    archive.save()
+                else:
+                    archive_model.objects.create(
+                        period=period,
+                        row_count=len(rows),
+                        payload=pack_rows(rows),
+                        **{owner_attname: owner_id}
+                    )
+                period_rows.filter(**{owner_attname: owner_id}).delete()
+                moved += len(rows)
+        last_owner = owners[-1]
+
+
+def archive_transactions(period):
+    return _archive_period(Transaction, TransactionArchive, "account", "timestamp", period)
+
+
+def archive_receipts(period):
+    return _archive_period(Receipt, ReceiptArchive, "user", "created_at", period)
+
+
+def _local_date(value):
+    return timezone.localtime(value).date() if timezone.is_aware(value) else value.date()
+
+
+def _archived_transactions(archives):
+    for archive in archives:
+        for txn in unpack_rows(Transaction, archive.payload):
+            # Archived receipts can't be opened from receipt_view
+            txn.receipt_id = None
+            yield txn
+
+
+def get_transaction_history(account, start=None, end=None):
+    """Transactions of an account between two dates, oldest first, hot and archived"""
+    hot = account.transactions.select_related('receipt').order_by('timestamp')
+    archives = account.transaction_archives.order_by('period')
+    if start:
+        hot = hot.filter(timestamp__date__gte=start)
+        archives = archives.filter(period__gte=month_start(start))
+    if end:
+        hot = hot.filter(timestamp__date__lte=end)
+        archives = archives.filter(period__lte=end)
+
+    archived = [
+        txn for txn in _archived_transactions(archives)
+        if (not start or _local_date(txn.timestamp) >= start) and (not end or _local_date(txn.timestamp) <= end)
+    ]
+    return archived + list(hot)
+
+
+def get_recent_transactions(account, limit=10):
+    """Newest transactions of an account, topped up from archives when the hot table runs short"""
+    recent = list(account.transactions.select_related('receipt').order_by('-timestamp')[:limit])
+    if len(recent) < limit:
+        for archive in account.transaction_archives.order_by('-period'):
+            archived = sorted(_archived_transactions([archive]), key=lambda txn: txn.timestamp, reverse=True)
+            recent.extend(archived[:limit - len(recent)])
+            if len(recent) >= limit:
+                break
+    return recent
+
+
+def get_archived_receipts(user, period):
+    """Receipts of one archived month of a user, newest first; only that month is decompressed"""
+    receipts = []
+    for archive in user.receipt_archives.filter(period=month_start(period)):
+        receipts.extend(unpack_rows(Receipt, archive.payload))
+    for receipt in receipts:
+        receipt.is_archived = True
+        receipt.user = user
+    return sorted(receipts, key=lambda receipt: receipt.created_at, reverse=True)
+
+
+def get_receipt_archive_periods(user):
+    """(period, row_count) of every archived month of a user, newest first, without loading payloads"""
+    return list(user.receipt_archives.order_by('-period').values_list('period', 'row_count'))
+
+
+def receipt_period(receipt_id):
+    """Month a UUIDv7 receipt id was generated in, or None for older random ids"""
+    if receipt_id.version != 7:
+        return None
+    created = datetime.fromtimestamp((receipt_id.int >> 80) / 1000, tz=dt_timezone.utc)
+    return month_start(timezone.localtime(created).date())
+
+
+def find_archived_receipt(user, receipt_id, period=None):
+    """An archived receipt of a user, looked up in the month it belongs to, or None"""
+    period = period or receipt_period(receipt_id)
+    if period is None:
+        return None
+    # The id is generated just before the row is saved, so a receipt can land in the next month
+    for archive in user.receipt_archives.filter(period__in=[month_start(period), add_months(period, 1)]).order_by('period'):
+        for receipt in unpack_rows(Receipt, archive.payload):
+            if receipt.id == receipt_id:
+                receipt.is_archived = True
+                receipt.user = user
+                return receipt
+    return None
+
+
+def iter_receipts(user, start, end, chunk_size=ARCHIVE_BATCH_SIZE):
+    """Receipts of a user created between two dates, oldest first, archived months then hot rows"""
+    for archive in user.receipt_archives.filter(period__gte=month_start(start), period__lte=end).order_by('period'):
+        archived = sorted(unpack_rows(Receipt, archive.payload), key=lambda receipt: receipt.created_at)
+        for receipt in archived:
+            if start <= _local_date(receipt.created_at) <= end:
+                receipt.user = user
+                yield receipt
+    yield from Receipt.objects.filter(
+        user=user,
+        created_at__gte=period_start(start),
+        created_at__lt=timezone.make_aware(datetime.combine(end + timedelta(days=1), time.min)),
+    ).select_related('user').order_by('created_at').iterator(chunk_size=chunk_size)
@@ -0,0 +1,212 @@
+"""Deposit files from payment processors, imported straight into the ledger.
+
+A feed is a CSV file with ``reference``, ``account_number`` and
+``amount`` columns (``currency`` and ``description`` are optional) or an
+OFX statement, whose STMTTRNs become deposits: FITID is the
+reference and the account is the transaction's BANKACCTTO, falling back
+to the statement's own account. Both are parsed as streams, so a file of
+any size is read in constant memory.
+
+``import_feed`` matches account numbers against an in-memory index of
+every BankAccount and posts ``chunk_size`` rows per database transaction
+through a LedgerBatch. The chunk's FeedDeposits and the FeedImport's
+progress are written in that same transaction, and the chunk's rejects
+are only reported once it commits. FeedDeposit is unique on
+(source, reference), which drops a deposit that was already posted,
+whichever file it came in. A run that fails leaves the FeedImport at the
+last committed chunk, and running the same file again resumes from there.
+"""
+from django.db import transaction as db_transaction
+from django.utils import timezone
+from .models import BankAccount, FeedImport, FeedDeposit
+from .services import LedgerBatch, lock_accounts
+from . import fx
+from decimal import Decimal, InvalidOperation
+import csv
+import hashlib
+import os
+import re
+
+CHUNK_SIZE = 5000
+FORMATS = ("csv", "ofx")
+OFX_TAG = re.compile(r"<(/?)([A-Za-z0-9.]+)>([^<]*)")
+
+
+def checksum(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as feed:
+        for block in iter(lambda: feed.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def read_csv(path):
+    with open(path, newline="", encoding="utf-8-sig") as feed:
+        for row in csv.DictReader(feed):
+            yield {key.strip().lower(): (value or "").strip() for key, value in row.items() if key}
+
+
+def ofx_tags(path, block_size=1 << 16):
+    """(closing, tag, text) for every tag in an OFX file, read a block at a time"""
+    with open(path, encoding="utf-8", errors="replace") as feed:
+        pending = ""
+        for block in iter(lambda: feed.read(block_size), ""):
+            pending += block
+            # Keep the last, possibly cut-off, tag for the next block
+            cut = pending.rfind("<")
+            if cut < 0:
+                continue
+            for match in OFX_TAG.finditer(pending, 0, cut):
+                yield match.group(1) == "/", match.group(2).upper(), match.group(3).strip()
+            pending = pending[cut:]
+        for match in OFX_TAG.finditer(pending):
+            yield match.group(1) == "/", match.group(2).upper(), match.group(3).strip()
+
+
+def read_ofx(path):
+    statement_account, currency = "", ""
+    transaction, section = None, None
+    for closing, tag, text in ofx_tags(path):
+        if tag == "STMTTRN":
+            if closing and transaction is not None:
+                yield {
+                    "reference": transaction.get("fitid", ""),
+                    "account_number": transaction.get("to_account", statement_account),
+                    "amount": transaction.get("trnamt", ""),
+                    "currency": transaction.get("currency", currency),
+                    "description": transaction.get("memo") or transaction.get("name", ""),
+                }
+                transaction = None
+            elif not closing:
+                transaction = {}
+        elif tag in ("BANKACCTFROM", "BANKACCTTO", "CURRENCY", "ORIGCURRENCY"):
+            section = None if closing else tag
+        elif closing:
+            continue
+        elif tag == "CURDEF":
+            currency = text
+        elif tag == "ACCTID":
+            if transaction is not None and section == "BANKACCTTO":
+                transaction["to_account"] = text
+            elif transaction is None and section == "BANKACCTFROM":
+                statement_account = text
+        elif tag == "CURSYM" and transaction is not None:
+            transaction["currency"] = text
+        elif transaction is not None and tag in ("FITID", "TRNAMT", "NAME", "MEMO"):
+            transaction[tag.lower()] = text
+
+
+def account_index():
+    """account_number -> primary key for every active account"""
+    return dict(BankAccount.objects.filter(is_active=True).values_list("account_number", "pk").iterator(chunk_size=20000))
+
+
+def check(row, index):
+    """Reject reason for a parsed row, or None"""
+    if not row.get("reference"):
+        return "Missing reference"
+    if row.get("account_number") not in index:
+        return "Unknown or inactive account"
+    try:
+        amount = Decimal(row["amount"].replace(",", ""))
+    except (InvalidOperation, KeyError, AttributeError):
+        return "Invalid amount"
+    if not amount.is_finite() or amount <= 0:
+        return "Amount must be positive"
+    row["amount"] = amount
+    return None
+
+
+def post_chunk(feed, rows, index, rejects):
+    """Post one chunk of checked rows; returns (posted, duplicates, rejected)"""
+    references = {row["reference"] for row in rows}
+    seen = set(FeedDeposit.objects.filter(source=feed.source, reference__in=references).values_list("reference", flat=True))
+    fresh = []
+    for row in rows:
+        if row["reference"] in seen:
+            continue
+        seen.add(row["reference"])
+        fresh.append(row)
+    accounts = lock_accounts({index[row["account_number"]] for row in fresh})
+    batch = LedgerBatch()
+    deposits, rejected = [], 0
+    for row in fresh:
+        account = accounts[index[row["account_number"]]]
+        try:
+            amount, _ = fx.convert(row["amount"], (row.get("currency") or account.currency).upper(), account.currency)
+        except ValueError as e:
+            rejects(row, str(e))
+            rejected += 1
+            continue
+        description = f"{feed.source} deposit {row['reference']}. {row.get('description', '')}".strip()
+        entry = batch.post("DEPOSIT", description, [(account, "", amount), (None, "CASH", -amount)])
+        batch.transaction(account, amount, "DEPOSIT", description)
+        deposits.append(FeedDeposit(source=feed.source, reference=row["reference"], feed=feed, account=account, entry=entry, amount=amount))
+    batch.flush()
+    FeedDeposit.objects.bulk_create(deposits, batch_size=2000)
+    return len(deposits), len(rows) - len(fresh), rejected
+
+
+def import_feed(path, source, format=None, chunk_size=CHUNK_SIZE, rejects=None, progress=None):
+    """Import a deposit file; returns its FeedImport.
+
+    ``rejects(row, reason)`` is called for every row that is not posted
+    for a reason other than being a duplicate, once the row's chunk has
+    committed.
+    """
+    format = format or os.path.splitext(path)[1].lstrip(".").lower()
+    if format not in FORMATS:
+        raise ValueError(f"Unknown feed format {format!r}; expected one of {', '.join(FORMATS)}")
+    report = rejects or (lambda row, reason: None)
+    feed, _ = FeedImport.objects.get_or_create(
+        source=source, checksum=checksum(path), defaults={"file_name": os.path.basename(path)[:255]}
+    )
+    if feed.status == "COMPLETED":
+        return feed
+    index = account_index()
+    rows = read_csv(path) if format == "csv" else read_ofx(path)
+    skip, number, chunk, rejected = feed.rows_done, 0, [], []
+
+    def reject(row, reason):
+        rejected.append((row, reason))
+
+    def report_rejects(chunk_rejects):
+        for row, reason in chunk_rejects:
+            report(row, reason)
+
+    def commit():
+        nonlocal chunk, rejected
+        with db_transaction.atomic():
+            posted, duplicates, _ = post_chunk(feed, chunk, index, reject) if chunk else (0, 0, 0)
+            feed.rows_done = number
+            feed.posted += posted
+            feed.duplicates += duplicates
+            feed.rejected += len(rejected)
+            feed.status = "RUNNING"
+            feed.save(update_fields=["rows_done", "posted", "duplicates", "rejected", "status"])
+            # A chunk that rolls back is read again on resume, so its rejects wait for the commit
+            db_transaction.on_commit(lambda chunk_rejects=rejected: report_rejects(chunk_rejects))
+        chunk, rejected = [], []
+        if progress:
+            progress(feed)
+
+    try:
+        for row in rows:
+            number += 1
+            if number <= skip:
+                continue
+            reason = check(row, index)
+            if reason:
+                reject(row, reason)
+            else:
+                chunk.append(row)
+            if number - feed.rows_done >= chunk_size:
+                commit()
+        commit()
+    except Exception as e:
+        FeedImport.objects.filter(pk=feed.pk).update(status="FAILED", last_error=repr(e))
+        raise
+    feed.status = "COMPLETED"
+    feed.finished_at = timezone.now()
+    feed.save(update_fields=["status", "finished_at"])
+    return feed
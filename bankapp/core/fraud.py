@@ -0,0 +1,291 @@
+"""Risk scoring of outgoing money movements.
+
+Every withdrawal, bill payment and outgoing transfer is scored from three
+features of the paying account's history:
+
+- the amount's z-score against the account's earlier outgoing amounts,
+- whether a transfer goes to an account it has never paid before, and
+- velocity, the number of outgoing movements in the last VELOCITY_WINDOW
+  seconds.
+
+``screen_movement`` runs on the write path (see core.services). It keeps
+one small AccountProfile per account in process memory, loaded from the
+ledger the first time an account pays in a process and reloaded after
+FRAUD_PROFILE_TTL seconds so movements made through other workers are
+picked up. Committed movements are folded in as they happen, so scoring
+itself is plain arithmetic. Scores of FRAUD_ALERT_SCORE or more raise a
+SECURITY notification for the account holder.
+
+``score_history`` re-scores stored postings in bulk with NumPy and is
+what the score_fraud command uses. Both paths share the same weights, so
+a movement gets the same score either way.
+"""
+from django.conf import settings
+from django.db import transaction as db_transaction
+from django.db.models import Count, F, OuterRef, Subquery, Sum
+from .models import Posting, Notification
+from collections import OrderedDict, deque
+from datetime import datetime, timezone as dt_timezone
+from threading import Lock
+import math
+
+Z_WEIGHT = 0.5
+NEW_PAYEE_WEIGHT = 0.25
+VELOCITY_WEIGHT = 0.25
+# z-scores between these two map linearly onto the z component
+Z_LOW, Z_HIGH = 2.0, 5.0
+VELOCITY_WINDOW = 600
+VELOCITY_CAP = 10
+# Fewer earlier payments than this say nothing about what is unusual
+MIN_HISTORY = 5
+# Spread floor so accounts that always pay the same amount are not flagged for cents
+MIN_STD = 1.0
+HISTORY_CHUNK_SIZE = 100000
+
+
+def risk_score(z, new_payee, velocity):
+    """Score in [0, 1]; score_history() computes the same thing over arrays"""
+    return (
+        Z_WEIGHT * min(max((z - Z_LOW) / (Z_HIGH - Z_LOW), 0.0), 1.0)
+        + NEW_PAYEE_WEIGHT * new_payee
+        + VELOCITY_WEIGHT * min(velocity / VELOCITY_CAP, 1.0)
+    )
+
+
+def risk_reasons(z, new_payee, velocity):
+    reasons = []
+    if z > Z_LOW:
+        reasons.append("an unusually large amount")
+    if new_payee:
+        reasons.append("a first payment to this recipient")
+    if velocity >= VELOCITY_CAP // 2:
+        reasons.append(f"{velocity} other payments in the last {VELOCITY_WINDOW // 60} minutes")
+    return reasons
+
+
+def alert(user_id, entry_id, amount, reasons):
+    return Notification(
+        user_id=user_id,
+        title="Unusual activity on your account",
+        message=(
+            f"We noticed {' and '.join(reasons) or 'unusual activity'} on a payment of ${amount:.2f} "
+            f"from your account. If this wasn't you, please contact us right away."
+        ),
+        notification_type="SECURITY",
+        related_object_id=str(entry_id),
+    )
+
+
+class AccountProfile:
+    """Running features of one account's outgoing movements"""
+    __slots__ = ("count", "total", "total_squares", "payees", "recent", "loaded_at")
+
+    def __init__(self, count, total, total_squares, payees, recent, loaded_at):
+        self.count = count
+        self.total = total
+        self.total_squares = total_squares
+        # UUIDs as plain ints, which take half the memory
+        self.payees = payees
+        self.recent = recent
+        self.loaded_at = loaded_at
+
+    @classmethod
+    def load(cls, account_id, now, exclude_entry=None):
+        outgoing = Posting.objects.filter(account_id=account_id, amount__lt=0)
+        payees = Posting.objects.filter(
+            entry__entry_type="TRANSFER",
+            amount__gt=0,
+            # Not the FX legs of a cross-currency transfer
+            account__isnull=False,
+            entry__postings__account_id=account_id,
+            entry__postings__amount__lt=0,
+        )
+        if exclude_entry is not None:
+            outgoing = outgoing.exclude(entry_id=exclude_entry)
+            payees = payees.exclude(entry_id=exclude_entry)
+        totals = outgoing.aggregate(
+            count=Count("id"), total=Sum("amount"), total_squares=Sum(F("amount") * F("amount"))
+        )
+        recent = outgoing.filter(
+            created_at__gt=datetime.fromtimestamp(now - VELOCITY_WINDOW, dt_timezone.utc)
+        ).order_by("created_at").values_list("created_at", flat=True)
+        return cls(
+            count=totals["count"],
+            total=-float(totals["total"] or 0),
+            total_squares=float(totals["total_squares"] or 0),
+            payees={payee.int for payee in payees.values_list("account_id", flat=True).distinct()},
+            recent=deque(created_at.timestamp() for created_at in recent),
+            loaded_at=now,
+        )
+
+    def features(self, amount, payee, now):
+        recent = self.recent
+        while recent and recent[0] <= now - VELOCITY_WINDOW:
+            recent.popleft()
+        z = 0.0
+        if self.count >= MIN_HISTORY:
+            mean = self.total / self.count
+            std = math.sqrt(max(self.total_squares / self.count - mean * mean, 0.0))
+            z = (amount - mean) / max(std, MIN_STD)
+        new_payee = payee is not None and payee.int not in self.payees
+        return z, new_payee, len(recent)
+
+    def record(self, amount, payee, now):
+        self.count += 1
+        self.total += amount
+        self.total_squares += amount * amount
+        if payee is not None:
+            self.payees.add(payee.int)
+        self.recent.append(now)
+
+
+class ProfileStore:
+    """Least recently used AccountProfiles, at most FRAUD_PROFILE_CACHE_SIZE of them"""
+
+    def __init__(self):
+        self.profiles = OrderedDict()
+        self.lock = Lock()
+
+    def get(self, account_id, now, exclude_entry=None):
+        with self.lock:
+            profile = self.profiles.get(account_id)
+            if profile is not None and now - profile.loaded_at < settings.FRAUD_PROFILE_TTL:
+                self.profiles.move_to_end(account_id)
+                return profile
+        profile = AccountProfile.load(account_id, now, exclude_entry)
+        with self.lock:
+            self.profiles[account_id] = profile
+            self.profiles.move_to_end(account_id)
+            while len(self.profiles) > settings.FRAUD_PROFILE_CACHE_SIZE:
+                self.profiles.popitem(last=False)
+        return profile
+
+    def record(self, account_id, amount, payee, now):
+        with self.lock:
+            profile = self.profiles.get(account_id)
+            if profile is not None:
+                profile.record(amount, payee, now)
+
+    def clear(self):
+        with self.lock:
+            self.profiles.clear()
+
+
+profiles = ProfileStore()
+
+
+def screen_movement(account, amount, entry, payee=None):
+    """Score money leaving ``account`` in journal ``entry``; call inside the entry's transaction.
+
+    ``payee`` is the receiving BankAccount of a transfer. Returns the score,
+    or None when scoring is turned off.
+    """
+    if not settings.FRAUD_SCORING_ENABLED:
+        return None
+    now = entry.created_at.timestamp()
+    amount = float(amount)
+    payee_id = payee.pk if payee is not None else None
+    profile = profiles.get(account.pk, now, exclude_entry=entry.pk)
+    with profiles.lock:
+        z, new_payee, velocity = profile.features(amount, payee_id, now)
+    score = risk_score(z, new_payee, velocity)
+    if score >= settings.FRAUD_ALERT_SCORE:
+        alert(account.user_id, entry.pk, amount, risk_reasons(z, new_payee, velocity)).save()
+    # Only committed movements become history
+    db_transaction.on_commit(lambda: profiles.record(account.pk, amount, payee_id, now))
+    return score
+
+
+def score_history(since=None, threshold=None):
+    """Re-score every outgoing posting (created at or after ``since``) in bulk.
+
+    Features only see history inside the scored range, so with ``since``
+    the first payment to a recipient after that moment counts as new.
+    Returns the number of postings scored and, highest score first, dicts
+    describing those scoring ``threshold`` (FRAUD_ALERT_SCORE) or more.
+    """
+    import numpy as np
+
+    threshold = settings.FRAUD_ALERT_SCORE if threshold is None else threshold
+    # Only transfers have a customer account on the receiving side of a debit
+    payee = Posting.objects.filter(entry=OuterRef("entry"), account__isnull=False, amount__gt=0).values("account_id")[:1]
+    postings = Posting.objects.filter(account__isnull=False, amount__lt=0)
+    if since is not None:
+        postings = postings.filter(created_at__gte=since)
+    rows = postings.annotate(payee=Subquery(payee)).order_by("account_id", "created_at", "id").values_list(
+        "id", "account_id", "created_at", "amount", "payee"
+    )
+
+    account_codes, payee_codes = {}, {}
+    chunks, chunk = [], []
+    for posting_id, account_id, created_at, amount, payee_id in rows.iterator(chunk_size=HISTORY_CHUNK_SIZE):
+        chunk.append((
+            posting_id,
+            account_codes.setdefault(account_id, len(account_codes)),
+            created_at.timestamp(),
+            -float(amount),
+            -1 if payee_id is None else payee_codes.setdefault(payee_id, len(payee_codes)),
+        ))
+        if len(chunk) == HISTORY_CHUNK_SIZE:
+            chunks.append(np.array(chunk, dtype=np.float64))
+            chunk = []
+    if chunk:
+        chunks.append(np.array(chunk, dtype=np.float64))
+    if not chunks:
+        return 0, []
+    data = np.concatenate(chunks)
+    ids, group, stamps, amounts, payees = (data[:, column] for column in range(5))
+    ids, group, payees = ids.astype(np.int64), group.astype(np.int64), payees.astype(np.int64)
+    n = len(data)
+    index = np.arange(n)
+
+    # Rows are sorted by account then time; everything below looks only at earlier rows of the same account
+    group_start = np.maximum.accumulate(np.where(np.r_[True, group[1:] != group[:-1]], index, 0))
+    count = index - group_start
+    before = np.r_[0.0, np.cumsum(amounts)[:-1]]
+    before_squares = np.r_[0.0, np.cumsum(amounts * amounts)[:-1]]
+    total = before - before[group_start]
+    total_squares = before_squares - before_squares[group_start]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mean = np.where(count > 0, total / count, 0.0)
+        std = np.sqrt(np.maximum(np.where(count > 0, total_squares / count, 0.0) - mean * mean, 0.0))
+    z = np.where(count >= MIN_HISTORY, (amounts - mean) / np.maximum(std, MIN_STD), 0.0)
+
+    new_payee = np.zeros(n, dtype=bool)
+    paid = np.flatnonzero(payees >= 0)
+    _, first = np.unique(group[paid] * len(payee_codes) + payees[paid], return_index=True)
+    new_payee[paid[first]] = True
+
+    # Lay the accounts out one after another on a single time axis, far enough apart never to overlap
+    relative = stamps - stamps.min()
+    axis = relative + group * (relative.max() + VELOCITY_WINDOW + 1)
+    velocity = index - np.searchsorted(axis, axis - VELOCITY_WINDOW, side="right")
+
+    scores = (
+        Z_WEIGHT * np.clip((z - Z_LOW) / (Z_HIGH - Z_LOW), 0.0, 1.0)
+        + NEW_PAYEE_WEIGHT * new_payee
+        + VELOCITY_WEIGHT * np.minimum(velocity / VELOCITY_CAP, 1.0)
+    )
+
+    flagged = np.flatnonzero(scores >= threshold)
+    flagged = flagged[np.argsort(-scores[flagged], kind="stable")]
+    details = {
+        posting["id"]: posting
+        for posting in Posting.objects.filter(id__in=ids[flagged].tolist()).values(
+            "id", "entry_id", "account_id", "account__user_id", "created_at"
+        )
+    }
+    events = []
+    for row in flagged:
+        posting = details[int(ids[row])]
+        events.append({
+            "posting_id": posting["id"],
+            "entry_id": posting["entry_id"],
+            "account_id": posting["account_id"],
+            "user_id": posting["account__user_id"],
+            "created_at": posting["created_at"],
+            "amount": float(amounts[row]),
+            "score": round(float(scores[row]), 4),
+            "reasons": risk_reasons(float(z[row]), bool(new_payee[row]), int(velocity[row])),
+        })
+    return n, events
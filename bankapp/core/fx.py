@@ -0,0 +1,154 @@
+"""Exchange rates for multi-currency accounts.
+
+Rates come from the CSV file at FX_RATES_FILE, one ``currency,rate`` row
+per currency, where ``rate`` is the value of one unit of the currency in
+BASE_CURRENCY. Lines starting with ``#`` are comments.
+
+The file is parsed into an immutable RateTable held in process memory.
+``rates()`` looks at the file's size and modification time at most every
+FX_RATES_CHECK_SECONDS and reloads it when either changed, so converting
+a transfer costs a dictionary lookup and never a query. Every table
+carries a version, a hash of the file's contents, which is written into
+the transfer's description and stored with each revaluation so a
+conversion can be traced back to the rates it used.
+
+``revalue`` prices every foreign-currency balance in BASE_CURRENCY with
+NumPy and is what the revalue_balances command uses.
+"""
+from django.conf import settings
+from decimal import Decimal, ROUND_HALF_EVEN
+from threading import Lock
+from types import MappingProxyType
+import csv
+import hashlib
+import io
+import os
+import time
+
+CENT = Decimal("0.01")
+
+
+class RateTable:
+    __slots__ = ("version", "rates", "stat")
+
+    def __init__(self, version, rates, stat=None):
+        self.version = version
+        self.rates = MappingProxyType(rates)
+        self.stat = stat
+
+    @classmethod
+    def parse(cls, content, stat=None):
+        rates = {settings.BASE_CURRENCY: Decimal(1)}
+        lines = [line for line in content.decode("utf-8").splitlines() if line.strip() and not line.startswith("#")]
+        for row in csv.DictReader(io.StringIO("\n".join(lines))):
+            currency, rate = row["currency"].strip().upper(), Decimal(row["rate"].strip())
+            if rate <= 0:
+                raise ValueError(f"Exchange rate for {currency} must be positive")
+            rates[currency] = rate
+        return cls(hashlib.sha256(content).hexdigest()[:12], rates, stat)
+
+    def rate(self, source, target):
+        """Units of ``target`` one unit of ``source`` buys"""
+        try:
+            return self.rates[source] / self.rates[target]
+        except KeyError as missing:
+            raise ValueError(f"No exchange rate for {missing.args[0]}") from None
+
+    def convert(self, amount, source, target):
+        """``amount`` of ``source`` in ``target``, rounded to the cent, and the rate used"""
+        if source == target:
+            return amount, Decimal(1)
+        rate = self.rate(source, target)
+        return (amount * rate).quantize(CENT, rounding=ROUND_HALF_EVEN), rate
+
+
+_table = None
+_checked_at = 0.0
+_lock = Lock()
+
+
+def load(path):
+    stat = os.stat(path)
+    with open(path, "rb") as rates_file:
+        return RateTable.parse(rates_file.read(), (stat.st_mtime_ns, stat.st_size))
+
+
+def rates():
+    """The current RateTable, reloaded when the rates file has changed"""
+    global _table, _checked_at
+    now = time.monotonic()
+    if _table is not None and now - _checked_at < settings.FX_RATES_CHECK_SECONDS:
+        return _table
+    with _lock:
+        if _table is None or now - _checked_at >= settings.FX_RATES_CHECK_SECONDS:
+            stat = os.stat(settings.FX_RATES_FILE)
+            if _table is None or _table.stat != (stat.st_mtime_ns, stat.st_size):
+                _table = load(settings.FX_RATES_FILE)
+            _checked_at = now
+        return _table
+
+
+def reset():
+    """Forget the loaded table so the next rates() call reads the file"""
+    global _table
+    with _lock:
+        _table = None
+
+
+def convert(amount, source, target):
+    return rates().convert(amount, source, target)
+
+
+def revalue(table=None, chunk_size=100000, on_chunk=None):
+    """Price every foreign-currency balance in BASE_CURRENCY.
+
+    Returns ``{currency: (accounts, balance, base_value)}`` with Decimal
+    totals. Balances are streamed in chunks of ``chunk_size`` and priced a
+    chunk at a time as int64 cents, so totals add up exactly and memory
+    stays flat. ``on_chunk`` is called with each chunk's account ids,
+    currency codes, balances and base values in cents.
+    """
+    import numpy as np
+    from .models import BankAccount
+
+    table = table or rates()
+    codes = sorted(table.rates)
+    index = {code: position for position, code in enumerate(codes)}
+    rate_array = np.array([float(table.rates[code]) for code in codes])
+    counts = np.zeros(len(codes), dtype=np.int64)
+    balance_totals = np.zeros(len(codes), dtype=np.int64)
+    base_totals = np.zeros(len(codes), dtype=np.int64)
+
+    def price(chunk):
+        account_ids, currencies, balances = zip(*chunk)
+        missing = set(currencies) - index.keys()
+        if missing:
+            raise ValueError(f"No exchange rate for {', '.join(sorted(missing))}")
+        positions = np.fromiter((index[currency] for currency in currencies), dtype=np.intp, count=len(chunk))
+        cents = np.fromiter((int(balance * 100) for balance in balances), dtype=np.int64, count=len(chunk))
+        # One multiply for the whole chunk, each balance by its own currency's rate
+        base_cents = np.rint(cents * rate_array[positions]).astype(np.int64)
+        np.add.at(counts, positions, 1)
+        np.add.at(balance_totals, positions, cents)
+        np.add.at(base_totals, positions, base_cents)
+        if on_chunk:
+            on_chunk(account_ids, currencies, cents, base_cents)
+
+    rows = (
+        BankAccount.objects.exclude(currency=settings.BASE_CURRENCY)
+        .values_list("pk", "currency", "balance")
+        .iterator(chunk_size=chunk_size)
+    )
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == chunk_size:
+            price(chunk)
+            chunk = []
+    if chunk:
+        price(chunk)
+    return {
+        code: (int(counts[position]), Decimal(int(balance_totals[position])).scaleb(-2), Decimal(int(base_totals[position])).scaleb(-2))
+        for position, code in enumerate(codes)
+        if counts[position]
+    }
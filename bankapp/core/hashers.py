@@ -0,0 +1,113 @@
+"""Password hashers tuned from settings, and off-thread password checks.
+
+PASSWORD_HASHER picks the hasher new and upgraded passwords use; the
+other two stay in PASSWORD_HASHERS so existing hashes keep verifying.
+Django rehashes a password on the next successful login whenever its
+algorithm or parameters differ from the preferred hasher's, so switching
+profile or retuning migrates users as they log in.
+
+The scrypt and Argon2 defaults follow the OWASP password storage
+recommendations (scrypt N=2^14, r=8, p=1; Argon2id m=19 MiB, t=2, p=1),
+which cost far less CPU per login than PBKDF2's default of over a
+million rounds.
+``bench_password_hashers`` measures each on the host.
+
+PasswordCheckBackend runs the hashing for a login on a pool of
+PASSWORD_HASH_WORKERS threads. All three hashers release the GIL, so the
+pool bounds how many cores a login storm can take, and ``aauthenticate``
+awaits the pool instead of blocking the event loop under ASGI.
+"""
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model, hashers
+from django.contrib.auth.backends import ModelBackend
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+import asyncio
+
+
+class PBKDF2PasswordHasher(hashers.PBKDF2PasswordHasher):
+    iterations = settings.PBKDF2_ITERATIONS or hashers.PBKDF2PasswordHasher.iterations
+
+
+class ScryptPasswordHasher(hashers.ScryptPasswordHasher):
+    work_factor = settings.SCRYPT_WORK_FACTOR
+    block_size = settings.SCRYPT_BLOCK_SIZE
+    parallelism = settings.SCRYPT_PARALLELISM
+
+
+class Argon2PasswordHasher(hashers.Argon2PasswordHasher):
+    time_cost = settings.ARGON2_TIME_COST
+    memory_cost = settings.ARGON2_MEMORY_COST
+    parallelism = settings.ARGON2_PARALLELISM
+
+
+_executor = None
+_executor_lock = Lock()
+
+
+def hash_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=settings.PASSWORD_HASH_WORKERS, thread_name_prefix="password-hash")
+        return _executor
+
+
+def run_hash(func, *args):
+    if not settings.PASSWORD_HASH_WORKERS:
+        return func(*args)
+    return hash_executor().submit(func, *args).result()
+
+
+async def arun_hash(func, *args):
+    if not settings.PASSWORD_HASH_WORKERS:
+        return await sync_to_async(func, thread_sensitive=False)(*args)
+    return await asyncio.wrap_future(hash_executor().submit(func, *args))
+
+
+class PasswordCheckBackend(ModelBackend):
+    """ModelBackend whose password hashing runs on the hash pool.
+
+    Only the hashing leaves the request's thread; the user lookup and the
+    save of an upgraded hash use the request's own database connection.
+    """
+
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        UserModel = get_user_model()
+        if username is None:
+            username = kwargs.get(UserModel.USERNAME_FIELD)
+        if username is None or password is None:
+            return None
+        try:
+            user = UserModel._default_manager.get_by_natural_key(username)
+        except UserModel.DoesNotExist:
+            # Hash anyway so a missing user takes as long as a wrong password
+            run_hash(hashers.make_password, password)
+            return None
+        is_correct, must_update = run_hash(hashers.verify_password, password, user.password)
+        if is_correct and must_update:
+            user.password = run_hash(hashers.make_password, password)
+            user.save(update_fields=["password"])
+        if is_correct and self.user_can_authenticate(user):
+            return user
+        return None
+
+    async def aauthenticate(self, request, username=None, password=None, **kwargs):
+        UserModel = get_user_model()
+        if username is None:
+            username = kwargs.get(UserModel.USERNAME_FIELD)
+        if username is None or password is None:
+            return None
+        try:
+            user = await UserModel._default_manager.aget_by_natural_key(username)
+        except UserModel.DoesNotExist:
+            await arun_hash(hashers.make_password, password)
+            return None
+        is_correct, must_update = await arun_hash(hashers.verify_password, password, user.password)
+        if is_correct and must_update:
+            user.password = await arun_hash(hashers.make_password, password)
+            await user.asave(update_fields=["password"])
+        if is_correct and self.user_can_authenticate(user):
+            return user
+        return None
@@ -0,0 +1,173 @@
+"""Filtered account history with running balances.
+
+History is read from the account's postings rather than its
+transactions, so archived months cost the same as recent ones and every
+row carries a signed amount and its journal entry's type.
+
+A page takes two queries on the (account, created_at, id) index. The
+first is the filtered keyset page itself. The second walks every
+posting from the page's upper bound down to its last row, filtered or
+not, and a window SUM gives each one the total of everything newer than
+it within that span. A row's balance is the page anchor, the balance
+right after the span's upper bound, less that sum. The first page's
+anchor is the account's balance, less the DailyActivity rollups (or,
+without them, the postings) of the days after an end date; later pages carry theirs in the signed cursor,
+so going deeper into history never sums the postings in between again.
+
+``totals`` reads the rollups too, unless an amount filter means only the
+postings themselves can answer or the account's rollups don't reach back
+to its first posting.
+"""
+from django.core import signing
+from django.db.models import Count, F, Q, Sum, Window
+from django.db.models.expressions import RowRange
+from django.utils import timezone
+from .models import DailyActivity, JournalEntry, Posting
+from datetime import datetime, time, timedelta
+from decimal import Decimal, InvalidOperation
+
+PAGE_SIZE = 50
+CENT = Decimal("0.01")
+CURSOR_SALT = "core.history.cursor"
+TYPE_LABELS = dict(JournalEntry.ENTRY_TYPES)
+
+
+def day_start(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def money(value):
+    # SQLite returns window sums as floats
+    return Decimal(str(value or 0)).quantize(CENT)
+
+
+def make_cursor(posting, balance_before):
+    return signing.dumps([posting.created_at.isoformat(), posting.pk, str(balance_before)], salt=CURSOR_SALT)
+
+
+def read_cursor(cursor):
+    """(created_at, id, balance before that posting) from a page cursor"""
+    try:
+        created_at, posting_id, balance = signing.loads(cursor, salt=CURSOR_SALT)
+        return datetime.fromisoformat(created_at), int(posting_id), Decimal(balance)
+    except (signing.BadSignature, InvalidOperation, ValueError, TypeError):
+        raise ValueError("Invalid page cursor")
+
+
+def categories(entry_type):
+    """DailyActivity categories an entry type is rolled up into"""
+    return ("TRANSFER_IN", "TRANSFER_OUT") if entry_type == "TRANSFER" else (entry_type,)
+
+
+def filtered(account, entry_type=None, start=None, end=None, min_amount=None, max_amount=None):
+    """The account's postings matching the filters; amounts are matched by size"""
+    postings = Posting.objects.filter(account=account)
+    if start is not None:
+        postings = postings.filter(created_at__gte=day_start(start))
+    if end is not None:
+        postings = postings.filter(created_at__lt=day_start(end + timedelta(days=1)))
+    if entry_type:
+        postings = postings.filter(entry__entry_type=entry_type)
+    if min_amount is not None:
+        postings = postings.filter(Q(amount__gte=min_amount) | Q(amount__lte=-min_amount))
+    if max_amount is not None:
+        postings = postings.filter(amount__gte=-max_amount, amount__lte=max_amount)
+    return postings
+
+
+def has_rollups(account):
+    """Whether the account's DailyActivity rows reach back to its first posting.
+
+    Accounts whose history predates the rollups, and was never rebuilt with
+    rollup_activity, have to be summed from the postings.
+    """
+    first_posting = Posting.objects.filter(account=account).order_by("created_at").values_list("created_at", flat=True).first()
+    if first_posting is None:
+        return True
+    first_day = DailyActivity.objects.filter(account=account).order_by("day").values_list("day", flat=True).first()
+    return first_day is not None and first_day <= timezone.localdate(first_posting)
+
+
+def totals(account, entry_type=None, start=None, end=None, min_amount=None, max_amount=None):
+    """Count, money in, money out and net change over every posting matching the filters"""
+    if min_amount is None and max_amount is None and has_rollups(account):
+        # Whole days of whole categories are already summed in the rollups
+        activity = DailyActivity.objects.filter(account=account)
+        if start is not None:
+            activity = activity.filter(day__gte=start)
+        if end is not None:
+            activity = activity.filter(day__lte=end)
+        if entry_type:
+            activity = activity.filter(category__in=categories(entry_type))
+        result = activity.aggregate(count=Sum("count"), money_in=Sum("money_in"), money_out=Sum("money_out"))
+        money_in, money_out = money(result["money_in"]), money(result["money_out"])
+    else:
+        result = filtered(account, entry_type, start, end, min_amount, max_amount).aggregate(
+            count=Count("pk"),
+            money_in=Sum("amount", filter=Q(amount__gt=0)),
+            money_out=Sum("amount", filter=Q(amount__lt=0)),
+        )
+        money_in, money_out = money(result["money_in"]), -money(result["money_out"])
+    return {"count": result["count"] or 0, "money_in": money_in, "money_out": money_out, "net": money_in - money_out}
+
+
+def before(created_at, posting_id):
+    """Postings older than the given one in history order"""
+    return Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=posting_id)
+
+
+def page(account, cursor=None, limit=PAGE_SIZE, entry_type=None, start=None, end=None, min_amount=None, max_amount=None):
+    """One page of history, newest first; returns (postings, cursor of the next page or None).
+
+    Each posting gets ``type_label`` and ``balance``, the account's
+    balance right after it.
+    """
+    postings = filtered(account, entry_type, start, end, min_amount, max_amount)
+    window = Posting.objects.filter(account=account)
+    if cursor:
+        created_at, posting_id, anchor = read_cursor(cursor)
+        postings = postings.filter(before(created_at, posting_id))
+        window = window.filter(before(created_at, posting_id))
+    else:
+        anchor = account.balance
+        if end is not None:
+            upper = day_start(end + timedelta(days=1))
+            if has_rollups(account):
+                # Whole days after the range, from the rollups
+                moved = DailyActivity.objects.filter(account=account, day__gt=end).aggregate(
+                    total=Sum(F("money_in") - F("money_out"))
+                )["total"]
+            else:
+                moved = Posting.objects.filter(account=account, created_at__gte=upper).aggregate(total=Sum("amount"))["total"]
+            anchor -= money(moved)
+            window = window.filter(created_at__lt=upper)
+    rows = list(postings.select_related("entry").order_by("-created_at", "-id")[:limit + 1])
+    if not rows:
+        return [], None
+
+    postings = rows[:limit]
+    oldest = postings[-1]
+    window = window.filter(Q(created_at__gt=oldest.created_at) | Q(created_at=oldest.created_at, id__gte=oldest.pk)).annotate(
+        moved_after=Window(
+            Sum("amount"),
+            order_by=[F("created_at").desc(), F("id").desc()],
+            frame=RowRange(start=None, end=-1),
+        ),
+    ).values("id", "moved_after")
+    # The window runs over every posting down to the page's last row and is only
+    # then narrowed to the page, so filtered-out postings still move the balance
+    sql, params = window.query.sql_with_params()
+    placeholders = ", ".join(["%s"] * len(postings))
+    moved_after = {
+        row.pk: row.moved_after
+        for row in Posting.objects.raw(
+            f"SELECT id, moved_after FROM ({sql}) history WHERE id IN ({placeholders})",
+            [*params, *(posting.pk for posting in postings)],
+        )
+    }
+    for posting in postings:
+        posting.balance = anchor - money(moved_after[posting.pk])
+        posting.type_label = TYPE_LABELS.get(posting.entry.entry_type, posting.entry.entry_type)
+    if len(rows) <= limit:
+        return postings, None
+    return postings, make_cursor(oldest, oldest.balance - oldest.amount)
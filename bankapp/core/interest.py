@@ -0,0 +1,151 @@
+"""Interest on savings accounts.
+
+``accrue`` works out one day's interest for every active savings account.
+A day's average balance is the mean of its opening and closing balance,
+both derived from the account's current balance and its DailyActivity
+rollups: the closing balance is today's balance less everything that
+moved after that day, and the opening balance is the closing balance
+less that day's own movements. Accounts are read in primary key order a
+chunk at a time, with one grouped query over the chunk's rollups, and
+the interest for the whole chunk is computed with NumPy. Each account
+earns SAVINGS_INTEREST_RATE / INTEREST_DAY_COUNT percent of a positive
+average balance per day.
+
+Accruals keep fractions of a cent and are worked out in whole cents and
+millionths, not floats, so they round the way the Decimal ledger does.
+``credit`` sums the uncredited accruals up to a month's end per account
+in SQL, rounds each total to the cent and posts it through a LedgerBatch
+against the INTEREST external account, with the chunk's accounts locked
+so concurrent payments cannot race it, marking the accruals credited in
+the same transaction. A total that rounds to nothing
+stays uncredited and is carried into the next month. Re-running either
+step for a day or month already done changes nothing.
+"""
+from django.conf import settings
+from django.db import transaction as db_transaction
+from django.db.models import F, Q, Sum
+from django.utils import timezone
+from .models import BankAccount, DailyActivity, InterestAccrual
+from .services import LedgerBatch, lock_accounts
+from calendar import monthrange
+from decimal import Decimal, ROUND_HALF_EVEN
+
+CHUNK_SIZE = 10000
+CENT = Decimal("0.01")
+
+
+def savings_accounts():
+    return BankAccount.objects.filter(account_type="SAVINGS", is_active=True)
+
+
+def cents(value):
+    # SQLite returns sums as floats
+    return int((Decimal(str(value or 0)) * 100).to_integral_value(ROUND_HALF_EVEN))
+
+
+def halve_even(numerator, denominator):
+    """numerator / denominator rounded half to even, for non-negative integer arrays"""
+    import numpy as np
+
+    quotient, remainder = np.divmod(numerator, denominator)
+    return quotient + ((2 * remainder > denominator) | ((2 * remainder == denominator) & (quotient % 2 == 1)))
+
+
+def accrue(day, chunk_size=CHUNK_SIZE, rate=None, progress=None):
+    """Store ``day``'s interest for every savings account; returns (accounts, total interest)"""
+    import numpy as np
+
+    # Interest in millionths of the currency is average cents * 100 * rate / day count
+    rate_numerator, rate_denominator = Decimal(settings.SAVINGS_INTEREST_RATE if rate is None else rate).as_integer_ratio()
+    numerator = 100 * rate_numerator
+    denominator = settings.INTEREST_DAY_COUNT * rate_denominator
+    largest_balance = 10 ** BankAccount._meta.get_field("balance").max_digits
+    # Rates with many decimal places fall back to Python integers
+    dtype = np.int64 if largest_balance * 2 * numerator < np.iinfo(np.int64).max else object
+    net = F("money_in") - F("money_out")
+    accounts, total, last = 0, Decimal("0"), None
+    while True:
+        chunk = savings_accounts().order_by("pk")
+        if last is not None:
+            chunk = chunk.filter(pk__gt=last)
+        rows = list(chunk.values_list("pk", "balance")[:chunk_size])
+        if not rows:
+            break
+        last = rows[-1][0]
+        account_ids = [account_id for account_id, _ in rows]
+        position = {account_id: index for index, account_id in enumerate(account_ids)}
+        balances = np.array([cents(balance) for _, balance in rows], dtype=dtype)
+        after = np.zeros(len(rows), dtype=dtype)
+        during = np.zeros(len(rows), dtype=dtype)
+        activity = (
+            DailyActivity.objects.filter(account_id__in=account_ids, day__gte=day)
+            .values("account_id")
+            .annotate(after=Sum(net, filter=Q(day__gt=day)), during=Sum(net, filter=Q(day=day)))
+            .values_list("account_id", "after", "during")
+        )
+        for account_id, moved_after, moved_during in activity:
+            after[position[account_id]] = cents(moved_after)
+            during[position[account_id]] = cents(moved_during)
+
+        # Whole cents throughout, so rounding matches the Decimal ledger
+        closing = balances - after
+        average = halve_even(np.maximum(2 * closing - during, 0), 2)
+        interest = halve_even(average * numerator, denominator)
+        earning = np.flatnonzero(interest)
+        accruals = [
+            InterestAccrual(
+                account_id=account_ids[index],
+                day=day,
+                average_balance=Decimal(int(average[index])).scaleb(-2),
+                amount=Decimal(int(interest[index])).scaleb(-6),
+            )
+            for index in earning.tolist()
+        ]
+        InterestAccrual.objects.bulk_create(accruals, batch_size=2000, ignore_conflicts=True)
+        accounts += len(accruals)
+        total += Decimal(int(interest[earning].sum())).scaleb(-6)
+        if progress:
+            progress(accounts, total)
+    return accounts, total
+
+
+def month_bounds(month):
+    """First and last day of the month ``month`` (any date in it) falls in"""
+    start = month.replace(day=1)
+    return start, start.replace(day=monthrange(start.year, start.month)[1])
+
+
+def credit(month, chunk_size=CHUNK_SIZE, progress=None):
+    """Post each account's uncredited interest for ``month``; returns (accounts credited, total)"""
+    start, end = month_bounds(month)
+    description = f"Interest for {start:%B %Y}"
+    accounts, total, last = 0, Decimal("0"), None
+    while True:
+        # Totals too small to post in earlier months are carried into this one
+        due = InterestAccrual.objects.filter(credited=False, day__lte=end)
+        if last is not None:
+            due = due.filter(account_id__gt=last)
+        rows = list(due.values("account_id").annotate(total=Sum("amount")).order_by("account_id").values_list("account_id", "total")[:chunk_size])
+        if not rows:
+            break
+        last = rows[-1][0]
+        account_ids = [account_id for account_id, _ in rows]
+        with db_transaction.atomic():
+            chunk = lock_accounts(account_ids)
+            batch = LedgerBatch(timezone.now())
+            posted = []
+            for account_id, earned in rows:
+                amount = earned.quantize(CENT, rounding=ROUND_HALF_EVEN)
+                if amount <= 0:
+                    continue
+                account = chunk[account_id]
+                posted.append(account_id)
+                batch.post("INTEREST", description, [(account, "", amount), (None, "INTEREST", -amount)])
+                batch.transaction(account, amount, "DEPOSIT", description)
+                accounts += 1
+                total += amount
+            batch.flush()
+            InterestAccrual.objects.filter(credited=False, day__lte=end, account_id__in=posted).update(credited=True)
+        if progress:
+            progress(accounts, total)
+    return accounts, total
@@ -0,0 +1,365 @@
+"""Asyncio HTTP load-test driver for the customer flows.
+
+Every virtual user logs in as one customer created by seed_bank and keeps
+a single keep-alive HTTP/1.1 connection to the server under test, then
+loops over a weighted mix of actions until the run ends. Requests are
+timed one by one and filed under the name of the URL pattern they hit in
+web/urls.py, so receipt ids and the like collapse into a single endpoint.
+"""
+from django.urls import reverse, resolve, Resolver404
+from django.utils import timezone
+from .seeding import SEED_PASSWORD, SEED_PIN, account_number_for
+from collections import Counter, defaultdict
+from datetime import timedelta
+from decimal import Decimal
+from http.cookies import SimpleCookie
+from time import perf_counter
+from urllib.parse import urlencode, urljoin, urlsplit
+import asyncio
+import random
+
+# Action name (a URL name from web/urls.py) and its relative weight
+WORKLOAD = (
+    ("dashboard", 40),
+    ("deposit", 15),
+    ("transfer", 15),
+    ("pay_bill", 10),
+    ("request_bank_statement", 5),
+    ("receipts_list", 10),
+    ("notifications", 5),
+)
+MAX_REDIRECTS = 5
+# Forms that re-render with 200 on failure show this only when they worked
+SUCCESS_MARKER = b"alert-success"
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of an already sorted list"""
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def parse_workload(spec):
+    """Parse ``dashboard=40,deposit=15`` into a workload, keeping the default weights for unlisted actions"""
+    weights = dict(WORKLOAD)
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        name, _, weight = item.partition("=")
+        if name not in weights:
+            raise ValueError(f"Unknown action {name!r}, expected one of {', '.join(weights)}")
+        try:
+            weights[name] = float(weight)
+        except ValueError:
+            raise ValueError(f"Weight for {name!r} must be a number")
+        if weights[name] < 0:
+            raise ValueError(f"Weight for {name!r} cannot be negative")
+    if not any(weights.values()):
+        raise ValueError("At least one action needs a positive weight")
+    return tuple(weights.items())
+
+
+class Response:
+    def __init__(self, status, headers, body):
+        self.status = status
+        self.headers = headers
+        self.body = body
+
+    def header(self, name, default=""):
+        for key, value in self.headers:
+            if key == name:
+                return value
+        return default
+
+
+class Connection:
+    """Just enough HTTP/1.1 for a Django site: keep-alive, chunked bodies and a cookie jar"""
+
+    def __init__(self, base_url, timeout):
+        parts = urlsplit(base_url)
+        if parts.scheme not in ("http", "https"):
+            raise ValueError(f"Unsupported URL scheme {parts.scheme!r}")
+        self.origin = f"{parts.scheme}://{parts.netloc}"
+        self.netloc = parts.netloc
+        self.host = parts.hostname
+        self.port = parts.port or (443 if parts.scheme == "https" else 80)
+        self.ssl = parts.scheme == "https"
+        self.timeout = timeout
+        self.cookies = {}
+        self.reader = self.writer = None
+
+    async def connect(self):
+        self.reader, self.writer = await asyncio.wait_for(
+            asyncio.open_connection(self.host, self.port, ssl=self.ssl or None), self.timeout
+        )
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+        self.reader = self.writer = None
+
+    async def request(self, method, path, data=None):
+        body = urlencode(data).encode() if data is not None else b""
+        headers = {
+            "Host": self.netloc,
+            "User-Agent": "bankapp-loadtest",
+            "Accept-Encoding": "identity",
+            "Connection": "keep-alive",
+            # Django checks the referer of secure POSTs against the host
+            "Referer": self.origin + path,
+        }
+        if method == "POST":
+            headers["X-CSRFToken"] = self.cookies.get("csrftoken", "")
+            headers["Content-Type"] = "application/x-www-form-urlencoded"
+            headers["Content-Length"] = str(len(body))
+        if self.cookies:
+            headers["Cookie"] = "; ".join(f"{name}={value}" for name, value in self.cookies.items())
+        raw = f"{method} {path} HTTP/1.1\r\n".encode() + b"".join(
+            f"{name}: {value}\r\n".encode("latin-1") for name, value in headers.items()
+        ) + b"\r\n" + body
+
+        for attempt in range(2):
+            reused = self.writer is not None
+            if not reused:
+                await self.connect()
+            try:
+                self.writer.write(raw)
+                await self.writer.drain()
+                response = await asyncio.wait_for(self.read_response(method), self.timeout)
+                break
+            except (ConnectionError, asyncio.IncompleteReadError):
+                self.close()
+                # The server may drop an idle keep-alive connection; retry once on a fresh one
+                if not reused or attempt:
+                    raise
+            except BaseException:
+                self.close()
+                raise
+
+        for name, value in response.headers:
+            if name == "set-cookie":
+                for morsel in SimpleCookie(value).values():
+                    if morsel["max-age"] == "0" or not morsel.value:
+                        self.cookies.pop(morsel.key, None)
+                    else:
+                        self.cookies[morsel.key] = morsel.value
+        if response.header("connection").lower() == "close":
+            self.close()
+        return response
+
+    async def read_response(self, method):
+        status_line = await self.reader.readline()
+        if not status_line:
+            raise ConnectionResetError("Server closed the connection")
+        status = int(status_line.split()[1])
+        headers = []
+        while True:
+            line = await self.reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers.append((name.strip().lower(), value.strip()))
+        response = Response(status, headers, b"")
+
+        if method == "HEAD" or status in (204, 304) or status < 200:
+            return response
+        if response.header("transfer-encoding").lower() == "chunked":
+            chunks = []
+            while True:
+                size = int((await self.reader.readline()).split(b";")[0], 16)
+                if size == 0:
+                    # Skip trailers up to the blank line
+                    while (await self.reader.readline()) not in (b"\r\n", b"\n", b""):
+                        pass
+                    break
+                chunks.append(await self.reader.readexactly(size))
+                await self.reader.readexactly(2)
+            response.body = b"".join(chunks)
+        elif response.header("content-length"):
+            response.body = await self.reader.readexactly(int(response.header("content-length")))
+        else:
+            # No length: the body runs until the server closes the connection
+            response.body = await self.reader.read()
+            response.headers.append(("connection", "close"))
+        return response
+
+
+class EndpointStats:
+    def __init__(self):
+        self.latencies = []
+        self.errors = 0
+        self.statuses = Counter()
+
+    def summary(self, elapsed):
+        latencies = sorted(self.latencies)
+        requests = len(latencies)
+        return {
+            "requests": requests,
+            "errors": self.errors,
+            "error_rate": round(self.errors / requests, 4) if requests else 0.0,
+            "throughput_rps": round(requests / elapsed, 2) if elapsed else 0.0,
+            "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+            "p95_ms": round(percentile(latencies, 0.95) * 1000, 2),
+            "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+            "max_ms": round(latencies[-1] * 1000, 2) if latencies else 0.0,
+            "statuses": dict(sorted(self.statuses.items())),
+        }
+
+
+class VirtualUser:
+    def __init__(self, test, index):
+        self.test = test
+        self.index = index
+        self.rng = random.Random(f"{test.seed}:{index}")
+        self.connection = Connection(test.base_url, test.timeout)
+
+    def amount(self, low, high):
+        return str(Decimal(self.rng.uniform(low, high)).quantize(Decimal("0.01")))
+
+    async def fetch(self, method, path, data=None, expect=(200,), check=None):
+        """Issue a request and follow its redirects, recording every hop; returns whether it all worked"""
+        for _ in range(MAX_REDIRECTS + 1):
+            started = perf_counter()
+            try:
+                response = await self.connection.request(method, path, data)
+            except (OSError, EOFError, ValueError, asyncio.TimeoutError) as e:
+                self.test.record(path, perf_counter() - started, type(e).__name__, ok=False)
+                return False
+            ok = response.status in expect and (check is None or check(response))
+            self.test.record(path, perf_counter() - started, response.status, ok=ok)
+            if not ok:
+                return False
+            if response.status not in (301, 302, 303, 307, 308):
+                return True
+            location = urlsplit(urljoin(self.connection.origin + path, response.header("location")))
+            path = location.path + (f"?{location.query}" if location.query else "")
+            method, data, expect, check = "GET", None, (200,), None
+        return False
+
+    async def login(self):
+        login_path = reverse("login")
+        # The login page hands out the CSRF cookie
+        if not await self.fetch("GET", login_path):
+            return False
+        return await self.fetch("POST", login_path, {
+            "username": self.test.email_for(self.index),
+            "password": SEED_PASSWORD,
+        }, expect=(302,))
+
+    async def dashboard(self):
+        await self.fetch("GET", reverse("dashboard"))
+
+    async def receipts_list(self):
+        await self.fetch("GET", reverse("receipts_list"))
+
+    async def notifications(self):
+        await self.fetch("GET", reverse("notifications"))
+
+    async def deposit(self):
+        await self.fetch("POST", reverse("deposit"), {"amount": self.amount(20, 200)}, expect=(302,))
+
+    async def transfer(self):
+        recipient = self.rng.randrange(self.test.population - 1)
+        recipient += recipient >= self.index
+        await self.fetch("POST", reverse("transfer"), {
+            "recipient_account_number": account_number_for(self.test.seed, recipient),
+            "amount": self.amount(1, 20),
+        }, expect=(302,))
+
+    async def pay_bill(self):
+        await self.fetch("POST", reverse("pay_bill"), {
+            "bill_type": "ELECTRICITY",
+            "provider_name": "Load Test Utility",
+            "account_number": str(100000 + self.index),
+            "amount": self.amount(5, 50),
+            "pin": SEED_PIN,
+        }, check=lambda response: SUCCESS_MARKER in response.body)
+
+    async def request_bank_statement(self):
+        # Same settings as the server, so "today" agrees with its date validation
+        end = timezone.localdate()
+        start = end - timedelta(days=self.rng.choice((30, 90, 180)))
+        await self.fetch("POST", reverse("request_bank_statement"), {
+            "start_date": start.isoformat(),
+            "end_date": end.isoformat(),
+            "format_type": "PDF",
+        }, check=lambda response: SUCCESS_MARKER in response.body)
+
+
+class LoadTest:
+    """Closed-loop load test: ``users`` virtual users, each waiting for its response before the next request"""
+
+    def __init__(self, base_url, users, population=None, seed=0, duration=60, ramp_up=0, think_time=0,
+                 workload=WORKLOAD, timeout=30):
+        population = population or users
+        if users > population:
+            raise ValueError("Cannot run more virtual users than there are seeded users")
+        if population < 2:
+            raise ValueError("Transfers need at least two seeded users")
+        self.base_url = base_url.rstrip("/")
+        self.users = users
+        self.population = population
+        self.seed = seed
+        self.duration = duration
+        self.ramp_up = ramp_up
+        self.think_time = think_time
+        self.actions = [name for name, _ in workload]
+        self.weights = [weight for _, weight in workload]
+        self.timeout = timeout
+        self.stats = defaultdict(EndpointStats)
+        self.errors = Counter()
+
+    def email_for(self, index):
+        return f"user{self.seed}-{index}@example.com"
+
+    def endpoint_name(self, path):
+        try:
+            return resolve(urlsplit(path).path).url_name or path
+        except Resolver404:
+            return path
+
+    def record(self, path, seconds, status, ok):
+        stats = self.stats[self.endpoint_name(path)]
+        stats.latencies.append(seconds)
+        stats.statuses[str(status)] += 1
+        if not ok:
+            stats.errors += 1
+            self.errors[str(status)] += 1
+
+    async def run_user(self, index, delay, deadline):
+        loop = asyncio.get_running_loop()
+        await asyncio.sleep(delay)
+        user = VirtualUser(self, index)
+        try:
+            if not await user.login():
+                return
+            while loop.time() < deadline:
+                action = user.rng.choices(self.actions, weights=self.weights)[0]
+                await getattr(user, action)()
+                if self.think_time:
+                    await asyncio.sleep(user.rng.expovariate(1 / self.think_time))
+        finally:
+            user.connection.close()
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        started = perf_counter()
+        deadline = loop.time() + self.ramp_up + self.duration
+        indexes = random.Random(self.seed).sample(range(self.population), self.users)
+        await asyncio.gather(*(
+            self.run_user(index, self.ramp_up * position / self.users, deadline)
+            for position, index in enumerate(indexes)
+        ))
+        elapsed = perf_counter() - started
+
+        endpoints = {name: stats.summary(elapsed) for name, stats in sorted(self.stats.items())}
+        total = EndpointStats()
+        for stats in self.stats.values():
+            total.latencies.extend(stats.latencies)
+            total.errors += stats.errors
+            total.statuses.update(stats.statuses)
+        return {
+            "elapsed_seconds": round(elapsed, 3),
+            "total": total.summary(elapsed),
+            "endpoints": endpoints,
+            "errors": dict(self.errors.most_common()),
+        }
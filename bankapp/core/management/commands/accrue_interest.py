@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from core.interest import CHUNK_SIZE, accrue
+from datetime import date, timedelta
+from time import perf_counter
+import importlib.util
+
+
+class Command(BaseCommand):
+    help = "Accrue a day's interest on every savings account (yesterday by default)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--day", help="Day to accrue (YYYY-MM-DD); must be over")
+        parser.add_argument("--since", help="Also accrue every day from this one (YYYY-MM-DD) to --day, to catch up")
+        parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="Accounts computed per batch")
+
+    def handle(self, *args, **options):
+        if not importlib.util.find_spec("numpy"):
+            raise CommandError("accrue_interest needs NumPy; install it with pip install numpy")
+        if options["chunk_size"] < 1:
+            raise CommandError("--chunk-size must be at least 1")
+        today = timezone.localdate()
+        try:
+            last = date.fromisoformat(options["day"]) if options["day"] else today - timedelta(days=1)
+            first = date.fromisoformat(options["since"]) if options["since"] else last
+        except ValueError:
+            raise CommandError("--day and --since must be dates in YYYY-MM-DD format")
+        if last >= today:
+            raise CommandError("Only days that are over can be accrued")
+        if first > last:
+            raise CommandError("--since must not be after --day")
+
+        day = first
+        while day <= last:
+            started = perf_counter()
+            accounts, total = accrue(day, chunk_size=options["chunk_size"])
+            elapsed = perf_counter() - started
+            self.stdout.write(
+                f"{day}: accrued {total:,.6f} of interest for {accounts:,} account(s) in {elapsed:.1f}s "
+                f"({accounts / elapsed if elapsed else 0:,.0f}/s)"
+            )
+            day += timedelta(days=1)
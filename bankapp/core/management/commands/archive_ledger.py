@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from core.archive import add_months, month_start, period_start, archive_transactions, archive_receipts
+from core.models import Transaction, Receipt
+
+
+class Command(BaseCommand):
+    help = "Move transactions and receipts of closed months into compressed archive tables"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--keep-months",
+            type=int,
+            default=12,
+            help="Number of recent months (including the current one) to keep in the hot tables",
+        )
+
+    def handle(self, *args, **options):
+        keep_months = options["keep_months"]
+        if keep_months < 1:
+            raise CommandError("--keep-months must be at least 1")
+
+        cutoff = add_months(month_start(timezone.localdate()), 1 - keep_months)
+        oldest = [
+            timezone.localtime(value).date()
+            for value in (
+                Transaction.objects.filter(timestamp__lt=period_start(cutoff)).order_by("timestamp").values_list("timestamp", flat=True).first(),
+                Receipt.objects.filter(created_at__lt=period_start(cutoff)).order_by("created_at").values_list("created_at", flat=True).first(),
+            )
+            if value is not None
+        ]
+        if not oldest:
+            self.stdout.write("Nothing to archive.")
+            return
+
+        period = month_start(min(oldest))
+        while period < cutoff:
+            # Transactions go first so their receipt links are gone before receipts move
+            transactions = archive_transactions(period)
+            receipts = archive_receipts(period)
+            if transactions or receipts:
+                self.stdout.write(f"{period:%Y-%m}: archived {transactions} transaction(s), {receipts} receipt(s)")
+            period = add_months(period, 1)
+
+        self.stdout.write(self.style.SUCCESS(f"Archived all periods before {cutoff:%Y-%m}."))
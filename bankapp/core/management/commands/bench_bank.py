@@ -0,0 +1,160 @@
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client
+from django.utils import timezone
+from core.fraud import profiles, risk_score
+from core.models import User, BankAccount, Notification, Loan, BillPayment, Receipt
+from core.pins import check_pin
+from core.seeding import seed_bank, SEED_PIN
+from core.services import deposit, withdraw, transfer
+from datetime import timedelta
+from decimal import Decimal
+from statistics import mean, median
+from time import perf_counter
+from io import StringIO
+import json
+import platform
+import subprocess
+
+import django
+
+SEED_DAYS = 365
+
+
+class Command(BaseCommand):
+    help = "Seed a throwaway test database and time the core banking paths, optionally writing JSON results"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=200)
+        parser.add_argument("--transactions", type=int, default=50, help="Transactions per account")
+        parser.add_argument("--repeat", type=int, default=20, help="Timed runs per scenario")
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--output", help="Write results as JSON to this path")
+
+    def handle(self, *args, **options):
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            started = perf_counter()
+            rows = seed_bank(users=options["users"], transactions_per_account=options["transactions"], days=SEED_DAYS, seed=options["seed"])
+            since = timezone.localdate(timezone.now() - timedelta(days=SEED_DAYS))
+            call_command("rollup_activity", since=since.isoformat(), stdout=StringIO())
+            seed_seconds = perf_counter() - started
+            results = self.run_scenarios(options["repeat"])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        report = {
+            "meta": {
+                "commit": self.git_commit(),
+                "created_at": timezone.now().isoformat(),
+                "python": platform.python_version(),
+                "django": django.get_version(),
+                "database": connection.vendor,
+                "repeat": options["repeat"],
+                "seed": options["seed"],
+                "seed_seconds": round(seed_seconds, 3),
+                "rows": rows,
+            },
+            "results": results,
+        }
+
+        for name, result in results.items():
+            self.stdout.write(
+                f"{name:<32} median {result['median_ms']:>8.2f} ms   p95 {result['p95_ms']:>8.2f} ms   queries {result['queries']}"
+            )
+        if options["output"]:
+            with open(options["output"], "w") as output:
+                json.dump(report, output, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Wrote {options['output']}"))
+
+    def git_commit(self):
+        try:
+            return subprocess.run(
+                ["git", "rev-parse", "HEAD"], cwd=settings.BASE_DIR, capture_output=True, text=True, check=True
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+    def measure(self, func, repeat):
+        timings, queries = [], []
+        for run in range(repeat):
+            count = [0]
+
+            def counter(execute, sql, params, many, context):
+                count[0] += 1
+                return execute(sql, params, many, context)
+
+            with connection.execute_wrapper(counter):
+                started = perf_counter()
+                func(run)
+                timings.append((perf_counter() - started) * 1000)
+            queries.append(count[0])
+
+        timings.sort()
+        return {
+            "runs": repeat,
+            "min_ms": round(timings[0], 3),
+            "median_ms": round(median(timings), 3),
+            "p95_ms": round(timings[min(len(timings) - 1, int(len(timings) * 0.95))], 3),
+            "mean_ms": round(mean(timings), 3),
+            "queries": int(median(queries)),
+        }
+
+    def run_scenarios(self, repeat):
+        accounts = list(BankAccount.objects.select_related("user").order_by("account_number")[:repeat * 2 + 2])
+        user = accounts[0].user
+        client = Client()
+        client.force_login(user)
+        admin = User.objects.create_superuser(email="bench-admin@example.com", password=None)
+        admin_client = Client()
+        admin_client.force_login(admin)
+
+        today = timezone.localdate()
+        receipt = Receipt.objects.filter(user=user).first()
+        notification_ids = list(Notification.objects.values_list("id", flat=True)[:100])
+        bill_ids = list(BillPayment.objects.values_list("id", flat=True)[:100])
+        loan_ids = list(Loan.objects.filter(status="PENDING").values_list("id", flat=True))
+        loan_batch = max(1, len(loan_ids) // repeat)
+        now = timezone.now().timestamp()
+        profile = profiles.get(accounts[0].pk, now)
+
+        def get(path):
+            return lambda run: self.expect_status(client.get(path))
+
+        def admin_action(model, action, ids):
+            return lambda run: self.expect_status(admin_client.post(
+                f"/admin/core/{model}/", {"action": action, "_selected_action": [str(pk) for pk in ids(run)]}
+            ), allowed=(200, 302))
+
+        scenarios = {
+            "services.deposit": lambda run: deposit(accounts[run], Decimal("25.00"), "Bench"),
+            "services.withdraw": lambda run: withdraw(accounts[run], Decimal("5.00"), "Bench"),
+            "services.transfer": lambda run: transfer(accounts[run], accounts[run + 1], Decimal("1.00"), "Bench"),
+            "pins.check_pin": lambda run: check_pin(user, SEED_PIN),
+            "fraud.score_x1000": lambda run: [risk_score(*profile.features(25.0, None, now)) for _ in range(1000)],
+            "view.dashboard": get("/dashboard/"),
+            "view.request_bank_statement": lambda run: self.expect_status(client.post("/statement/request/", {
+                "start_date": str(today - timedelta(days=90)),
+                "end_date": str(today),
+                "format_type": "PDF",
+            })),
+            "view.notifications": get("/notifications/"),
+            "view.loan_applications": get("/loan/applications/"),
+            "view.bank_statements": get("/statements/"),
+            "view.bill_payments": get("/bills/"),
+            "view.receipts_list": get("/receipts/"),
+            "view.receipt": get(f"/receipt/{receipt.id}/"),
+            "admin.notifications_mark_as_read": admin_action("notification", "mark_as_read", lambda run: notification_ids),
+            "admin.bills_mark_as_completed": admin_action("billpayment", "mark_as_completed", lambda run: bill_ids),
+            "admin.approve_loans": admin_action(
+                "loan", "approve_loans", lambda run: loan_ids[run * loan_batch:(run + 1) * loan_batch]
+            ),
+        }
+        return {name: self.measure(func, repeat) for name, func in scenarios.items()}
+
+    def expect_status(self, response, allowed=(200,)):
+        if response.status_code not in allowed:
+            raise RuntimeError(f"{response.request['PATH_INFO']} returned {response.status_code}")
+        return response
@@ -0,0 +1,88 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.utils import ConnectionHandler
+from statistics import mean, median
+from time import perf_counter
+import copy
+import importlib.util
+import json
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure per-request database overhead with a new connection per request, persistent connections "
+        "and (on Postgres with psycopg_pool installed) a connection pool"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=500, help="Simulated requests per profile")
+        parser.add_argument("--queries", type=int, default=3, help="Queries per simulated request")
+        parser.add_argument("--database", default="default")
+        parser.add_argument("--output", help="Write results as JSON to this path")
+
+    def handle(self, *args, **options):
+        if options["database"] not in connections:
+            raise CommandError(f"Unknown database {options['database']!r}")
+        base = copy.deepcopy(connections[options["database"]].settings_dict)
+        base["OPTIONS"].pop("pool", None)
+
+        profiles = {
+            "per_request": {"CONN_MAX_AGE": 0},
+            "persistent": {"CONN_MAX_AGE": None},
+        }
+        if base["ENGINE"] == "django.db.backends.postgresql" and importlib.util.find_spec("psycopg_pool"):
+            profiles["pool"] = {"CONN_MAX_AGE": 0, "OPTIONS": {**base["OPTIONS"], "pool": {"min_size": 1, "max_size": 2}}}
+
+        results = {}
+        for name, overrides in profiles.items():
+            settings_dict = {**copy.deepcopy(base), **overrides}
+            results[name] = self.measure(base, f"bench_{name}", settings_dict, options["requests"], options["queries"])
+            self.stdout.write(
+                f"{name:<12} median {results[name]['median_ms']:>7.3f} ms   p95 {results[name]['p95_ms']:>7.3f} ms"
+                f"   connections opened {results[name]['connections_opened']}"
+            )
+
+        setup = results["per_request"]["median_ms"] - results["persistent"]["median_ms"]
+        self.stdout.write(f"Connection setup costs about {setup:.3f} ms per request on {base['ENGINE'].rsplit('.', 1)[-1]}.")
+        if options["output"]:
+            with open(options["output"], "w") as output:
+                json.dump({"engine": base["ENGINE"], "results": results}, output, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Wrote {options['output']}"))
+
+    def measure(self, base, alias, settings_dict, requests, queries):
+        # A separate alias keeps Postgres pools (which are per alias) apart from the real one
+        handler = ConnectionHandler({"default": base, alias: settings_dict})
+        connection = handler[alias]
+        opened = [0]
+        connect = connection.connect
+
+        def counting_connect():
+            opened[0] += 1
+            connect()
+
+        connection.connect = counting_connect
+        timings = []
+        try:
+            for _ in range(requests):
+                started = perf_counter()
+                # What the request_started/request_finished signal handlers do
+                connection.close_if_unusable_or_obsolete()
+                with connection.cursor() as cursor:
+                    for _ in range(queries):
+                        cursor.execute("SELECT 1")
+                        cursor.fetchone()
+                connection.close_if_unusable_or_obsolete()
+                timings.append((perf_counter() - started) * 1000)
+        finally:
+            connection.close()
+            if getattr(connection, "pool", None) is not None:
+                connection.close_pool()
+
+        timings.sort()
+        return {
+            "requests": requests,
+            "median_ms": round(median(timings), 4),
+            "p95_ms": round(timings[min(len(timings) - 1, int(len(timings) * 0.95))], 4),
+            "mean_ms": round(mean(timings), 4),
+            "connections_opened": opened[0],
+        }
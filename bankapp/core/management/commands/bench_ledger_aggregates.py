@@ -0,0 +1,73 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction as db_transaction
+from django.utils import timezone
+from core.models import User, BankAccount, Transaction, JournalEntry, Posting
+from core.services import ledger_balance, statement_totals
+from datetime import timedelta
+from decimal import Decimal
+import random
+import time
+
+
+class Command(BaseCommand):
+    help = "Compare journal SUM aggregates with the Python loops they replaced, on throwaway synthetic data"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--transactions", type=int, default=50000)
+        parser.add_argument("--repeat", type=int, default=5)
+
+    def handle(self, *args, **options):
+        with db_transaction.atomic():
+            account = self.seed(options["transactions"])
+            start = timezone.now() - timedelta(days=180)
+            end = timezone.now()
+
+            loop = self.best_of(options["repeat"], lambda: self.python_statement(account, start, end))
+            aggregate = self.best_of(options["repeat"], lambda: statement_totals(account, start, end))
+            balance = self.best_of(options["repeat"], lambda: ledger_balance(account))
+
+            self.stdout.write(f"statement, Python loop over Transaction: {loop * 1000:.1f} ms")
+            self.stdout.write(f"statement, journal SUM aggregate:       {aggregate * 1000:.1f} ms")
+            self.stdout.write(f"balance, journal SUM aggregate:         {balance * 1000:.1f} ms")
+            db_transaction.set_rollback(True)
+
+    def best_of(self, repeat, func):
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            func()
+            timings.append(time.perf_counter() - started)
+        return min(timings)
+
+    def python_statement(self, account, start, end):
+        # What request_bank_statement used to do before the journal existed
+        transactions = account.transactions.filter(timestamp__gte=start, timestamp__lt=end).order_by("timestamp")
+        opening_balance = account.balance
+        for txn in transactions.reverse():
+            if txn.transaction_type == "DEPOSIT":
+                opening_balance -= txn.amount
+            elif txn.transaction_type == "WITHDRAW":
+                opening_balance += txn.amount
+        return opening_balance, transactions.count()
+
+    def seed(self, count):
+        user = User.objects.create_user(email=f"bench-{random.getrandbits(32)}@example.com", password=None)
+        account = BankAccount.objects.get(user=user)
+        now = timezone.now()
+        transactions, entries, postings = [], [], []
+        for i in range(count):
+            created_at = now - timedelta(days=179) * i / count
+            amount = Decimal(random.randint(100, 50000)) / 100
+            kind = random.choice(("DEPOSIT", "WITHDRAW"))
+            signed = amount if kind == "DEPOSIT" else -amount
+            transactions.append(Transaction(account=account, amount=amount, transaction_type=kind, timestamp=created_at))
+            entry = JournalEntry(entry_type=kind, created_at=created_at)
+            entries.append(entry)
+            postings.append(Posting(entry=entry, account=account, amount=signed, created_at=created_at))
+            postings.append(Posting(entry=entry, external_account="CASH", amount=-signed, created_at=created_at))
+        # auto_now_add stamps every Transaction with "now", which still
+        # falls inside the benchmarked period
+        Transaction.objects.bulk_create(transactions, batch_size=2000)
+        JournalEntry.objects.bulk_create(entries, batch_size=2000)
+        Posting.objects.bulk_create(postings, batch_size=2000)
+        return account
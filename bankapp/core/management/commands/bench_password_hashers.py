@@ -0,0 +1,103 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import override_settings
+from django.utils.module_loading import import_string
+from core.models import User
+from concurrent.futures import ThreadPoolExecutor
+from statistics import median
+from time import perf_counter
+import importlib.util
+import json
+
+PASSWORD = "bench-password"
+
+
+class Command(BaseCommand):
+    help = (
+        "Time each configured password hasher: verifications per second per core, throughput across threads "
+        "and, on a throwaway test database, the latency of a full POST /login/"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rounds", type=int, default=20, help="Timed verifications per hasher")
+        parser.add_argument("--threads", type=int, default=4, help="Threads for the parallel throughput run")
+        parser.add_argument("--hashers", default="", help="Comma-separated profiles to run, e.g. scrypt,argon2 (defaults to all)")
+        parser.add_argument("--skip-login", action="store_true", help="Only time the hashers, not the login view")
+        parser.add_argument("--output", help="Write results as JSON to this path")
+
+    def handle(self, *args, **options):
+        profiles = {path.rsplit(".", 1)[-1].removesuffix("PasswordHasher").lower(): path for path in settings.PASSWORD_HASHERS}
+        wanted = [name.strip() for name in options["hashers"].split(",") if name.strip()] or list(profiles)
+        unknown = set(wanted) - set(profiles)
+        if unknown:
+            raise CommandError(f"Unknown hasher(s) {', '.join(sorted(unknown))}; choose from {', '.join(profiles)}")
+        if "argon2" in wanted and not importlib.util.find_spec("argon2"):
+            self.stderr.write("Skipping argon2: argon2-cffi is not installed.")
+            wanted.remove("argon2")
+
+        hashers = {name: import_string(profiles[name])() for name in wanted}
+        results = {}
+        for name, hasher in hashers.items():
+            encoded = hasher.encode(PASSWORD, hasher.salt())
+            results[name] = {
+                "algorithm": hasher.algorithm,
+                "params": {key: value for key, value in hasher.decode(encoded).items() if key not in ("hash", "salt", "algorithm")},
+                **self.time_verify(hasher, encoded, options["rounds"], options["threads"]),
+            }
+        if not options["skip_login"]:
+            for name, login_ms in self.time_logins(hashers, options["rounds"]).items():
+                results[name]["login_median_ms"] = login_ms
+
+        for name, result in results.items():
+            login = f"   login {result['login_median_ms']:>8.2f} ms" if "login_median_ms" in result else ""
+            self.stdout.write(
+                f"{name:<8} verify {result['verify_median_ms']:>8.2f} ms   {result['logins_per_second_per_core']:>7.1f} logins/s/core"
+                f"   {result['logins_per_second_threaded']:>7.1f} logins/s on {options['threads']} threads{login}"
+            )
+        if options["output"]:
+            with open(options["output"], "w") as output:
+                json.dump({"preferred": settings.PASSWORD_HASHERS[0], "threads": options["threads"], "results": results}, output, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Wrote {options['output']}"))
+
+    def time_verify(self, hasher, encoded, rounds, threads):
+        timings = []
+        for _ in range(rounds):
+            started = perf_counter()
+            hasher.verify(PASSWORD, encoded)
+            timings.append(perf_counter() - started)
+        # The hashers release the GIL, so threads scale with cores
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            started = perf_counter()
+            list(pool.map(lambda _: hasher.verify(PASSWORD, encoded), range(rounds * threads)))
+            elapsed = perf_counter() - started
+        return {
+            "verify_median_ms": round(median(timings) * 1000, 3),
+            "logins_per_second_per_core": round(1 / median(timings), 1),
+            "logins_per_second_threaded": round(rounds * threads / elapsed, 1),
+        }
+
+    def time_logins(self, hashers, rounds):
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            results = {}
+            for name, hasher in hashers.items():
+                # As the preferred hasher, so the login does not rehash the password with another one
+                path = f"{type(hasher).__module__}.{type(hasher).__qualname__}"
+                preferred = [path] + [other for other in settings.PASSWORD_HASHERS if other != path]
+                with override_settings(RATE_LIMIT_ENABLED=False, PASSWORD_HASHERS=preferred):
+                    email = f"login-{name}@example.com"
+                    User.objects.create(email=email, password=hasher.encode(PASSWORD, hasher.salt()), is_approved=True)
+                    timings = []
+                    for _ in range(rounds):
+                        client = Client()
+                        started = perf_counter()
+                        response = client.post("/login/", {"username": email, "password": PASSWORD})
+                        timings.append(perf_counter() - started)
+                        if response.status_code != 302:
+                            raise CommandError(f"Login with {name} returned {response.status_code}")
+                    results[name] = round(median(timings) * 1000, 3)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+        return results
@@ -0,0 +1,58 @@
+from django.core.management.base import BaseCommand
+from core.models import generate_uuid7
+import os
+import sqlite3
+import tempfile
+import time
+import uuid
+
+KEY_GENERATORS = {
+    "uuid4": uuid.uuid4,
+    "uuid7": generate_uuid7,
+}
+
+
+class Command(BaseCommand):
+    help = "Compare insert throughput and primary-key index size of uuid4 and UUIDv7 keys in a scratch SQLite database"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=200000)
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        for name, generate in KEY_GENERATORS.items():
+            with tempfile.TemporaryDirectory() as directory:
+                path = os.path.join(directory, "bench.sqlite3")
+                elapsed = self.insert_rows(path, generate, options["rows"], options["batch_size"])
+                index_bytes, file_bytes = self.measure(path)
+            self.stdout.write(
+                f"{name}: {options['rows'] / elapsed:,.0f} rows/s, "
+                f"pk index {index_bytes / 1024 / 1024:.1f} MiB, database {file_bytes / 1024 / 1024:.1f} MiB"
+            )
+
+    def insert_rows(self, path, generate, rows, batch_size):
+        # Same column layout Django uses for a UUID primary key on SQLite
+        db = sqlite3.connect(path)
+        db.execute(
+            "CREATE TABLE ledger (id char(32) NOT NULL PRIMARY KEY, amount decimal NOT NULL, created_at datetime NOT NULL)"
+        )
+        started = time.perf_counter()
+        for offset in range(0, rows, batch_size):
+            batch = [(generate().hex, "10.00", "2026-01-01 00:00:00") for _ in range(min(batch_size, rows - offset))]
+            db.executemany("INSERT INTO ledger VALUES (?, ?, ?)", batch)
+            db.commit()
+        elapsed = time.perf_counter() - started
+        db.close()
+        return elapsed
+
+    def measure(self, path):
+        db = sqlite3.connect(path)
+        try:
+            index_bytes = db.execute(
+                "SELECT SUM(pgsize) FROM dbstat WHERE name = 'sqlite_autoindex_ledger_1'"
+            ).fetchone()[0] or 0
+        except sqlite3.OperationalError:
+            # dbstat is an optional SQLite build flag
+            index_bytes = 0
+        db.close()
+        return index_bytes, os.path.getsize(path)
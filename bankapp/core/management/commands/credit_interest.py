@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from core.interest import CHUNK_SIZE, credit, month_bounds
+from datetime import date, timedelta
+from time import perf_counter
+
+
+class Command(BaseCommand):
+    help = "Post a month's accrued interest to savings accounts through the ledger (last month by default)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--month", help="Month to credit (YYYY-MM)")
+        parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="Accounts credited per database transaction")
+
+    def handle(self, *args, **options):
+        if options["chunk_size"] < 1:
+            raise CommandError("--chunk-size must be at least 1")
+        if options["month"]:
+            try:
+                month = date.fromisoformat(f"{options['month']}-01")
+            except ValueError:
+                raise CommandError("--month must be in YYYY-MM format")
+        else:
+            month = timezone.localdate().replace(day=1) - timedelta(days=1)
+        if month_bounds(month)[1] >= timezone.localdate():
+            self.stderr.write("The month is not over yet; days accrued later will be credited by the next run.")
+        started = perf_counter()
+
+        def progress(accounts, total):
+            self.stdout.write(f"{accounts:,} account(s) credited ({accounts / (perf_counter() - started):,.0f}/s)")
+
+        accounts, total = credit(month, chunk_size=options["chunk_size"], progress=progress if options["verbosity"] > 1 else None)
+        self.stdout.write(self.style.SUCCESS(
+            f"Credited {total:,.2f} of interest for {month:%B %Y} to {accounts:,} account(s) in {perf_counter() - started:.1f}s."
+        ))
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand, CommandError
+from core.models import Loan
+from core.services import disburse_loans
+from time import perf_counter
+
+
+class Command(BaseCommand):
+    help = "Disburse every approved loan into its borrower's account through the ledger"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=1000, help="Loans disbursed per database transaction")
+        parser.add_argument("--limit", type=int, help="Disburse at most this many loans, oldest approval first")
+
+    def handle(self, *args, **options):
+        if options["chunk_size"] < 1:
+            raise CommandError("--chunk-size must be at least 1")
+        loan_ids = Loan.objects.filter(status="APPROVED").order_by("reviewed_at", "pk").values_list("pk", flat=True)
+        if options["limit"] is not None:
+            loan_ids = loan_ids[:options["limit"]]
+        started = perf_counter()
+        disbursed, errors = disburse_loans(loan_ids, chunk_size=options["chunk_size"])
+        for loan_id, error in errors.items():
+            self.stderr.write(f"Loan {loan_id}: {error}")
+        elapsed = perf_counter() - started
+        total = sum(loan.disbursed_amount for loan in disbursed)
+        self.stdout.write(self.style.SUCCESS(
+            f"Disbursed {len(disbursed):,} loan(s) totalling {total:,.2f} in {elapsed:.1f}s"
+            f" ({len(disbursed) / elapsed if elapsed else 0:,.0f}/s)."
+        ))
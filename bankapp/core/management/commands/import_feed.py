@@ -0,0 +1,60 @@
+from django.core.management.base import BaseCommand, CommandError
+from core.feeds import CHUNK_SIZE, FORMATS, import_feed
+from time import perf_counter
+import csv
+import os
+
+
+class Command(BaseCommand):
+    help = (
+        "Post a payment processor's CSV or OFX deposit file to the ledger in chunks, skipping references "
+        "already posted; re-running a failed import resumes it"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="CSV or OFX file")
+        parser.add_argument("--source", required=True, help="Processor the file came from, e.g. stripe")
+        parser.add_argument("--format", choices=FORMATS, help="File format (defaults to the file extension)")
+        parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="Rows per database transaction")
+        parser.add_argument("--rejects", help="Write rows that were not posted, with the reason, as CSV to this path")
+
+    def handle(self, *args, **options):
+        if not os.path.isfile(options["path"]):
+            raise CommandError(f"No such file: {options['path']}")
+        if options["chunk_size"] < 1:
+            raise CommandError("--chunk-size must be at least 1")
+        rejects_file = open(options["rejects"], "a", newline="") if options["rejects"] else None
+        rejects = None
+        if rejects_file:
+            writer = csv.writer(rejects_file)
+
+            def rejects(row, reason):
+                writer.writerow([row.get("reference", ""), row.get("account_number", ""), row.get("amount", ""), reason])
+
+        started = perf_counter()
+        ran = False
+
+        def progress(feed):
+            nonlocal ran
+            ran = True
+            if options["verbosity"] > 1:
+                self.stdout.write(f"{feed.rows_done:,} row(s) done ({feed.rows_done / (perf_counter() - started):,.0f} rows/s)")
+
+        try:
+            feed = import_feed(
+                options["path"], options["source"].strip().lower(), format=options["format"],
+                chunk_size=options["chunk_size"], rejects=rejects, progress=progress,
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+        finally:
+            if rejects_file:
+                rejects_file.close()
+        elapsed = perf_counter() - started
+        if not ran:
+            self.stdout.write(f"{feed.file_name} was already imported on {feed.finished_at:%Y-%m-%d %H:%M}.")
+            return
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {feed.file_name}: {feed.rows_done:,} row(s), {feed.posted:,} posted, {feed.duplicates:,} duplicate(s), "
+            f"{feed.rejected:,} rejected in {elapsed:.1f}s ({feed.rows_done / elapsed if elapsed else 0:,.0f} rows/s)."
+        ))
@@ -0,0 +1,93 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from core.loadtest import LoadTest, WORKLOAD, parse_workload
+import asyncio
+import json
+import subprocess
+
+
+class Command(BaseCommand):
+    help = (
+        "Replay a mixed customer workload against a running server (gunicorn, uvicorn, runserver) as users "
+        "created by seed_bank, and report throughput, latency percentiles and error rates per endpoint. "
+        "Start the server with RATE_LIMIT_ENABLED=False and VELOCITY_TRANSFERS_PER_MINUTE=0 unless the "
+        "throttles are what is being measured"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+        parser.add_argument("--users", type=int, default=50, help="Concurrent virtual users")
+        parser.add_argument("--population", type=int, help="Number of seeded users to pick from (defaults to --users)")
+        parser.add_argument("--seed", type=int, default=0, help="The seed the bank was created with")
+        parser.add_argument("--duration", type=float, default=60, help="Seconds of full load after ramp-up")
+        parser.add_argument("--ramp-up", type=float, default=10, help="Seconds over which virtual users start")
+        parser.add_argument("--think-time", type=float, default=0, help="Mean pause between a user's actions, in seconds")
+        parser.add_argument("--timeout", type=float, default=30, help="Per-request timeout in seconds")
+        parser.add_argument(
+            "--mix", default="",
+            help="Action weights, e.g. dashboard=10,transfer=5 (defaults: %s)" % ",".join(f"{name}={weight}" for name, weight in WORKLOAD),
+        )
+        parser.add_argument("--output", help="Write results as JSON to this path")
+
+    def handle(self, *args, **options):
+        try:
+            workload = parse_workload(options["mix"])
+            test = LoadTest(
+                options["base_url"],
+                users=options["users"],
+                population=options["population"],
+                seed=options["seed"],
+                duration=options["duration"],
+                ramp_up=options["ramp_up"],
+                think_time=options["think_time"],
+                workload=workload,
+                timeout=options["timeout"],
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(
+            f"Running {test.users} users against {test.base_url} for {options['ramp_up'] + options['duration']:.0f}s..."
+        )
+        results = asyncio.run(test.run())
+
+        self.stdout.write(
+            f"{'endpoint':<26}{'requests':>10}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>9}"
+        )
+        rows = list(results["endpoints"].items()) + [("TOTAL", results["total"])]
+        for name, row in rows:
+            self.stdout.write(
+                f"{name:<26}{row['requests']:>10}{row['throughput_rps']:>10.1f}{row['p50_ms']:>10.1f}"
+                f"{row['p95_ms']:>10.1f}{row['p99_ms']:>10.1f}{row['error_rate']:>9.1%}"
+            )
+        for status, count in results["errors"].items():
+            self.stdout.write(self.style.WARNING(f"{count} failed request(s): {status}"))
+
+        if options["output"]:
+            report = {
+                "meta": {
+                    "commit": self.git_commit(),
+                    "created_at": timezone.now().isoformat(),
+                    "base_url": test.base_url,
+                    "users": test.users,
+                    "population": test.population,
+                    "seed": test.seed,
+                    "duration": options["duration"],
+                    "ramp_up": options["ramp_up"],
+                    "think_time": options["think_time"],
+                    "workload": dict(workload),
+                },
+                "results": results,
+            }
+            with open(options["output"], "w") as output:
+                json.dump(report, output, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Wrote {options['output']}"))
+
+    def git_commit(self):
+        try:
+            return subprocess.run(
+                ["git", "rev-parse", "HEAD"], cwd=settings.BASE_DIR, capture_output=True, text=True, check=True
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
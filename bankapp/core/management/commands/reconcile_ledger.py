@@ -0,0 +1,58 @@
+from django.core.management.base import BaseCommand, CommandError
+from core.reconciliation import CHUNK_SIZE, alert_staff, reconcile
+from time import perf_counter
+import csv
+
+
+class Command(BaseCommand):
+    help = (
+        "Check that every account's balance equals the sum of its journal postings, optionally across "
+        "worker processes, and report the accounts that differ"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="Accounts per grouped query, roughly")
+        parser.add_argument("--workers", type=int, default=1, help="Worker processes, each with its own connection")
+        parser.add_argument("--output", help="Write the discrepancy report as CSV to this path")
+        parser.add_argument("--notify", action="store_true", help="Send staff a SECURITY notification if anything differs")
+        parser.add_argument("--top", type=int, default=20, help="Number of largest discrepancies to list")
+
+    def handle(self, *args, **options):
+        if options["chunk_size"] < 1 or options["workers"] < 1:
+            raise CommandError("--chunk-size and --workers must be at least 1")
+        started = perf_counter()
+
+        def progress(done, ranges):
+            self.stdout.write(f"{done:,}/{ranges:,} range(s) checked ({perf_counter() - started:.1f}s)")
+
+        accounts, discrepancies = reconcile(
+            chunk_size=options["chunk_size"],
+            workers=options["workers"],
+            progress=progress if options["verbosity"] > 1 else None,
+        )
+        elapsed = perf_counter() - started
+        self.stdout.write(
+            f"Checked {accounts:,} account(s) in {elapsed:.1f}s ({accounts / elapsed if elapsed else 0:,.0f}/s)."
+        )
+        for account_id, account_number, user_id, currency, balance, ledger in discrepancies[:options["top"]]:
+            self.stdout.write(
+                f"{account_number}  balance {balance:>14,.2f} {currency}  ledger {ledger:>14,.2f}  "
+                f"difference {balance - ledger:>+14,.2f}"
+            )
+
+        if options["output"]:
+            with open(options["output"], "w", newline="") as output:
+                writer = csv.writer(output)
+                writer.writerow(["account_id", "account_number", "user_id", "currency", "balance", "ledger", "difference"])
+                writer.writerows(
+                    [*row, f"{row[4] - row[5]:.2f}"] for row in discrepancies
+                )
+            self.stdout.write(f"Wrote {options['output']}")
+
+        if not discrepancies:
+            self.stdout.write(self.style.SUCCESS("Every balance matches the ledger."))
+            return
+        if options["notify"]:
+            sent = alert_staff(discrepancies, report=options["output"] or "")
+            self.stdout.write(f"Sent {sent} security notification(s) to staff.")
+        self.stdout.write(self.style.ERROR(f"{len(discrepancies):,} account(s) differ from the ledger."))
@@ -0,0 +1,55 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction as db_transaction
+from core.models import Transaction, Receipt, BillPayment, Notification, generate_uuid7
+
+# model, creation timestamp field
+REKEY_MODELS = {
+    "transaction": (Transaction, "timestamp"),
+    "receipt": (Receipt, "created_at"),
+    "billpayment": (BillPayment, "created_at"),
+}
+
+
+class Command(BaseCommand):
+    help = "Replace random (uuid4) primary keys with time-ordered UUIDv7 keys derived from each row's creation time"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--model", choices=sorted(REKEY_MODELS), action="append", help="Model to rekey (default: all)")
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        for name in options["model"] or sorted(REKEY_MODELS):
+            model, time_field = REKEY_MODELS[name]
+            count = self.rekey(model, time_field, options["batch_size"])
+            self.stdout.write(f"{name}: rekeyed {count} row(s)")
+        self.stdout.write(self.style.SUCCESS("Done."))
+
+    def rekey(self, model, time_field, batch_size):
+        rows = model.objects.order_by(time_field, "pk").values_list("pk", time_field)
+        rekeyed = 0
+        last_seen = None
+        while True:
+            page = rows.filter(**{f"{time_field}__gt": last_seen}) if last_seen else rows
+            batch = list(page[:batch_size])
+            if not batch:
+                return rekeyed
+            last_seen = batch[-1][1]
+            if len(batch) == batch_size:
+                # Pull in the rest of the boundary timestamp so the next page can skip it
+                seen = [pk for pk, created in batch if created == last_seen]
+                batch += list(rows.filter(**{time_field: last_seen}).exclude(pk__in=seen))
+
+            with db_transaction.atomic():
+                for old_id, created in batch:
+                    if old_id.version == 7:
+                        continue
+                    new_id = generate_uuid7(created)
+                    model.objects.filter(pk=old_id).update(id=new_id)
+                    self.update_references(model, old_id, new_id)
+                    rekeyed += 1
+
+    def update_references(self, model, old_id, new_id):
+        if model is Receipt:
+            Transaction.objects.filter(receipt_id=old_id).update(receipt_id=new_id)
+        elif model is BillPayment:
+            Notification.objects.filter(related_object_id=str(old_id)).update(related_object_id=str(new_id))
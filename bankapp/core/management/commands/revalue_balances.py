@@ -0,0 +1,83 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from core import fx
+from core.models import FxRevaluation
+from time import perf_counter
+import csv
+import importlib.util
+
+
+class Command(BaseCommand):
+    help = (
+        "Price every foreign-currency balance in the base currency at the current rates and record "
+        "the value and the gain or loss from rate moves since the last run per currency"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rates", help="Rates file to use instead of FX_RATES_FILE")
+        parser.add_argument("--chunk-size", type=int, default=100000, help="Balances priced per NumPy batch")
+        parser.add_argument("--dry-run", action="store_true", help="Report without recording the revaluation")
+        parser.add_argument("--output", help="Write each account's base-currency value as CSV to this path")
+
+    def handle(self, *args, **options):
+        if not importlib.util.find_spec("numpy"):
+            raise CommandError("revalue_balances needs NumPy; install it with pip install numpy")
+        try:
+            table = fx.load(options["rates"]) if options["rates"] else fx.rates()
+        except (OSError, ValueError, KeyError) as e:
+            raise CommandError(f"Could not read exchange rates: {e}")
+
+        output = open(options["output"], "w", newline="") if options["output"] else None
+        on_chunk = None
+        if output:
+            writer = csv.writer(output)
+            writer.writerow(["account_id", "currency", "balance", f"value_{settings.BASE_CURRENCY.lower()}"])
+
+            def on_chunk(account_ids, currencies, cents, base_cents):
+                writer.writerows(
+                    (account_id, currency, f"{balance / 100:.2f}", f"{value / 100:.2f}")
+                    for account_id, currency, balance, value in zip(account_ids, currencies, cents.tolist(), base_cents.tolist())
+                )
+
+        started = perf_counter()
+        try:
+            totals = fx.revalue(table, chunk_size=options["chunk_size"], on_chunk=on_chunk)
+        except ValueError as e:
+            raise CommandError(str(e))
+        finally:
+            if output:
+                output.close()
+        elapsed = perf_counter() - started
+        accounts = sum(count for count, _, _ in totals.values())
+        rate = accounts / elapsed if elapsed else 0
+        self.stdout.write(
+            f"Revalued {accounts} account(s) in {len(totals)} currenc{'y' if len(totals) == 1 else 'ies'} "
+            f"in {elapsed:.2f}s ({rate:,.0f}/s) with rates {table.version}."
+        )
+
+        now = timezone.now()
+        revaluations = []
+        for currency, (count, balance, base_value) in sorted(totals.items()):
+            previous = FxRevaluation.objects.filter(currency=currency).order_by("-created_at").first()
+            # Only the rate's move counts, not balances that changed since the last run
+            gain = (balance * (table.rates[currency] - previous.rate)).quantize(fx.CENT) if previous else 0
+            revaluations.append(FxRevaluation(
+                currency=currency,
+                rate=table.rates[currency],
+                rates_version=table.version,
+                accounts=count,
+                balance=balance,
+                base_value=base_value,
+                gain=gain,
+                created_at=now,
+            ))
+            self.stdout.write(
+                f"{currency}  {count:>8} account(s)  {balance:>16,.2f}  = {settings.BASE_CURRENCY} {base_value:>16,.2f}"
+                f"  ({gain:+,.2f})"
+            )
+        if not options["dry_run"]:
+            FxRevaluation.objects.bulk_create(revaluations)
+            self.stdout.write(self.style.SUCCESS(f"Recorded {len(revaluations)} revaluation(s)."))
+        if options["output"]:
+            self.stdout.write(self.style.SUCCESS(f"Wrote {options['output']}"))
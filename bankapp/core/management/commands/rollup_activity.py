@@ -0,0 +1,50 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Exists, OuterRef
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+from core.analytics import rebuild_activity
+from core.models import Posting, DailyActivity
+from datetime import date, timedelta
+
+
+def first_unrolled_day():
+    """Local day of the oldest customer posting without a rollup row for its account and day"""
+    created_at = (
+        Posting.objects.filter(account__isnull=False)
+        .annotate(day=TruncDate("created_at"))
+        .filter(~Exists(DailyActivity.objects.filter(account=OuterRef("account"), day=OuterRef("day"))))
+        .order_by("created_at")
+        .values_list("created_at", flat=True)
+        .first()
+    )
+    return timezone.localdate(created_at) if created_at else None
+
+
+class Command(BaseCommand):
+    help = "Rebuild daily activity rollups from the journal, catching up from the oldest day that is missing them"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--since",
+            help="First day to rebuild (YYYY-MM-DD); defaults to the oldest posting day without rollups, "
+                 "or the latest rolled-up day when none is missing",
+        )
+
+    def handle(self, *args, **options):
+        today = timezone.localdate()
+        if options["since"]:
+            try:
+                day = date.fromisoformat(options["since"])
+            except ValueError:
+                raise CommandError("--since must be a date in YYYY-MM-DD format")
+        else:
+            day = first_unrolled_day() or DailyActivity.objects.order_by("-day").values_list("day", flat=True).first()
+            if day is None:
+                self.stdout.write("No journal postings to roll up.")
+                return
+
+        total = 0
+        while day <= today:
+            total += rebuild_activity(day)
+            day += timedelta(days=1)
+        self.stdout.write(self.style.SUCCESS(f"Wrote {total} rollup row(s) up to {today}."))
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand, CommandError
+from core.scheduling import CHUNK_SIZE, run_due_transfers
+from time import perf_counter
+
+
+class Command(BaseCommand):
+    help = "Pay every standing order that is due, in chunks of locked, bulk-written transfers"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="Orders paid per database transaction")
+
+    def handle(self, *args, **options):
+        if options["chunk_size"] < 1:
+            raise CommandError("--chunk-size must be at least 1")
+        started = perf_counter()
+
+        def progress(totals):
+            done = totals["paid"] + totals["failed"]
+            self.stdout.write(f"{done:,} order(s) processed ({done / (perf_counter() - started):,.0f}/s)")
+
+        totals = run_due_transfers(chunk_size=options["chunk_size"], progress=progress if options["verbosity"] > 1 else None)
+        self.stdout.write(self.style.SUCCESS(
+            f"Paid {totals['paid']:,} standing order(s), {totals['failed']:,} failed, {totals['completed']:,} finished "
+            f"in {perf_counter() - started:.1f}s."
+        ))
@@ -0,0 +1,61 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from core.fraud import score_history, alert
+from core.models import Notification
+from datetime import date, datetime, time
+from time import perf_counter
+import importlib.util
+import json
+
+
+class Command(BaseCommand):
+    help = "Re-score outgoing payments in the journal for fraud risk, optionally notifying customers of new alerts"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--since", help="Only score payments from this day on (YYYY-MM-DD)")
+        parser.add_argument("--threshold", type=float, help="Report scores at or above this (defaults to FRAUD_ALERT_SCORE)")
+        parser.add_argument("--top", type=int, default=20, help="Number of highest-scoring payments to list")
+        parser.add_argument("--notify", action="store_true", help="Send SECURITY notifications for flagged payments not alerted yet")
+        parser.add_argument("--output", help="Write every flagged payment as JSON to this path")
+
+    def handle(self, *args, **options):
+        if not importlib.util.find_spec("numpy"):
+            raise CommandError("score_fraud needs NumPy; install it with pip install numpy")
+        since = None
+        if options["since"]:
+            try:
+                since = timezone.make_aware(datetime.combine(date.fromisoformat(options["since"]), time.min))
+            except ValueError:
+                raise CommandError("--since must be a date in YYYY-MM-DD format")
+        threshold = settings.FRAUD_ALERT_SCORE if options["threshold"] is None else options["threshold"]
+
+        started = perf_counter()
+        scored, events = score_history(since=since, threshold=threshold)
+        elapsed = perf_counter() - started
+        rate = scored / elapsed if elapsed else 0
+        self.stdout.write(
+            f"Scored {scored} payment(s) in {elapsed:.2f}s ({rate:,.0f}/s); {len(events)} at or above {threshold}."
+        )
+        for event in events[:options["top"]]:
+            self.stdout.write(
+                f"{event['score']:.2f}  {event['created_at']:%Y-%m-%d %H:%M}  ${event['amount']:>12,.2f}  "
+                f"entry {event['entry_id']}  {', '.join(event['reasons'])}"
+            )
+
+        if options["notify"] and events:
+            alerted = set(Notification.objects.filter(
+                notification_type="SECURITY", related_object_id__in=[str(event["entry_id"]) for event in events]
+            ).values_list("related_object_id", flat=True))
+            notifications = [
+                alert(event["user_id"], event["entry_id"], event["amount"], event["reasons"])
+                for event in events
+                if str(event["entry_id"]) not in alerted
+            ]
+            Notification.objects.bulk_create(notifications, batch_size=2000)
+            self.stdout.write(self.style.SUCCESS(f"Sent {len(notifications)} new security notification(s)."))
+
+        if options["output"]:
+            with open(options["output"], "w") as output:
+                json.dump({"scored": scored, "threshold": threshold, "events": events}, output, indent=2, default=str)
+            self.stdout.write(self.style.SUCCESS(f"Wrote {options['output']}"))
@@ -0,0 +1,64 @@
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+from core.seeding import seed_bank, SEED_PASSWORD, SEED_PIN, CHUNK_SIZE
+from datetime import date, datetime, time, timedelta
+from time import perf_counter
+
+
+class Command(BaseCommand):
+    help = "Generate a synthetic bank (users, accounts, ledger history, receipts, notifications, loans, bills) for load testing"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=1000)
+        parser.add_argument("--transactions", type=float, default=50, help="Mean ledger events per account")
+        parser.add_argument("--notifications", type=float, default=10, help="Mean notifications per user")
+        parser.add_argument("--loan-probability", type=float, default=0.3)
+        parser.add_argument("--days", type=int, default=365, help="Length of the generated history")
+        parser.add_argument("--seed", type=int, default=0, help="Same seed and --as-of, same bank")
+        parser.add_argument("--as-of", help="Day (YYYY-MM-DD) the history ends at the start of; defaults to now")
+        parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="Users written per database transaction")
+        parser.add_argument("--workers", type=int, default=1, help="Worker processes (Postgres only)")
+        parser.add_argument("--skip-rollups", action="store_true", help="Don't rebuild daily activity rollups afterwards")
+
+    def handle(self, *args, **options):
+        workers = options["workers"]
+        if workers > 1 and connection.vendor == "sqlite":
+            raise CommandError("SQLite allows a single writer; use --workers 1")
+        now = timezone.now()
+        if options["as_of"]:
+            try:
+                now = timezone.make_aware(datetime.combine(date.fromisoformat(options["as_of"]), time.min))
+            except ValueError:
+                raise CommandError("--as-of must be a date in YYYY-MM-DD format")
+
+        started = perf_counter()
+
+        def progress(totals):
+            elapsed = perf_counter() - started
+            self.stdout.write(
+                f"{totals['users']:,} users, {totals['transactions']:,} transactions "
+                f"({totals['transactions'] / elapsed:,.0f}/s)"
+            )
+
+        totals = seed_bank(
+            users=options["users"],
+            transactions_per_account=options["transactions"],
+            notifications_per_user=options["notifications"],
+            loan_probability=options["loan_probability"],
+            days=options["days"],
+            seed=options["seed"],
+            chunk_size=options["chunk_size"],
+            workers=workers,
+            progress=progress,
+            now=now,
+        )
+        if not options["skip_rollups"]:
+            since = timezone.localdate(now - timedelta(days=options["days"]))
+            call_command("rollup_activity", since=since.isoformat(), stdout=self.stdout)
+
+        elapsed = perf_counter() - started
+        summary = ", ".join(f"{count:,} {name}" for name, count in sorted(totals.items()))
+        self.stdout.write(self.style.SUCCESS(f"Seeded {summary} in {elapsed:.1f}s."))
+        self.stdout.write(f"Every seeded user logs in with the password {SEED_PASSWORD!r} and PIN {SEED_PIN!r}.")
@@ -0,0 +1,181 @@
+"""In-process request metrics.
+
+Each worker process keeps its own histograms and counters; Prometheus
+scrapes every worker and sums them. Recording a request costs a few
+perf_counter() calls and one short lock per metric.
+"""
+from bisect import bisect_left
+from contextvars import ContextVar
+from time import perf_counter
+import threading
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+
+
+class RequestStats:
+    """Work done while serving the current request"""
+    __slots__ = ("db_queries", "db_time", "template_time", "cache_hits", "cache_misses")
+
+    def __init__(self):
+        self.db_queries = 0
+        self.db_time = 0.0
+        self.template_time = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+
+current_stats = ContextVar("current_stats", default=None)
+
+
+def _format_labels(names, values):
+    return ",".join(f'{name}="{value}"' for name, value in zip(names, values))
+
+
+class Histogram:
+    def __init__(self, name, help_text, label_names, buckets):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, labels, value):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            snapshot = {labels: (list(counts), total, count) for labels, (counts, total, count) in self._series.items()}
+        for labels, (counts, total, count) in sorted(snapshot.items()):
+            label_text = _format_labels(self.label_names, labels)
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                lines.append(f'{self.name}_bucket{{{label_text},le="{bound}"}} {cumulative}')
+            lines.append(f'{self.name}_bucket{{{label_text},le="+Inf"}} {count}')
+            lines.append(f"{self.name}_sum{{{label_text}}} {total}")
+            lines.append(f"{self.name}_count{{{label_text}}} {count}")
+        return lines
+
+
+class Counter:
+    def __init__(self, name, help_text, label_names):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labels, amount=1):
+        if not amount:
+            return
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            snapshot = dict(self._values)
+        for labels, value in sorted(snapshot.items()):
+            lines.append(f"{self.name}{{{_format_labels(self.label_names, labels)}}} {value}")
+        return lines
+
+
+REQUEST_DURATION = Histogram("bank_request_duration_seconds", "Wall time per request.", ("view",), DURATION_BUCKETS)
+DB_DURATION = Histogram("bank_db_duration_seconds", "Database time per request.", ("view",), DURATION_BUCKETS)
+DB_QUERIES = Histogram("bank_db_queries", "Database queries per request.", ("view",), QUERY_COUNT_BUCKETS)
+TEMPLATE_DURATION = Histogram("bank_template_render_seconds", "Template render time per request.", ("view",), DURATION_BUCKETS)
+REQUESTS = Counter("bank_requests_total", "Requests served.", ("view", "status"))
+CACHE_HITS = Counter("bank_cache_hits_total", "Cache lookups that found a value.", ("view",))
+CACHE_MISSES = Counter("bank_cache_misses_total", "Cache lookups that found nothing.", ("view",))
+
+REGISTRY = (REQUEST_DURATION, DB_DURATION, DB_QUERIES, TEMPLATE_DURATION, REQUESTS, CACHE_HITS, CACHE_MISSES)
+
+
+def record_request(view, status, duration, stats):
+    labels = (view,)
+    REQUEST_DURATION.observe(labels, duration)
+    DB_DURATION.observe(labels, stats.db_time)
+    DB_QUERIES.observe(labels, stats.db_queries)
+    TEMPLATE_DURATION.observe(labels, stats.template_time)
+    REQUESTS.inc((view, str(status)))
+    CACHE_HITS.inc(labels, stats.cache_hits)
+    CACHE_MISSES.inc(labels, stats.cache_misses)
+
+
+def render_prometheus():
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+def record_query(execute, sql, params, many, context):
+    """connection.execute_wrapper hook timing every query of the request"""
+    stats = current_stats.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    started = perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.db_time += perf_counter() - started
+        stats.db_queries += 1
+
+
+_instrumented = False
+_instrument_lock = threading.Lock()
+
+
+def install_instrumentation(cache_backends):
+    """Wrap template rendering and cache lookups once per process"""
+    global _instrumented
+    with _instrument_lock:
+        if _instrumented:
+            return
+        _instrumented = True
+
+        from django.template.backends.django import Template
+
+        render = Template.render
+
+        def timed_render(self, context=None, request=None):
+            stats = current_stats.get()
+            if stats is None:
+                return render(self, context, request)
+            started = perf_counter()
+            try:
+                return render(self, context, request)
+            finally:
+                stats.template_time += perf_counter() - started
+
+        Template.render = timed_render
+
+        for backend in cache_backends:
+            _instrument_cache(backend)
+
+
+def _instrument_cache(backend):
+    get = backend.get
+    missing = object()
+
+    def counted_get(self, key, default=None, version=None):
+        value = get(self, key, missing, version)
+        stats = current_stats.get()
+        if stats is not None:
+            if value is missing:
+                stats.cache_misses += 1
+            else:
+                stats.cache_hits += 1
+        return default if value is missing else value
+
+    backend.get = counted_get
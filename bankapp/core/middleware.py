@@ -0,0 +1,82 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import DEFAULT_DB_ALIAS, connections
+from contextlib import ExitStack
+from time import perf_counter, time
+from .metrics import RequestStats, current_stats, install_instrumentation, record_query, record_request
+from .routers import REPLICA_ALIAS, RequestRouting, current_routing, detect_write
+
+
+class RequestMetricsMiddleware:
+    """Time every request, its queries, template rendering and cache lookups.
+
+    Results feed the in-process histograms served by the metrics view and,
+    unless SERVER_TIMING is off, a Server-Timing response header.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        install_instrumentation({type(caches[alias]) for alias in settings.CACHES})
+
+    def __call__(self, request):
+        stats = RequestStats()
+        token = current_stats.set(stats)
+        started = perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(record_query))
+                response = self.get_response(request)
+        finally:
+            current_stats.reset(token)
+        duration = perf_counter() - started
+
+        match = getattr(request, "resolver_match", None)
+        view = match.view_name if match else "unmatched"
+        record_request(view, response.status_code, duration, stats)
+
+        if getattr(settings, "SERVER_TIMING", True):
+            response["Server-Timing"] = (
+                f"total;dur={duration * 1000:.1f}, "
+                f'db;dur={stats.db_time * 1000:.1f};desc="{stats.db_queries} queries", '
+                f"tpl;dur={stats.template_time * 1000:.1f}, "
+                f'cache;desc="{stats.cache_hits} hits {stats.cache_misses} misses"'
+            )
+        return response
+
+
+class ReplicaPinMiddleware:
+    """Keep a client's reads on the primary for REPLICA_PIN_SECONDS after it writes.
+
+    The deadline travels in a cookie so it holds whichever worker serves the
+    next request. Unused when no replica database is configured.
+    """
+
+    cookie_name = "primary_until"
+
+    def __init__(self, get_response):
+        if REPLICA_ALIAS not in settings.DATABASES:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        try:
+            pinned = float(request.COOKIES.get(self.cookie_name, 0)) > time()
+        except ValueError:
+            pinned = False
+        routing = RequestRouting(pinned)
+        token = current_routing.set(routing)
+        try:
+            with connections[DEFAULT_DB_ALIAS].execute_wrapper(detect_write):
+                response = self.get_response(request)
+        finally:
+            current_routing.reset(token)
+
+        if routing.wrote:
+            seconds = getattr(settings, "REPLICA_PIN_SECONDS", 5)
+            response.set_cookie(
+                self.cookie_name, f"{time() + seconds:.0f}", max_age=seconds,
+                httponly=True, samesite="Lax", secure=settings.SESSION_COOKIE_SECURE,
+            )
+        return response
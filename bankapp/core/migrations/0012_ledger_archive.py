@@ -0,0 +1,72 @@
+# Generated by Django 6.0.1 on 2026-10-19 04:52
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_transaction_receipt'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReceiptArchive',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('period', models.DateField(help_text='First day of the archived month')),
+                ('row_count', models.IntegerField(default=0)),
+                ('payload', models.BinaryField(help_text='zlib-compressed JSON rows')),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Receipt Archive',
+                'verbose_name_plural': 'Receipt Archives',
+                'ordering': ['-period'],
+            },
+        ),
+        migrations.CreateModel(
+            name='TransactionArchive',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('period', models.DateField(help_text='First day of the archived month')),
+                ('row_count', models.IntegerField(default=0)),
+                ('payload', models.BinaryField(help_text='zlib-compressed JSON rows')),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Transaction Archive',
+                'verbose_name_plural': 'Transaction Archives',
+                'ordering': ['-period'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='receipt',
+            index=models.Index(fields=['user', '-created_at'], name='receipt_user_recent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['account', '-timestamp'], name='txn_account_recent_idx'),
+        ),
+        migrations.AddField(
+            model_name='receiptarchive',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='receipt_archives', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='transactionarchive',
+            name='account',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='transaction_archives', to='core.bankaccount'),
+        ),
+        migrations.AddConstraint(
+            model_name='receiptarchive',
+            constraint=models.UniqueConstraint(fields=('user', 'period'), name='unique_receipt_archive_period'),
+        ),
+        migrations.AddConstraint(
+            model_name='transactionarchive',
+            constraint=models.UniqueConstraint(fields=('account', 'period'), name='unique_transaction_archive_period'),
+        ),
+    ]
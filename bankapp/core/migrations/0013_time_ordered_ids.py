@@ -0,0 +1,33 @@
+# Generated by Django 6.0.1 on 2026-10-19 04:54
+
+import core.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_ledger_archive'),
+    ]
+
+    # The key default is applied in Python, so this only updates migration
+    # state; SQLite would otherwise rebuild every table to change it.
+    operations = [
+        migrations.SeparateDatabaseAndState(state_operations=[
+            migrations.AlterField(
+                model_name='billpayment',
+                name='id',
+                field=models.UUIDField(default=core.models.generate_uuid7, editable=False, primary_key=True, serialize=False),
+            ),
+            migrations.AlterField(
+                model_name='receipt',
+                name='id',
+                field=models.UUIDField(default=core.models.generate_uuid7, editable=False, primary_key=True, serialize=False),
+            ),
+            migrations.AlterField(
+                model_name='transaction',
+                name='id',
+                field=models.UUIDField(default=core.models.generate_uuid7, editable=False, primary_key=True, serialize=False),
+            ),
+        ]),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 6.0.1 on 2026-10-19 04:55
+
+import core.models
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_time_ordered_ids'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='JournalEntry',
+            fields=[
+                ('id', models.UUIDField(default=core.models.generate_uuid7, editable=False, primary_key=True, serialize=False)),
+                ('entry_type', models.CharField(choices=[('DEPOSIT', 'Deposit'), ('WITHDRAW', 'Withdraw'), ('TRANSFER', 'Transfer'), ('OPENING', 'Opening Balance')], max_length=20)),
+                ('description', models.CharField(blank=True, max_length=255)),
+                ('created_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+            ],
+            options={
+                'verbose_name': 'Journal Entry',
+                'verbose_name_plural': 'Journal Entries',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='Posting',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('external_account', models.CharField(blank=True, choices=[('CASH', 'Cash'), ('BILLERS', 'Bill Providers'), ('LOANS', 'Loan Book'), ('EQUITY', 'Opening Balances')], help_text='Bank-side counterpart when the posting has no customer account', max_length=20)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('account', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='postings', to='core.bankaccount')),
+                ('entry', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='postings', to='core.journalentry')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['account', 'created_at'], name='posting_account_time_idx')],
+            },
+        ),
+    ]
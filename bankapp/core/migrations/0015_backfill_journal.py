@@ -0,0 +1,123 @@
+import heapq
+import json
+import re
+import zlib
+from collections import defaultdict, deque
+from decimal import Decimal
+
+from django.db import migrations
+
+BATCH_SIZE = 2000
+SENT_TO = re.compile(r"^Sent to (\w+)\.")
+RECEIVED_FROM = re.compile(r"^Received from (\w+)\.")
+
+
+def _flush(JournalEntry, Posting, entries, postings):
+    JournalEntry.objects.bulk_create(entries, batch_size=BATCH_SIZE)
+    Posting.objects.bulk_create(postings, batch_size=BATCH_SIZE)
+    entries.clear()
+    postings.clear()
+
+
+def _archived_rows(Transaction, TransactionArchive, account_numbers):
+    """Rows of archived months in the same shape as the hot query, one month at a time in timestamp order"""
+    fields = {name: Transaction._meta.get_field(name) for name in ("account", "transaction_type", "amount", "description", "timestamp")}
+    for period in TransactionArchive.objects.order_by("period").values_list("period", flat=True).distinct():
+        rows = []
+        for payload in TransactionArchive.objects.filter(period=period).values_list("payload", flat=True).iterator(chunk_size=100):
+            for row in json.loads(zlib.decompress(bytes(payload))):
+                row = {name: field.to_python(row[field.attname]) for name, field in fields.items()}
+                rows.append((
+                    row["account"], account_numbers.get(row["account"]), row["transaction_type"],
+                    row["amount"], row["description"], row["timestamp"],
+                ))
+        rows.sort(key=lambda row: row[5])
+        yield from rows
+
+
+def backfill_journal(apps, schema_editor):
+    """Convert Transaction history into balanced journal entries.
+
+    Archived months are unpacked and merged with the hot rows in timestamp
+    order. Transfers were stored as two unlinked rows, so the legs are paired by
+    (from account, to account, amount) in timestamp order; an unmatched
+    leg is booked against cash. Each account then gets an opening entry
+    for whatever its balance holds beyond the converted history, so
+    ledger sums match balances from the start.
+    """
+    from core.models import generate_uuid7
+
+    BankAccount = apps.get_model("core", "BankAccount")
+    Transaction = apps.get_model("core", "Transaction")
+    TransactionArchive = apps.get_model("core", "TransactionArchive")
+    JournalEntry = apps.get_model("core", "JournalEntry")
+    Posting = apps.get_model("core", "Posting")
+
+    account_ids = dict(BankAccount.objects.values_list("account_number", "id"))
+    totals = defaultdict(Decimal)
+    pending_legs = defaultdict(deque)
+    entries, postings = [], []
+
+    def book(entry_type, description, created_at, legs):
+        entry = JournalEntry(id=generate_uuid7(created_at), entry_type=entry_type, description=description, created_at=created_at)
+        entries.append(entry)
+        for account_id, external_account, amount in legs:
+            postings.append(Posting(entry=entry, account_id=account_id, external_account=external_account, amount=amount, created_at=created_at))
+            if account_id:
+                totals[account_id] += amount
+
+    hot = Transaction.objects.order_by("timestamp").values_list(
+        "account_id", "account__account_number", "transaction_type", "amount", "description", "timestamp"
+    ).iterator(chunk_size=BATCH_SIZE)
+    archived = _archived_rows(Transaction, TransactionArchive, {account_id: number for number, account_id in account_ids.items()})
+    rows = heapq.merge(archived, hot, key=lambda row: row[5])
+    for account_id, account_number, transaction_type, amount, description, timestamp in rows:
+        if transaction_type == "DEPOSIT":
+            book("DEPOSIT", description, timestamp, [(account_id, "", amount), (None, "CASH", -amount)])
+        elif transaction_type == "WITHDRAW":
+            external = "BILLERS" if description.startswith("Bill Payment") else "CASH"
+            book("WITHDRAW", description, timestamp, [(account_id, "", -amount), (None, external, amount)])
+        else:
+            sent, received = SENT_TO.match(description), RECEIVED_FROM.match(description)
+            if sent:
+                key, leg = (account_number, sent.group(1), amount), (account_id, "", -amount)
+            elif received:
+                key, leg = (received.group(1), account_number, amount), (account_id, "", amount)
+            else:
+                key, leg = None, (account_id, "", amount)
+
+            partners = pending_legs.get(key)
+            if key and partners and partners[0][0][2] != leg[2]:
+                partner, partner_description, partner_timestamp = partners.popleft()
+                book("TRANSFER", partner_description, partner_timestamp, [partner, leg])
+            elif key and key[0] in account_ids and key[1] in account_ids:
+                pending_legs[key].append((leg, description, timestamp))
+            else:
+                book("TRANSFER", description, timestamp, [leg, (None, "CASH", -leg[2])])
+
+        if len(entries) >= BATCH_SIZE:
+            _flush(JournalEntry, Posting, entries, postings)
+
+    for legs in pending_legs.values():
+        for leg, description, timestamp in legs:
+            book("TRANSFER", description, timestamp, [leg, (None, "CASH", -leg[2])])
+
+    for account_id, balance, created_at in BankAccount.objects.values_list("id", "balance", "created_at").iterator(chunk_size=BATCH_SIZE):
+        difference = balance - totals.get(account_id, Decimal("0"))
+        if difference:
+            book("OPENING", "Balance carried over to the journal", created_at, [(account_id, "", difference), (None, "EQUITY", -difference)])
+        if len(entries) >= BATCH_SIZE:
+            _flush(JournalEntry, Posting, entries, postings)
+
+    _flush(JournalEntry, Posting, entries, postings)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_journal'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_journal, migrations.RunPython.noop),
+    ]
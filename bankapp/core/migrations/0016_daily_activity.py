@@ -0,0 +1,45 @@
+# Generated by Django 6.0.1 on 2026-10-19 04:57
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def classify_bill_payments(apps, schema_editor):
+    """Bill payments were journalled as withdrawals against billers"""
+    JournalEntry = apps.get_model("core", "JournalEntry")
+    JournalEntry.objects.filter(entry_type="WITHDRAW", postings__external_account="BILLERS").update(entry_type="BILL_PAYMENT")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0015_backfill_journal'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='journalentry',
+            name='entry_type',
+            field=models.CharField(choices=[('DEPOSIT', 'Deposit'), ('WITHDRAW', 'Withdraw'), ('TRANSFER', 'Transfer'), ('BILL_PAYMENT', 'Bill Payment'), ('OPENING', 'Opening Balance')], max_length=20),
+        ),
+        migrations.CreateModel(
+            name='DailyActivity',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('category', models.CharField(choices=[('DEPOSIT', 'Deposit'), ('WITHDRAW', 'Withdrawal'), ('BILL_PAYMENT', 'Bill Payment'), ('TRANSFER_IN', 'Transfer In'), ('TRANSFER_OUT', 'Transfer Out'), ('OPENING', 'Opening Balance')], max_length=20)),
+                ('money_in', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('money_out', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('account', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_activity', to='core.bankaccount')),
+            ],
+            options={
+                'verbose_name': 'Daily Activity',
+                'verbose_name_plural': 'Daily Activity',
+                'ordering': ['-day'],
+                'indexes': [models.Index(fields=['day', 'category'], name='activity_day_category_idx')],
+                'constraints': [models.UniqueConstraint(fields=('account', 'day', 'category'), name='unique_daily_activity')],
+            },
+        ),
+        migrations.RunPython(classify_bill_payments, migrations.RunPython.noop),
+    ]
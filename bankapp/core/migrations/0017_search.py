@@ -0,0 +1,39 @@
+# Generated by Django 6.0.1 on 2026-10-19 05:20
+
+from django.db import migrations, models
+
+
+def create_search_index(apps, schema_editor):
+    from core.search import install_search_index
+    install_search_index(schema_editor.connection)
+
+
+def drop_search_index(apps, schema_editor):
+    from core.search import drop_search_index
+    drop_search_index(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0016_daily_activity'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='billpayment',
+            name='account_number',
+            field=models.CharField(db_index=True, help_text='Your account number with the provider', max_length=100),
+        ),
+        migrations.AlterField(
+            model_name='receipt',
+            name='from_account',
+            field=models.CharField(blank=True, db_index=True, max_length=50),
+        ),
+        migrations.AlterField(
+            model_name='receipt',
+            name='to_account',
+            field=models.CharField(blank=True, db_index=True, max_length=50),
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
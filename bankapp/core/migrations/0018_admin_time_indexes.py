@@ -0,0 +1,29 @@
+# Generated by Django 6.0.1 on 2026-10-19 05:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0017_search'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='billpayment',
+            index=models.Index(fields=['created_at', 'id'], name='billpayment_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['created_at', 'id'], name='notification_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='receipt',
+            index=models.Index(fields=['created_at', 'id'], name='receipt_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['timestamp', 'id'], name='txn_time_idx'),
+        ),
+    ]
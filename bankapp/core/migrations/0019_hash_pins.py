@@ -0,0 +1,36 @@
+# Generated by Django 6.0.1 on 2026-10-19 06:05
+
+from django.db import migrations, models
+
+BATCH_SIZE = 2000
+
+
+def hash_pins(apps, schema_editor):
+    """Replace plaintext PINs with their hashes; users keep the PIN they know"""
+    from core.pins import is_valid_pin, make_pin
+    User = apps.get_model("core", "User")
+    batch = []
+    for user in User.objects.only("id", "pin").iterator(chunk_size=BATCH_SIZE):
+        user.pin = make_pin(user.pin) if is_valid_pin(user.pin) else ""
+        batch.append(user)
+        if len(batch) >= BATCH_SIZE:
+            User.objects.bulk_update(batch, ["pin"])
+            batch.clear()
+    User.objects.bulk_update(batch, ["pin"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0018_admin_time_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='user',
+            name='pin',
+            field=models.CharField(blank=True, help_text='Hashed 4-digit PIN for transaction authentication', max_length=128),
+        ),
+        # Hashes cannot be turned back into PINs, so there is no way back
+        migrations.RunPython(hash_pins),
+    ]
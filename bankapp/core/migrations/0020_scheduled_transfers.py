@@ -0,0 +1,44 @@
+# Generated by Django 6.0.1 on 2026-10-19 07:10
+
+import core.models
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0019_hash_pins'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ScheduledTransfer',
+            fields=[
+                ('id', models.UUIDField(default=core.models.generate_uuid7, editable=False, primary_key=True, serialize=False)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('description', models.CharField(blank=True, max_length=255)),
+                ('frequency', models.CharField(choices=[('ONCE', 'Once'), ('DAILY', 'Daily'), ('WEEKLY', 'Weekly'), ('MONTHLY', 'Monthly')], default='MONTHLY', max_length=10)),
+                ('interval', models.PositiveSmallIntegerField(default=1, help_text='Repeat every this many days, weeks or months')),
+                ('start_at', models.DateTimeField(help_text='First payment; later ones keep its time of day and day of month')),
+                ('end_date', models.DateField(blank=True, help_text='No payments after this day', null=True)),
+                ('status', models.CharField(choices=[('ACTIVE', 'Active'), ('COMPLETED', 'Completed'), ('CANCELLED', 'Cancelled')], default='ACTIVE', max_length=20)),
+                ('next_run_at', models.DateTimeField(blank=True, null=True)),
+                ('occurrence', models.PositiveIntegerField(default=0, help_text='Which occurrence of the schedule next_run_at is')),
+                ('runs', models.PositiveIntegerField(default=0)),
+                ('failures', models.PositiveIntegerField(default=0)),
+                ('last_run_at', models.DateTimeField(blank=True, null=True)),
+                ('last_error', models.CharField(blank=True, max_length=255)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('from_account', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='scheduled_transfers', to='core.bankaccount')),
+                ('to_account', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='incoming_scheduled_transfers', to='core.bankaccount')),
+            ],
+            options={
+                'verbose_name': 'Scheduled Transfer',
+                'verbose_name_plural': 'Scheduled Transfers',
+                'ordering': ['next_run_at'],
+                'indexes': [models.Index(fields=['status', 'next_run_at'], name='scheduled_due_idx')],
+            },
+        ),
+    ]
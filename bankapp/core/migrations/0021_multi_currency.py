@@ -0,0 +1,45 @@
+# Generated by Django 6.0.1 on 2026-10-19 07:40
+
+import core.models
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0020_scheduled_transfers'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bankaccount',
+            name='currency',
+            field=models.CharField(default=core.models.default_currency, help_text='ISO 4217 code; balances and postings are in this currency', max_length=3),
+        ),
+        migrations.AlterField(
+            model_name='posting',
+            name='external_account',
+            field=models.CharField(blank=True, choices=[('CASH', 'Cash'), ('BILLERS', 'Bill Providers'), ('LOANS', 'Loan Book'), ('EQUITY', 'Opening Balances'), ('FX', 'Currency Exchange')], help_text='Bank-side counterpart when the posting has no customer account', max_length=20),
+        ),
+        migrations.CreateModel(
+            name='FxRevaluation',
+            fields=[
+                ('id', models.UUIDField(default=core.models.generate_uuid7, editable=False, primary_key=True, serialize=False)),
+                ('currency', models.CharField(max_length=3)),
+                ('rate', models.DecimalField(decimal_places=10, help_text='Base currency per unit', max_digits=20)),
+                ('rates_version', models.CharField(help_text='Hash of the rates file the run used', max_length=12)),
+                ('accounts', models.PositiveIntegerField()),
+                ('balance', models.DecimalField(decimal_places=2, max_digits=16)),
+                ('base_value', models.DecimalField(decimal_places=2, max_digits=16)),
+                ('gain', models.DecimalField(decimal_places=2, help_text='Change in base value from the rate moving since the previous run for this currency', max_digits=16)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'verbose_name': 'FX Revaluation',
+                'verbose_name_plural': 'FX Revaluations',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['currency', 'created_at'], name='fx_revaluation_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 6.0.1 on 2026-10-19 08:15
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0021_multi_currency'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='dailyactivity',
+            name='category',
+            field=models.CharField(choices=[('DEPOSIT', 'Deposit'), ('WITHDRAW', 'Withdrawal'), ('BILL_PAYMENT', 'Bill Payment'), ('TRANSFER_IN', 'Transfer In'), ('TRANSFER_OUT', 'Transfer Out'), ('OPENING', 'Opening Balance'), ('INTEREST', 'Interest')], max_length=20),
+        ),
+        migrations.AlterField(
+            model_name='journalentry',
+            name='entry_type',
+            field=models.CharField(choices=[('DEPOSIT', 'Deposit'), ('WITHDRAW', 'Withdraw'), ('TRANSFER', 'Transfer'), ('BILL_PAYMENT', 'Bill Payment'), ('OPENING', 'Opening Balance'), ('INTEREST', 'Interest')], max_length=20),
+        ),
+        migrations.AlterField(
+            model_name='posting',
+            name='external_account',
+            field=models.CharField(blank=True, choices=[('CASH', 'Cash'), ('BILLERS', 'Bill Providers'), ('LOANS', 'Loan Book'), ('EQUITY', 'Opening Balances'), ('FX', 'Currency Exchange'), ('INTEREST', 'Interest Expense')], help_text='Bank-side counterpart when the posting has no customer account', max_length=20),
+        ),
+        migrations.CreateModel(
+            name='InterestAccrual',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('average_balance', models.DecimalField(decimal_places=2, max_digits=14)),
+                ('amount', models.DecimalField(decimal_places=6, max_digits=14)),
+                ('credited', models.BooleanField(default=False)),
+                ('account', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='interest_accruals', to='core.bankaccount')),
+            ],
+            options={
+                'verbose_name': 'Interest Accrual',
+                'verbose_name_plural': 'Interest Accruals',
+                'ordering': ['-day'],
+                'indexes': [models.Index(fields=['credited', 'day'], name='accrual_credited_day_idx')],
+                'constraints': [models.UniqueConstraint(fields=('account', 'day'), name='unique_interest_accrual')],
+            },
+        ),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 6.0.1 on 2026-10-19 08:50
+
+import core.models
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0022_interest_accruals'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FeedImport',
+            fields=[
+                ('id', models.UUIDField(default=core.models.generate_uuid7, editable=False, primary_key=True, serialize=False)),
+                ('source', models.CharField(help_text='Processor the file came from; references are unique per source', max_length=50)),
+                ('file_name', models.CharField(max_length=255)),
+                ('checksum', models.CharField(help_text='SHA-256 of the file, so a re-run resumes the same import', max_length=64)),
+                ('status', models.CharField(choices=[('RUNNING', 'Running'), ('COMPLETED', 'Completed'), ('FAILED', 'Failed')], default='RUNNING', max_length=20)),
+                ('rows_done', models.PositiveIntegerField(default=0, help_text='Rows handled by committed chunks; a resumed run skips them')),
+                ('posted', models.PositiveIntegerField(default=0)),
+                ('duplicates', models.PositiveIntegerField(default=0)),
+                ('rejected', models.PositiveIntegerField(default=0)),
+                ('last_error', models.TextField(blank=True)),
+                ('started_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name': 'Feed Import',
+                'verbose_name_plural': 'Feed Imports',
+                'ordering': ['-started_at'],
+                'constraints': [models.UniqueConstraint(fields=('source', 'checksum'), name='unique_feed_import')],
+            },
+        ),
+        migrations.CreateModel(
+            name='FeedDeposit',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(max_length=50)),
+                ('reference', models.CharField(max_length=100)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('account', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='feed_deposits', to='core.bankaccount')),
+                ('entry', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='+', to='core.journalentry')),
+                ('feed', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='deposits', to='core.feedimport')),
+            ],
+            options={
+                'verbose_name': 'Feed Deposit',
+                'verbose_name_plural': 'Feed Deposits',
+                'constraints': [models.UniqueConstraint(fields=('source', 'reference'), name='unique_feed_reference')],
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 6.0.1 on 2026-10-19 11:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0023_feed_imports'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='dailyactivity',
+            name='category',
+            field=models.CharField(choices=[('DEPOSIT', 'Deposit'), ('WITHDRAW', 'Withdrawal'), ('BILL_PAYMENT', 'Bill Payment'), ('TRANSFER_IN', 'Transfer In'), ('TRANSFER_OUT', 'Transfer Out'), ('OPENING', 'Opening Balance'), ('INTEREST', 'Interest'), ('LOAN_DISBURSAL', 'Loan Disbursal')], max_length=20),
+        ),
+        migrations.AlterField(
+            model_name='journalentry',
+            name='entry_type',
+            field=models.CharField(choices=[('DEPOSIT', 'Deposit'), ('WITHDRAW', 'Withdraw'), ('TRANSFER', 'Transfer'), ('BILL_PAYMENT', 'Bill Payment'), ('OPENING', 'Opening Balance'), ('INTEREST', 'Interest'), ('LOAN_DISBURSAL', 'Loan Disbursal')], max_length=20),
+        ),
+    ]
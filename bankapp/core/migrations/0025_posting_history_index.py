@@ -0,0 +1,21 @@
+# Generated by Django 6.0.1 on 2026-10-19 12:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0024_loan_disbursal_entries'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='posting',
+            index=models.Index(fields=['account', 'created_at', 'id'], name='posting_account_history_idx'),
+        ),
+        migrations.RemoveIndex(
+            model_name='posting',
+            name='posting_account_time_idx',
+        ),
+    ]
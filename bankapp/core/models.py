@@ -3,6 +3,8 @@ from django.conf import settings
 from django.contrib.auth.models import AbstractBaseUser, PermissionsMixin
 from django.contrib.auth.base_user import BaseUserManager
 from django.utils import timezone
+import os
+import time
 import uuid
 import random
 
@@ -25,6 +27,16 @@ class UserManager(BaseUserManager):
         return self.create_user(email, password, **extra_fields)
 
 
+def generate_uuid7(timestamp=None, rng=None):
+    """Time-ordered UUID (version 7): 48-bit Unix milliseconds followed by random bits, from ``rng`` if given"""
+    millis = int((timestamp.timestamp() if timestamp else time.time()) * 1000)
+    random_bits = rng.getrandbits(80) if rng else int.from_bytes(os.urandom(10), "big")
+    value = (millis & 0xFFFFFFFFFFFF) << 80 | random_bits
+    value = (value & ~(0xF << 76)) | (0x7 << 76)
+    value = (value & ~(0x3 << 62)) | (0x2 << 62)
+    return uuid.UUID(int=value)
+
+
 def generate_pin():
     """Generate a random 4-digit PIN"""
     return str(random.randint(1000, 9999))
@@ -36,7 +48,7 @@ class User(AbstractBaseUser, PermissionsMixin):
     first_name = models.CharField(max_length=100, blank=True)
     last_name = models.CharField(max_length=100, blank=True)
     phone = models.CharField(max_length=20, blank=True)
-    pin = models.CharField(max_length=4, default=generate_pin, help_text="4-digit PIN for transaction authentication")
+    pin = models.CharField(max_length=128, blank=True, help_text="Hashed 4-digit PIN for transaction authentication")
     is_staff = models.BooleanField(default=False)
     is_active = models.BooleanField(default=True)
     is_approved = models.BooleanField(default=False, help_text="Admin approval required for customer accounts")
@@ -58,6 +70,10 @@ def generate_account_number():
     return str(random.randint(1000000000, 9999999999))
 
 
+def default_currency():
+    return settings.BASE_CURRENCY
+
+
 class BankAccount(models.Model):
     ACCOUNT_TYPES = (
         ("SAVINGS", "Savings"),
@@ -80,6 +96,11 @@ class BankAccount(models.Model):
         default="SAVINGS"
     )
     balance = models.DecimalField(max_digits=12, decimal_places=2, default=0.00)
+    currency = models.CharField(
+        max_length=3,
+        default=default_currency,
+        help_text="ISO 4217 code; balances and postings are in this currency"
+    )
     is_active = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
@@ -93,7 +114,7 @@ class Transaction(models.Model):
         ("TRANSFER", "Transfer"),
     )
 
-    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    id = models.UUIDField(primary_key=True, default=generate_uuid7, editable=False)
     account = models.ForeignKey(
         BankAccount,
         on_delete=models.CASCADE,
@@ -114,10 +135,140 @@ class Transaction(models.Model):
         related_name='transaction'
     )
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["account", "-timestamp"], name="txn_account_recent_idx"),
+            models.Index(fields=["timestamp", "id"], name="txn_time_idx"),
+        ]
+
     def __str__(self):
         return f"{self.transaction_type} - {self.amount}"
 
 
+class JournalEntry(models.Model):
+    """One balanced money movement; its postings always sum to zero"""
+    ENTRY_TYPES = (
+        ("DEPOSIT", "Deposit"),
+        ("WITHDRAW", "Withdraw"),
+        ("TRANSFER", "Transfer"),
+        ("BILL_PAYMENT", "Bill Payment"),
+        ("OPENING", "Opening Balance"),
+        ("INTEREST", "Interest"),
+        ("LOAN_DISBURSAL", "Loan Disbursal"),
+    )
+
+    id = models.UUIDField(primary_key=True, default=generate_uuid7, editable=False)
+    entry_type = models.CharField(max_length=20, choices=ENTRY_TYPES)
+    description = models.CharField(max_length=255, blank=True)
+    created_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    class Meta:
+        verbose_name = "Journal Entry"
+        verbose_name_plural = "Journal Entries"
+        ordering = ["-created_at"]
+
+    def __str__(self):
+        return f"{self.entry_type} - {self.created_at:%Y-%m-%d %H:%M}"
+
+
+class Posting(models.Model):
+    """Signed leg of a journal entry: positive credits the account, negative debits it"""
+    EXTERNAL_ACCOUNTS = (
+        ("CASH", "Cash"),
+        ("BILLERS", "Bill Providers"),
+        ("LOANS", "Loan Book"),
+        ("EQUITY", "Opening Balances"),
+        ("FX", "Currency Exchange"),
+        ("INTEREST", "Interest Expense"),
+    )
+
+    entry = models.ForeignKey(JournalEntry, on_delete=models.CASCADE, related_name="postings")
+    account = models.ForeignKey(
+        BankAccount,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name="postings"
+    )
+    external_account = models.CharField(
+        max_length=20,
+        choices=EXTERNAL_ACCOUNTS,
+        blank=True,
+        help_text="Bank-side counterpart when the posting has no customer account"
+    )
+    amount = models.DecimalField(max_digits=12, decimal_places=2)
+    # Copied from the entry so per-account range SUMs stay on one index
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            # Serves per-account range SUMs and keyset pages of the history view
+            models.Index(fields=["account", "created_at", "id"], name="posting_account_history_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.account or self.external_account} {self.amount}"
+
+
+class DailyActivity(models.Model):
+    """Per account, per day, per category totals rolled up from journal postings"""
+    CATEGORIES = (
+        ("DEPOSIT", "Deposit"),
+        ("WITHDRAW", "Withdrawal"),
+        ("BILL_PAYMENT", "Bill Payment"),
+        ("TRANSFER_IN", "Transfer In"),
+        ("TRANSFER_OUT", "Transfer Out"),
+        ("OPENING", "Opening Balance"),
+        ("INTEREST", "Interest"),
+        ("LOAN_DISBURSAL", "Loan Disbursal"),
+    )
+
+    account = models.ForeignKey(BankAccount, on_delete=models.CASCADE, related_name="daily_activity")
+    day = models.DateField()
+    category = models.CharField(max_length=20, choices=CATEGORIES)
+    money_in = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    money_out = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        verbose_name = "Daily Activity"
+        verbose_name_plural = "Daily Activity"
+        ordering = ["-day"]
+        constraints = [
+            models.UniqueConstraint(fields=["account", "day", "category"], name="unique_daily_activity"),
+        ]
+        indexes = [
+            models.Index(fields=["day", "category"], name="activity_day_category_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.account.account_number} {self.day} {self.category}"
+
+
+class InterestAccrual(models.Model):
+    """Interest a savings account earned on one day, credited to it monthly"""
+    account = models.ForeignKey(BankAccount, on_delete=models.CASCADE, related_name="interest_accruals")
+    day = models.DateField()
+    average_balance = models.DecimalField(max_digits=14, decimal_places=2)
+    # Fractions of a cent are kept and only rounded when the month is credited
+    amount = models.DecimalField(max_digits=14, decimal_places=6)
+    credited = models.BooleanField(default=False)
+
+    class Meta:
+        verbose_name = "Interest Accrual"
+        verbose_name_plural = "Interest Accruals"
+        ordering = ["-day"]
+        constraints = [
+            models.UniqueConstraint(fields=["account", "day"], name="unique_interest_accrual"),
+        ]
+        indexes = [
+            models.Index(fields=["credited", "day"], name="accrual_credited_day_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.account.account_number} {self.day} {self.amount}"
+
+
 class ProfileUpdate(models.Model):
     STATUS_CHOICES = (
         ("PENDING", "Pending"),
@@ -216,6 +367,9 @@ class Notification(models.Model):
         verbose_name = "Notification"
         verbose_name_plural = "Notifications"
         ordering = ["-created_at"]
+        indexes = [
+            models.Index(fields=["created_at", "id"], name="notification_time_idx"),
+        ]
 
     def __str__(self):
         return f"{self.user.email} - {self.title}"
@@ -438,29 +592,13 @@ class Loan(models.Model):
 
     def disburse(self):
         """Disburse approved loan to user account"""
-        if self.status != "APPROVED":
-            raise ValueError("Only approved loans can be disbursed")
-        
-        try:
-            bank_account = self.user.bankaccount
-            bank_account.balance += self.loan_amount
-            bank_account.save()
-            
-            self.status = "ACTIVE"
-            self.disbursed_amount = self.loan_amount
-            self.disbursed_at = timezone.now()
-            self.save()
-
-            # Create notification
-            Notification.objects.create(
-                user=self.user,
-                title="Loan Disbursed",
-                message=f"Your {self.get_loan_type_display()} of ${self.loan_amount} has been disbursed to your account.",
-                notification_type="INFO",
-                related_object_id=str(self.id)
-            )
-        except:
-            raise ValueError("Bank account not found for user")
+        from .services import disburse_loans
+
+        disbursed, errors = disburse_loans([self.pk])
+        if not disbursed:
+            raise ValueError(errors.get(self.pk, "Loan not found"))
+        loan = disbursed[0]
+        self.status, self.disbursed_amount, self.disbursed_at = loan.status, loan.disbursed_amount, loan.disbursed_at
 
 
 class BankStatement(models.Model):
@@ -513,11 +651,11 @@ class BillPayment(models.Model):
         ("CANCELLED", "Cancelled"),
     )
 
-    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    id = models.UUIDField(primary_key=True, default=generate_uuid7, editable=False)
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="bill_payments")
     bill_type = models.CharField(max_length=20, choices=BILL_TYPES)
     provider_name = models.CharField(max_length=100, help_text="Name of the bill provider")
-    account_number = models.CharField(max_length=100, help_text="Your account number with the provider")
+    account_number = models.CharField(max_length=100, db_index=True, help_text="Your account number with the provider")
     amount = models.DecimalField(max_digits=12, decimal_places=2)
     status = models.CharField(max_length=20, choices=PAYMENT_STATUS_CHOICES, default="PENDING")
     reference_number = models.CharField(max_length=100, unique=True, blank=True)
@@ -533,6 +671,9 @@ class BillPayment(models.Model):
         verbose_name = "Bill Payment"
         verbose_name_plural = "Bill Payments"
         ordering = ["-created_at"]
+        indexes = [
+            models.Index(fields=["created_at", "id"], name="billpayment_time_idx"),
+        ]
 
 
 class Review(models.Model):
@@ -575,7 +716,7 @@ class Receipt(models.Model):
         ('loan_payment', 'Loan Payment'),
     ]
     
-    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    id = models.UUIDField(primary_key=True, default=generate_uuid7, editable=False)
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="receipts")
     transaction_type = models.CharField(max_length=20, choices=TRANSACTION_TYPES)
     reference_number = models.CharField(max_length=50, unique=True, help_text="Unique transaction reference")
@@ -583,8 +724,8 @@ class Receipt(models.Model):
     description = models.TextField(help_text="Transaction details")
     
     # Transaction details
-    from_account = models.CharField(max_length=50, blank=True)
-    to_account = models.CharField(max_length=50, blank=True)
+    from_account = models.CharField(max_length=50, blank=True, db_index=True)
+    to_account = models.CharField(max_length=50, blank=True, db_index=True)
     recipient_name = models.CharField(max_length=200, blank=True)
     
     # Status
@@ -601,6 +742,177 @@ class Receipt(models.Model):
         ordering = ['-created_at']
         verbose_name = "Transaction Receipt"
         verbose_name_plural = "Transaction Receipts"
+        indexes = [
+            models.Index(fields=["user", "-created_at"], name="receipt_user_recent_idx"),
+            models.Index(fields=["created_at", "id"], name="receipt_time_idx"),
+        ]
     
     def __str__(self):
-        return f"{self.reference_number} - {self.get_transaction_type_display()}"
\ No newline at end of file
+        return f"{self.reference_number} - {self.get_transaction_type_display()}"
+
+
+class ScheduledTransfer(models.Model):
+    """Standing order: a transfer repeated on a schedule until it ends or is cancelled"""
+    FREQUENCIES = (
+        ("ONCE", "Once"),
+        ("DAILY", "Daily"),
+        ("WEEKLY", "Weekly"),
+        ("MONTHLY", "Monthly"),
+    )
+    STATUS_CHOICES = (
+        ("ACTIVE", "Active"),
+        ("COMPLETED", "Completed"),
+        ("CANCELLED", "Cancelled"),
+    )
+
+    id = models.UUIDField(primary_key=True, default=generate_uuid7, editable=False)
+    from_account = models.ForeignKey(BankAccount, on_delete=models.CASCADE, related_name="scheduled_transfers")
+    to_account = models.ForeignKey(BankAccount, on_delete=models.CASCADE, related_name="incoming_scheduled_transfers")
+    amount = models.DecimalField(max_digits=12, decimal_places=2)
+    description = models.CharField(max_length=255, blank=True)
+    frequency = models.CharField(max_length=10, choices=FREQUENCIES, default="MONTHLY")
+    interval = models.PositiveSmallIntegerField(default=1, help_text="Repeat every this many days, weeks or months")
+    start_at = models.DateTimeField(help_text="First payment; later ones keep its time of day and day of month")
+    end_date = models.DateField(null=True, blank=True, help_text="No payments after this day")
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="ACTIVE")
+    next_run_at = models.DateTimeField(null=True, blank=True)
+    occurrence = models.PositiveIntegerField(default=0, help_text="Which occurrence of the schedule next_run_at is")
+    runs = models.PositiveIntegerField(default=0)
+    failures = models.PositiveIntegerField(default=0)
+    last_run_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.CharField(max_length=255, blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        verbose_name = "Scheduled Transfer"
+        verbose_name_plural = "Scheduled Transfers"
+        ordering = ["next_run_at"]
+        indexes = [
+            models.Index(fields=["status", "next_run_at"], name="scheduled_due_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.from_account.account_number} -> {self.to_account.account_number} {self.amount} {self.frequency}"
+
+
+class FeedImport(models.Model):
+    """One deposit file from a payment processor and how far its import got"""
+    STATUS_CHOICES = (
+        ("RUNNING", "Running"),
+        ("COMPLETED", "Completed"),
+        ("FAILED", "Failed"),
+    )
+
+    id = models.UUIDField(primary_key=True, default=generate_uuid7, editable=False)
+    source = models.CharField(max_length=50, help_text="Processor the file came from; references are unique per source")
+    file_name = models.CharField(max_length=255)
+    checksum = models.CharField(max_length=64, help_text="SHA-256 of the file, so a re-run resumes the same import")
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="RUNNING")
+    rows_done = models.PositiveIntegerField(default=0, help_text="Rows handled by committed chunks; a resumed run skips them")
+    posted = models.PositiveIntegerField(default=0)
+    duplicates = models.PositiveIntegerField(default=0)
+    rejected = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    started_at = models.DateTimeField(default=timezone.now)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Feed Import"
+        verbose_name_plural = "Feed Imports"
+        ordering = ["-started_at"]
+        constraints = [
+            models.UniqueConstraint(fields=["source", "checksum"], name="unique_feed_import"),
+        ]
+
+    def __str__(self):
+        return f"{self.source} {self.file_name} ({self.status})"
+
+
+class FeedDeposit(models.Model):
+    """A deposit posted from a feed, kept so the same external reference is never posted twice"""
+    source = models.CharField(max_length=50)
+    reference = models.CharField(max_length=100)
+    feed = models.ForeignKey(FeedImport, on_delete=models.CASCADE, related_name="deposits")
+    account = models.ForeignKey(BankAccount, on_delete=models.CASCADE, related_name="feed_deposits")
+    entry = models.ForeignKey(JournalEntry, on_delete=models.PROTECT, related_name="+")
+    amount = models.DecimalField(max_digits=12, decimal_places=2)
+
+    class Meta:
+        verbose_name = "Feed Deposit"
+        verbose_name_plural = "Feed Deposits"
+        constraints = [
+            models.UniqueConstraint(fields=["source", "reference"], name="unique_feed_reference"),
+        ]
+
+    def __str__(self):
+        return f"{self.source} {self.reference}"
+
+
+class FxRevaluation(models.Model):
+    """Base-currency value of all balances held in one currency at a revaluation run"""
+    id = models.UUIDField(primary_key=True, default=generate_uuid7, editable=False)
+    currency = models.CharField(max_length=3)
+    rate = models.DecimalField(max_digits=20, decimal_places=10, help_text="Base currency per unit")
+    rates_version = models.CharField(max_length=12, help_text="Hash of the rates file the run used")
+    accounts = models.PositiveIntegerField()
+    balance = models.DecimalField(max_digits=16, decimal_places=2)
+    base_value = models.DecimalField(max_digits=16, decimal_places=2)
+    gain = models.DecimalField(
+        max_digits=16,
+        decimal_places=2,
+        help_text="Change in base value from the rate moving since the previous run for this currency"
+    )
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        verbose_name = "FX Revaluation"
+        verbose_name_plural = "FX Revaluations"
+        ordering = ["-created_at"]
+        indexes = [
+            models.Index(fields=["currency", "created_at"], name="fx_revaluation_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.currency} {self.base_value} @ {self.rate} ({self.created_at:%Y-%m-%d})"
+
+
+class TransactionArchive(models.Model):
+    """Compressed transactions of one account for one closed month"""
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    account = models.ForeignKey(BankAccount, on_delete=models.CASCADE, related_name="transaction_archives")
+    period = models.DateField(help_text="First day of the archived month")
+    row_count = models.IntegerField(default=0)
+    payload = models.BinaryField(help_text="zlib-compressed JSON rows")
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Transaction Archive"
+        verbose_name_plural = "Transaction Archives"
+        ordering = ["-period"]
+        constraints = [
+            models.UniqueConstraint(fields=["account", "period"], name="unique_transaction_archive_period"),
+        ]
+
+    def __str__(self):
+        return f"{self.account.account_number} - {self.period:%Y-%m} ({self.row_count})"
+
+
+class ReceiptArchive(models.Model):
+    """Compressed receipts of one user for one closed month"""
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="receipt_archives")
+    period = models.DateField(help_text="First day of the archived month")
+    row_count = models.IntegerField(default=0)
+    payload = models.BinaryField(help_text="zlib-compressed JSON rows")
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Receipt Archive"
+        verbose_name_plural = "Receipt Archives"
+        ordering = ["-period"]
+        constraints = [
+            models.UniqueConstraint(fields=["user", "period"], name="unique_receipt_archive_period"),
+        ]
+
+    def __str__(self):
+        return f"{self.user.email} - {self.period:%Y-%m} ({self.row_count})"
@@ -0,0 +1,139 @@
+"""Hashed transaction PINs.
+
+A 4-digit PIN has 10,000 values, so no key stretching survives an offline
+guess of every one of them. What protects a stolen ``User.pin`` column is
+the pepper: the PIN is keyed with PIN_PEPPER (SECRET_KEY when unset),
+which lives in the environment, not the database, before PBKDF2 runs
+PIN_HASH_ITERATIONS rounds over it. The iteration count can therefore be
+kept low enough for the bill-pay path; bench_bank times check_pin.
+
+Each hash records a short id of the pepper it was made with. A PIN made
+with a retired pepper, one listed in PIN_PEPPER_FALLBACKS or the
+SECRET_KEY (or its fallbacks) used while PIN_PEPPER was unset, still
+verifies and is rehashed with the current pepper, so setting or rotating
+PIN_PEPPER never locks anyone out of their PIN.
+
+Online guessing is stopped by a lockout: after PIN_MAX_ATTEMPTS wrong
+PINs within PIN_LOCKOUT_SECONDS the PIN is refused until the lockout
+expires. Failures are counted in the RATE_LIMIT_CACHE cache, so workers
+sharing that cache share the count.
+"""
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.crypto import constant_time_compare, get_random_string, salted_hmac
+from .models import User, Notification
+import base64
+import hashlib
+
+ALGORITHM = "pin_pbkdf2_sha256"
+
+
+class PinLocked(ValueError):
+    pass
+
+
+def is_valid_pin(raw_pin):
+    return len(raw_pin) == 4 and raw_pin.isascii() and raw_pin.isdigit()
+
+
+def peppers():
+    """Every pepper a stored PIN may be hashed with, the current one first"""
+    current = settings.PIN_PEPPER or settings.SECRET_KEY
+    candidates = [current, *settings.PIN_PEPPER_FALLBACKS, settings.SECRET_KEY, *settings.SECRET_KEY_FALLBACKS]
+    return list(dict.fromkeys(pepper for pepper in candidates if pepper))
+
+
+def pepper_id(pepper):
+    return salted_hmac("core.pins.pepper", "", secret=pepper, algorithm="sha256").hexdigest()[:8]
+
+
+def derive(raw_pin, salt, iterations, pepper):
+    peppered = salted_hmac("core.pins", raw_pin, secret=pepper, algorithm="sha256")
+    digest = hashlib.pbkdf2_hmac("sha256", peppered.digest(), salt.encode(), iterations)
+    return base64.b64encode(digest).decode("ascii")
+
+
+def make_pin(raw_pin, salt=None):
+    """Encode a PIN for storage in User.pin"""
+    iterations = settings.PIN_HASH_ITERATIONS
+    salt = salt or get_random_string(16)
+    pepper = peppers()[0]
+    return f"{ALGORITHM}${iterations}${pepper_id(pepper)}${salt}${derive(raw_pin, salt, iterations, pepper)}"
+
+
+def verify_pin(raw_pin, encoded):
+    """Return (matches, needs_rehash) for a PIN against its stored encoding"""
+    parts = encoded.split("$")
+    if len(parts) == 4:
+        # Hashed before pepper ids were recorded; any known pepper may fit
+        parts.insert(2, None)
+    try:
+        algorithm, iterations, stored_id, salt, digest = parts
+        iterations = int(iterations)
+    except ValueError:
+        # No PIN set; hash anyway so the response time gives nothing away
+        make_pin(raw_pin)
+        return False, False
+    if algorithm != ALGORITHM:
+        make_pin(raw_pin)
+        return False, False
+    candidates = peppers()
+    checked = False
+    for pepper in candidates:
+        if stored_id is not None and pepper_id(pepper) != stored_id:
+            continue
+        checked = True
+        if constant_time_compare(derive(raw_pin, salt, iterations, pepper), digest):
+            return True, pepper != candidates[0] or stored_id is None or iterations != settings.PIN_HASH_ITERATIONS
+    if not checked:
+        # Made with a pepper that is no longer configured; hash anyway for the timing
+        make_pin(raw_pin)
+    return False, False
+
+
+def failures_key(user):
+    return f"pin-failures:{user.pk}"
+
+
+def check_pin(user, raw_pin):
+    """Check a user's PIN, counting failures; raises PinLocked while locked out"""
+    store = caches[settings.RATE_LIMIT_CACHE]
+    key = failures_key(user)
+    if store.get(key, 0) >= settings.PIN_MAX_ATTEMPTS:
+        raise PinLocked("Too many incorrect PIN attempts. Please try again later.")
+
+    matches, needs_rehash = verify_pin(raw_pin, user.pin)
+    if matches:
+        store.delete(key)
+        if needs_rehash:
+            user.pin = make_pin(raw_pin)
+            User.objects.filter(pk=user.pk).update(pin=user.pin)
+        return True
+
+    store.add(key, 0, timeout=settings.PIN_LOCKOUT_SECONDS)
+    try:
+        failures = store.incr(key)
+    except ValueError:
+        # The counter expired between add() and incr()
+        store.set(key, 1, timeout=settings.PIN_LOCKOUT_SECONDS)
+        failures = 1
+    if failures == settings.PIN_MAX_ATTEMPTS:
+        # The lockout runs for the full period from the last failure
+        store.set(key, failures, timeout=settings.PIN_LOCKOUT_SECONDS)
+        Notification.objects.create(
+            user=user,
+            title="PIN Locked",
+            message=(
+                f"Your security PIN was entered incorrectly {failures} times and has been locked for "
+                f"{settings.PIN_LOCKOUT_SECONDS // 60} minutes. If this wasn't you, please contact us right away."
+            ),
+            notification_type="SECURITY",
+        )
+    return False
+
+
+def set_pin(user, raw_pin):
+    """Store a new PIN for ``user`` and lift any lockout"""
+    user.pin = make_pin(raw_pin)
+    User.objects.filter(pk=user.pk).update(pin=user.pin)
+    caches[settings.RATE_LIMIT_CACHE].delete(failures_key(user))
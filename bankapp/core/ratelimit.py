@@ -0,0 +1,158 @@
+"""Throttling for the money-movement and login endpoints.
+
+Two layers:
+
+- ``rate_limit`` keeps a token bucket per user and per client IP in the
+  Django cache (RATE_LIMIT_CACHE), so every worker sharing that cache
+  shares the buckets. A bucket is a (tokens, updated_at) pair refilled on
+  read; there is no atomic compare-and-set on the locmem, file or database
+  caches, so two concurrent requests can both take the last token. That
+  slack is one request per racing worker, which is fine for throttling.
+- ``check_velocity`` applies per-account amount and frequency rules from
+  an in-memory sliding window, so a transfer costs no extra query. The
+  window is per process: with several workers each one enforces the
+  limits on the requests it serves.
+"""
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse
+from collections import deque
+from decimal import Decimal
+from functools import wraps
+from threading import Lock
+import math
+import time
+
+PERIODS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+
+
+class VelocityLimitExceeded(ValueError):
+    pass
+
+
+def parse_rate(rate):
+    """Turn ``"10/m"`` into (capacity, tokens refilled per second)"""
+    count, _, period = rate.partition("/")
+    count = int(count)
+    if count <= 0 or period not in PERIODS:
+        raise ValueError(f"Invalid rate: {rate!r}")
+    return count, count / PERIODS[period]
+
+
+def client_ip(request):
+    """The client address, trusting RATE_LIMIT_PROXY_COUNT hops of X-Forwarded-For"""
+    proxies = settings.RATE_LIMIT_PROXY_COUNT
+    forwarded = request.META.get("HTTP_X_FORWARDED_FOR")
+    if proxies and forwarded:
+        hops = [hop.strip() for hop in forwarded.split(",")]
+        return hops[-min(proxies, len(hops))]
+    return request.META.get("REMOTE_ADDR", "")
+
+
+def take_token(key, rate, now=None):
+    """Take one token from the bucket at ``key``; return 0 or the seconds until one is free"""
+    capacity, refill = parse_rate(rate)
+    now = time.time() if now is None else now
+    store = caches[settings.RATE_LIMIT_CACHE]
+    tokens, updated_at = store.get(key) or (capacity, now)
+    tokens = min(capacity, tokens + (now - updated_at) * refill)
+    if tokens < 1:
+        return (1 - tokens) / refill
+    # A bucket left alone until it is full again is the same as no bucket
+    store.set(key, (tokens - 1, now), timeout=math.ceil(capacity / refill) + 1)
+    return 0
+
+
+def too_many_requests(retry_after):
+    seconds = max(1, math.ceil(retry_after))
+    response = HttpResponse(
+        f"Too many requests. Please try again in {seconds} seconds.",
+        status=429, content_type="text/plain",
+    )
+    response["Retry-After"] = str(seconds)
+    return response
+
+
+def rate_limit(scope, methods=("POST",)):
+    """Throttle a view with the buckets configured under RATE_LIMITS[scope].
+
+    Each scope maps ``"user"`` and/or ``"ip"`` to a rate such as ``"10/m"``;
+    a request is refused with 429 when any of its buckets is empty. Only
+    ``methods`` are counted, so loading a form is never throttled.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if not settings.RATE_LIMIT_ENABLED or request.method not in methods:
+                return view(request, *args, **kwargs)
+            rates = settings.RATE_LIMITS.get(scope, {})
+            keys = []
+            if "user" in rates and request.user.is_authenticated:
+                keys.append((f"ratelimit:{scope}:user:{request.user.pk}", rates["user"]))
+            if "ip" in rates:
+                keys.append((f"ratelimit:{scope}:ip:{client_ip(request)}", rates["ip"]))
+            for key, rate in keys:
+                retry_after = take_token(key, rate)
+                if retry_after:
+                    return too_many_requests(retry_after)
+            return view(request, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class SlidingWindow:
+    """Recent (timestamp, amount) events per account, kept for ``span`` seconds"""
+
+    def __init__(self, span=3600):
+        self.span = span
+        self.events = {}
+        self.lock = Lock()
+        self.checks = 0
+
+    def prune(self, events, now):
+        while events and events[0][0] <= now - self.span:
+            events.popleft()
+
+    def sweep(self, now):
+        # Forget idle accounts so the window does not grow with every account ever seen
+        for key in [key for key, events in self.events.items() if not events or events[-1][0] <= now - self.span]:
+            del self.events[key]
+
+    def check_and_record(self, key, amount, limits, now=None):
+        """Record a movement unless it breaks ``limits``; return the broken limit's message or None"""
+        # A negative amount would lower the hourly sum and make room for more
+        if not amount.is_finite() or amount <= 0:
+            raise ValueError("Amount must be greater than 0")
+        now = time.time() if now is None else now
+        with self.lock:
+            self.checks += 1
+            if self.checks % 10000 == 0:
+                self.sweep(now)
+            events = self.events.setdefault(key, deque())
+            self.prune(events, now)
+            per_minute = limits.get("transfers_per_minute")
+            if per_minute and sum(1 for stamp, _ in events if stamp > now - 60) >= per_minute:
+                return f"You can make at most {per_minute} payments per minute. Please wait a moment."
+            per_hour = limits.get("amount_per_hour")
+            if per_hour and sum(value for _, value in events) + amount > per_hour:
+                return f"This would exceed your limit of ${per_hour} in payments per hour."
+            events.append((now, amount))
+            return None
+
+
+velocity_window = SlidingWindow()
+
+
+def check_velocity(account, amount):
+    """Raise VelocityLimitExceeded if moving ``amount`` out of ``account`` breaks VELOCITY_LIMITS.
+
+    Allowed movements are counted straight away, including ones that fail
+    later on (insufficient funds, unknown recipient), so retrying in a loop
+    still runs into the limit.
+    """
+    limits = settings.VELOCITY_LIMITS
+    if not any(limits.values()):
+        return
+    message = velocity_window.check_and_record(account.pk, Decimal(amount), limits)
+    if message:
+        raise VelocityLimitExceeded(message)
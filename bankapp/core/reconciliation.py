@@ -0,0 +1,97 @@
+"""End-of-day reconciliation of account balances against the journal.
+
+Every money movement updates ``BankAccount.balance`` and writes postings
+in the same transaction, so each account's balance should equal the sum
+of its postings. ``reconcile`` proves that for every account. It splits
+the account primary keys into ``chunks`` equal ranges of the UUID space,
+and each range is checked by a single grouped query: the range's
+accounts joined to their postings, grouped by account, keeping only the
+groups whose balance and posting sum differ. A range costs one pass over
+its accounts' postings on the (account, created_at) index, and only
+discrepancies leave the database.
+
+Account keys are random UUIDs, so equal key ranges hold about the same
+number of accounts and need no scan to find. Ranges are independent and
+read-only, so they can be spread over a pool of worker processes.
+"""
+from django.db import connections
+from django.db.models import DecimalField, ExpressionWrapper, F, Q, Sum, Value
+from django.db.models.functions import Coalesce
+from .models import BankAccount, Notification, User
+from decimal import Decimal
+import django
+import multiprocessing
+import uuid
+
+CHUNK_SIZE = 50000
+# Less than a cent; SQLite sums decimals as floats and can be off in the last digits
+TOLERANCE = Decimal("0.005")
+CENT = Decimal("0.01")
+MONEY = DecimalField(max_digits=14, decimal_places=2)
+
+
+def key_ranges(chunks):
+    """``chunks`` contiguous (low, high) UUID ranges covering every key; high is None for the last"""
+    step = (1 << 128) // chunks
+    bounds = [uuid.UUID(int=step * index) for index in range(chunks)]
+    return list(zip(bounds, bounds[1:] + [None]))
+
+
+def reconcile_range(bounds):
+    """Accounts in ``[low, high)`` whose balance is not the sum of their postings"""
+    low, high = bounds
+    accounts = BankAccount.objects.filter(pk__gte=low)
+    if high is not None:
+        accounts = accounts.filter(pk__lt=high)
+    ledger = Coalesce(Sum("postings__amount"), Value(Decimal("0.00")), output_field=MONEY)
+    rows = (
+        accounts.values("pk")
+        .annotate(ledger=ledger, difference=ExpressionWrapper(F("balance") - ledger, output_field=MONEY))
+        .filter(Q(difference__gt=TOLERANCE) | Q(difference__lt=-TOLERANCE))
+        .values_list("pk", "account_number", "user_id", "currency", "balance", "ledger")
+    )
+    return [(*row[:5], row[5].quantize(CENT)) for row in rows]
+
+
+def reconcile(chunk_size=CHUNK_SIZE, workers=1, progress=None):
+    """Check every account; returns (accounts checked, discrepancies).
+
+    Each discrepancy is ``(account_id, account_number, user_id, currency,
+    balance, ledger_sum)``; ``progress(ranges_done, ranges)`` is called
+    after each range.
+    """
+    accounts = BankAccount.objects.count()
+    ranges = key_ranges(max(1, -(-accounts // chunk_size)))
+    discrepancies = []
+    if workers > 1:
+        # Children open their own connections
+        connections.close_all()
+        # django.setup itself, as unpickling anything from this module would import models before it ran
+        with multiprocessing.get_context("spawn").Pool(workers, initializer=django.setup) as pool:
+            for done, found in enumerate(pool.imap_unordered(reconcile_range, ranges), 1):
+                discrepancies.extend(found)
+                if progress:
+                    progress(done, len(ranges))
+    else:
+        for done, bounds in enumerate(ranges, 1):
+            discrepancies.extend(reconcile_range(bounds))
+            if progress:
+                progress(done, len(ranges))
+    return accounts, sorted(discrepancies, key=lambda row: -abs(row[4] - row[5]))
+
+
+def alert_staff(discrepancies, report=""):
+    """Send every active staff user a SECURITY notification about the discrepancies"""
+    drift = sum((abs(balance - ledger) for *_, balance, ledger in discrepancies), Decimal("0"))
+    message = (
+        f"End-of-day reconciliation found {len(discrepancies)} account(s) whose balance differs from the "
+        f"ledger, by {drift:,.2f} in total."
+    )
+    if report:
+        message += f" Full report: {report}"
+    notifications = [
+        Notification(user_id=user_id, title="Ledger Reconciliation Failed", message=message, notification_type="SECURITY")
+        for user_id in User.objects.filter(is_staff=True, is_active=True).values_list("pk", flat=True)
+    ]
+    Notification.objects.bulk_create(notifications)
+    return len(notifications)
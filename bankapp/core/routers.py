@@ -0,0 +1,89 @@
+"""Send read-only history queries to a read replica.
+
+Nothing reads from the replica unless it asks to: views opt in with the
+``replica_reads`` decorator and code paths with ``use_replica()``. Even
+then the primary is used when
+
+- there is no ``replica`` database configured,
+- the query runs inside a transaction on the primary,
+- the current request has already written, or
+- the user wrote within the last REPLICA_PIN_SECONDS (tracked by
+  ReplicaPinMiddleware with a cookie), so a dashboard opened right after
+  a transfer never shows the old balance.
+"""
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.template.response import SimpleTemplateResponse
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+REPLICA_ALIAS = "replica"
+WRITE_VERBS = ("INSERT", "UPDATE", "DELETE", "REPLACE")
+
+
+class RequestRouting:
+    """Per-request routing state kept by ReplicaPinMiddleware"""
+
+    def __init__(self, pinned=False):
+        self.pinned = pinned
+        self.wrote = False
+
+
+_replica_allowed = ContextVar("replica_allowed", default=False)
+current_routing = ContextVar("current_routing", default=None)
+
+
+@contextmanager
+def use_replica():
+    """Let reads in this block go to the replica"""
+    token = _replica_allowed.set(True)
+    try:
+        yield
+    finally:
+        _replica_allowed.reset(token)
+
+
+def replica_reads(view):
+    """Serve GET and HEAD requests of a view from the replica, including template rendering"""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if request.method not in ("GET", "HEAD"):
+            return view(request, *args, **kwargs)
+        with use_replica():
+            response = view(request, *args, **kwargs)
+            # Template responses run their lazy querysets when rendered
+            if isinstance(response, SimpleTemplateResponse) and not response.is_rendered:
+                response.render()
+        return response
+    return wrapper
+
+
+def detect_write(execute, sql, params, many, context):
+    """Execute wrapper that remembers when a request modified the primary"""
+    routing = current_routing.get()
+    if routing is not None and sql.lstrip()[:7].upper().startswith(WRITE_VERBS):
+        routing.wrote = True
+    return execute(sql, params, many, context)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if not _replica_allowed.get() or REPLICA_ALIAS not in settings.DATABASES:
+            return None
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return None
+        routing = current_routing.get()
+        if routing is not None and (routing.pinned or routing.wrote):
+            return None
+        return REPLICA_ALIAS
+
+    def db_for_write(self, model, **hints):
+        # Objects read from the replica are saved to the primary
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Both aliases hold the same rows
+        if {obj1._state.db, obj2._state.db} <= {DEFAULT_DB_ALIAS, REPLICA_ALIAS}:
+            return True
+        return None
@@ -0,0 +1,136 @@
+"""Standing orders: recurrence rules and the batch run that pays them.
+
+``run_due_transfers`` works through due ScheduledTransfers in chunks.
+Each chunk is one database transaction that
+
+1. claims up to ``chunk_size`` due orders off the (status, next_run_at)
+   index with SELECT ... FOR UPDATE SKIP LOCKED, so several scheduler
+   processes can share a run without paying an order twice,
+2. locks every account involved, in primary key order,
+3. checks balances against the locked rows and records the transfers in
+   a LedgerBatch, which bulk-writes transactions, receipts, journal
+   entries, postings and notifications, and
+4. advances the orders' schedules in the same transaction.
+
+An order that cannot be paid (insufficient balance, inactive account)
+skips that occurrence and its owner is notified. After downtime an order
+is paid once and then moves to its next occurrence after now; missed
+occurrences are not made up.
+"""
+from django.db import transaction as db_transaction
+from django.utils import timezone
+from .models import ScheduledTransfer
+from .services import LedgerBatch, lock_accounts
+from calendar import monthrange
+from datetime import timedelta
+
+CHUNK_SIZE = 1000
+STEPS = {"DAILY": timedelta(days=1), "WEEKLY": timedelta(weeks=1)}
+ORDER_FIELDS = ["status", "next_run_at", "occurrence", "runs", "failures", "last_run_at", "last_error"]
+
+
+def add_months(moment, months):
+    """Same day of month ``months`` later, clamped to the month's last day"""
+    month_index = moment.month - 1 + months
+    year, month = moment.year + month_index // 12, month_index % 12 + 1
+    return moment.replace(year=year, month=month, day=min(moment.day, monthrange(year, month)[1]))
+
+
+def occurrence_at(order, index):
+    """When occurrence ``index`` (0 being start_at) of an order falls"""
+    if order.frequency == "MONTHLY":
+        # Counted from start_at, so the 31st stays the 31st after a short month
+        start = timezone.localtime(order.start_at)
+        return add_months(start, index * order.interval)
+    return order.start_at + STEPS.get(order.frequency, timedelta(0)) * index * order.interval
+
+
+def advance(order, now):
+    """Point an order at its first occurrence after ``now``, or complete it"""
+    index = order.occurrence + 1
+    if order.frequency in STEPS:
+        step = STEPS[order.frequency] * order.interval
+        index = max(index, (now - order.start_at) // step + 1)
+    if order.frequency == "ONCE":
+        following = None
+    else:
+        following = occurrence_at(order, index)
+        while following <= now:
+            index += 1
+            following = occurrence_at(order, index)
+    if following is None or (order.end_date and timezone.localdate(following) > order.end_date):
+        order.status = "COMPLETED"
+        order.next_run_at = None
+    else:
+        order.occurrence = index
+        order.next_run_at = following
+
+
+def schedule(order):
+    """Set up a new order's first run"""
+    order.occurrence = 0
+    order.next_run_at = order.start_at
+
+
+def pay(order, accounts, batch):
+    """Record one order's payment in ``batch``; returns an error message or None"""
+    sender, receiver = accounts[order.from_account_id], accounts[order.to_account_id]
+    if not sender.is_active or not receiver.is_active:
+        return "Account is not active"
+    if sender.balance < order.amount:
+        return "Insufficient balance"
+    description = order.description or "Standing order"
+    try:
+        batch.transfer(sender, receiver, order.amount, description)
+    except ValueError as e:
+        return str(e)
+    batch.notify(
+        sender.user,
+        "Standing Order Paid",
+        f"${order.amount} was sent to account {receiver.account_number} ({description}).",
+        related_object_id=str(order.pk),
+    )
+    return None
+
+
+def run_due_transfers(now=None, chunk_size=CHUNK_SIZE, progress=None):
+    """Pay every order due at ``now``; returns counts of paid and failed orders"""
+    now = now or timezone.now()
+    totals = {"paid": 0, "failed": 0, "completed": 0}
+    while True:
+        with db_transaction.atomic():
+            orders = list(
+                ScheduledTransfer.objects.select_for_update(skip_locked=True)
+                .filter(status="ACTIVE", next_run_at__lte=now)
+                .order_by("next_run_at")[:chunk_size]
+            )
+            if not orders:
+                break
+            accounts = lock_accounts({order.from_account_id for order in orders} | {order.to_account_id for order in orders})
+            batch = LedgerBatch(now)
+            for order in orders:
+                error = pay(order, accounts, batch)
+                order.last_run_at = now
+                if error:
+                    order.failures += 1
+                    order.last_error = error
+                    totals["failed"] += 1
+                    batch.notify(
+                        accounts[order.from_account_id].user,
+                        "Standing Order Failed",
+                        f"Your standing order of ${order.amount} to account {accounts[order.to_account_id].account_number} "
+                        f"could not be paid: {error}.",
+                        notification_type="INFO",
+                        related_object_id=str(order.pk),
+                    )
+                else:
+                    order.runs += 1
+                    order.last_error = ""
+                    totals["paid"] += 1
+                advance(order, now)
+                totals["completed"] += order.status == "COMPLETED"
+            batch.flush()
+            ScheduledTransfer.objects.bulk_update(orders, ORDER_FIELDS, batch_size=chunk_size)
+        if progress:
+            progress(totals)
+    return totals
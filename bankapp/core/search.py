@@ -0,0 +1,242 @@
+"""Indexed search over receipts, transactions and bill payments.
+
+Reference and account numbers are matched by prefix with the ``prefix``
+lookup, which stays on a B-tree index: a range scan on SQLite and LIKE
+against Django's varchar_pattern_ops index on Postgres. Free text goes
+through a full-text index created by migration 0017 - an FTS5 table kept
+in sync by triggers on SQLite, a GIN index over to_tsvector() on
+Postgres. Other databases fall back to icontains.
+"""
+from django.db import connection
+from django.db.models import BooleanField, CharField, Lookup, Q
+from django.db.models.expressions import RawSQL
+from django.utils import timezone
+from .models import Receipt, Transaction, BillPayment
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal, InvalidOperation
+import re
+
+# Upper bound of a prefix range under SQLite's byte-wise BINARY collation
+MAX_CHAR = "\U0010ffff"
+
+
+@CharField.register_lookup
+class Prefix(Lookup):
+    """Case-sensitive ``startswith`` that can use a plain index"""
+    lookup_name = "prefix"
+    prepare_rhs = False
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        return f"{lhs} LIKE %s", [*lhs_params, connection.ops.prep_for_like_query(self.rhs) + "%"]
+
+    def as_sqlite(self, compiler, connection):
+        # SQLite's LIKE is case-insensitive and never uses a BINARY index
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        return f"({lhs} >= %s AND {lhs} < %s)", [*lhs_params, self.rhs, *lhs_params, self.rhs + MAX_CHAR]
+
+
+class SearchSpec:
+    """How one model maps onto the search criteria"""
+
+    def __init__(self, table, text_columns, reference, counterparts, date_field, owner):
+        self.table = table
+        self.text_columns = text_columns
+        self.reference = reference
+        self.counterparts = counterparts
+        self.date_field = date_field
+        self.owner = owner
+
+    def document(self, prefix=""):
+        return " || ' ' || ".join(f"coalesce({prefix}{column}, '')" for column in self.text_columns)
+
+
+SEARCH_SPECS = {
+    Receipt: SearchSpec(
+        "core_receipt", ("description", "recipient_name"),
+        "reference_number", ("from_account", "to_account"), "created_at", "user",
+    ),
+    Transaction: SearchSpec(
+        "core_transaction", ("description",),
+        "receipt__reference_number", ("receipt__from_account", "receipt__to_account"), "timestamp", "account__user",
+    ),
+    BillPayment: SearchSpec(
+        "core_billpayment", ("provider_name",),
+        "reference_number", ("account_number",), "created_at", "user",
+    ),
+}
+
+
+def _sqlite_search_statements(table, columns):
+    fts = f"{table}_fts"
+    document = " || ' ' || ".join(f"coalesce(NEW.{column}, '')" for column in columns)
+    # row_id is indexed so triggers find a row's entry with MATCH instead of a scan
+    remove = f"DELETE FROM {fts} WHERE {fts} MATCH 'row_id : \"' || OLD.id || '\"';"
+    insert = f"INSERT INTO {fts} (row_id, body) VALUES (NEW.id, {document});"
+    return {
+        f"{fts}_insert": f"CREATE TRIGGER {fts}_insert AFTER INSERT ON {table} BEGIN {insert} END",
+        f"{fts}_update": f"CREATE TRIGGER {fts}_update AFTER UPDATE OF id, {', '.join(columns)} ON {table} BEGIN {remove} {insert} END",
+        f"{fts}_delete": f"CREATE TRIGGER {fts}_delete AFTER DELETE ON {table} BEGIN {remove} END",
+    }
+
+
+def install_search_index(connection):
+    """Create the full-text index, repairing it if a table rebuild dropped its triggers.
+
+    SQLite gets one FTS5 table per model, filled by triggers on the model's
+    table. Migrations that rebuild a table on SQLite drop those triggers,
+    so this also runs after every migrate (see CoreConfig.ready) and
+    reindexes any table whose triggers went missing.
+    """
+    with connection.cursor() as cursor:
+        for spec in SEARCH_SPECS.values():
+            if connection.vendor == "sqlite":
+                fts = f"{spec.table}_fts"
+                cursor.execute(
+                    f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5("
+                    f"row_id, body, tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+                )
+                triggers = _sqlite_search_statements(spec.table, spec.text_columns)
+                cursor.execute(
+                    "SELECT name FROM sqlite_master WHERE type = 'trigger' AND tbl_name = %s", [spec.table]
+                )
+                existing = {name for name, in cursor.fetchall()}
+                if existing >= set(triggers):
+                    continue
+                for name, statement in triggers.items():
+                    cursor.execute(f"DROP TRIGGER IF EXISTS {name}")
+                    cursor.execute(statement)
+                cursor.execute(f"DELETE FROM {fts}")
+                cursor.execute(f"INSERT INTO {fts} (row_id, body) SELECT id, {spec.document()} FROM {spec.table}")
+            elif connection.vendor == "postgresql":
+                cursor.execute(
+                    f"CREATE INDEX IF NOT EXISTS {spec.table}_search_idx ON {spec.table} "
+                    f"USING gin (to_tsvector('english', {spec.document()}))"
+                )
+
+
+def drop_search_index(connection):
+    with connection.cursor() as cursor:
+        for spec in SEARCH_SPECS.values():
+            if connection.vendor == "sqlite":
+                for name in _sqlite_search_statements(spec.table, spec.text_columns):
+                    cursor.execute(f"DROP TRIGGER IF EXISTS {name}")
+                cursor.execute(f"DROP TABLE IF EXISTS {spec.table}_fts")
+            elif connection.vendor == "postgresql":
+                cursor.execute(f"DROP INDEX IF EXISTS {spec.table}_search_idx")
+
+
+def words(text):
+    return re.findall(r"\w+", text or "")
+
+
+def full_text_filter(spec, text):
+    """Condition matching rows whose text contains every word of ``text`` (as a prefix)"""
+    terms = words(text)
+    if connection.vendor == "sqlite":
+        query = "{body} : (%s)" % " ".join(f'"{term}"*' for term in terms)
+        return Q(pk__in=RawSQL(f"SELECT row_id FROM {spec.table}_fts WHERE {spec.table}_fts MATCH %s", [query]))
+    if connection.vendor == "postgresql":
+        query = " & ".join(f"{term}:*" for term in terms)
+        return Q(RawSQL(
+            f"to_tsvector('english', {spec.document(f'{connection.ops.quote_name(spec.table)}.')}) "
+            f"@@ to_tsquery('english', %s)",
+            [query], output_field=BooleanField(),
+        ))
+    condition = Q()
+    for term in terms:
+        condition &= Q.create([(f"{column}__icontains", term) for column in spec.text_columns], connector=Q.OR)
+    return condition
+
+
+def search(queryset, text="", reference="", counterpart="", email="", min_amount=None, max_amount=None,
+           start=None, end=None):
+    """Filter a Receipt, Transaction or BillPayment queryset; empty criteria are ignored.
+
+    ``start`` and ``end`` are dates, both inclusive.
+    """
+    spec = SEARCH_SPECS[queryset.model]
+    if words(text):
+        queryset = queryset.filter(full_text_filter(spec, text))
+    if reference:
+        queryset = queryset.filter(**{f"{spec.reference}__prefix": reference.strip().upper()})
+    if counterpart:
+        queryset = queryset.filter(
+            Q.create([(f"{field}__prefix", counterpart.strip()) for field in spec.counterparts], connector=Q.OR)
+        )
+    if email:
+        queryset = queryset.filter(**{f"{spec.owner}__email__iexact": email.strip()})
+    if min_amount is not None:
+        queryset = queryset.filter(amount__gte=min_amount)
+    if max_amount is not None:
+        queryset = queryset.filter(amount__lte=max_amount)
+    if start is not None:
+        queryset = queryset.filter(**{f"{spec.date_field}__gte": timezone.make_aware(datetime.combine(start, time.min))})
+    if end is not None:
+        queryset = queryset.filter(
+            **{f"{spec.date_field}__lt": timezone.make_aware(datetime.combine(end + timedelta(days=1), time.min))}
+        )
+    return queryset
+
+
+def parse_amount(value):
+    if not value:
+        return None
+    try:
+        amount = Decimal(value)
+    except InvalidOperation:
+        raise ValueError(f"Invalid amount: {value}")
+    if not amount.is_finite():
+        raise ValueError(f"Invalid amount: {value}")
+    return amount
+
+
+def parse_date(value):
+    if not value:
+        return None
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f"Invalid date: {value}")
+
+
+def parse_range(value, parse):
+    low, separator, high = value.partition("..")
+    if not separator:
+        return parse(low), parse(low)
+    return parse(low), parse(high)
+
+
+def parse_search_terms(term):
+    """Turn an admin search box string into search() criteria.
+
+    Understands ``ref:``, ``account:``, ``email:``, ``amount:100..250`` and
+    ``date:2025-01-01..2025-01-31`` (either end may be left open). Bare
+    words with an ``@`` are emails, digits-only words are account numbers,
+    other words containing a digit are references and the rest is text.
+    """
+    criteria = {}
+    text = []
+    for token in term.split():
+        key, colon, value = token.partition(":")
+        key = key.lower()
+        if colon and key in ("ref", "reference"):
+            criteria["reference"] = value
+        elif colon and key in ("account", "acct"):
+            criteria["counterpart"] = value
+        elif colon and key == "email":
+            criteria["email"] = value
+        elif colon and key == "amount":
+            criteria["min_amount"], criteria["max_amount"] = parse_range(value, parse_amount)
+        elif colon and key == "date":
+            criteria["start"], criteria["end"] = parse_range(value, parse_date)
+        elif "@" in token:
+            criteria["email"] = token
+        elif token.isdigit():
+            criteria["counterpart"] = token
+        elif any(character.isdigit() for character in token):
+            criteria["reference"] = token
+        else:
+            text.append(token)
+    criteria["text"] = " ".join(text)
+    return criteria
@@ -0,0 +1,310 @@
+"""Synthetic bank data for benchmarks and load tests.
+
+Users are generated in independent chunks, each with its own random
+stream derived from ``(seed, chunk index)``. Amounts, timestamps and
+primary keys all come from that stream and a base time ``now`` shared by
+every chunk, so the same seed and ``now`` produce the same bank whether
+it is written by one process or many; only the auto-increment ids of
+postings and notifications follow the order chunks are written in.
+Everything goes through bulk_create and stays internally consistent:
+each account's balance equals the sum of its journal postings, and every
+seeded Transaction has a matching journal entry and receipt.
+"""
+from .models import (
+    User, BankAccount, Transaction, JournalEntry, Posting, Receipt, Notification, Loan, BillPayment, generate_uuid7,
+)
+from .pins import make_pin
+from django.contrib.auth.hashers import make_password
+from django.db import connections, transaction as db_transaction
+from django.utils import timezone
+from collections import Counter
+from contextlib import contextmanager
+from datetime import timedelta
+from decimal import Decimal
+import heapq
+import math
+import multiprocessing
+import random
+import uuid
+
+SEED_PASSWORD = "bench-password"
+SEED_PIN = "2468"
+BATCH_SIZE = 5000
+CHUNK_SIZE = 1000
+
+# Share of ledger events by kind, and the median amount of each
+EVENT_MIX = (("DEPOSIT", 0.30), ("WITHDRAW", 0.30), ("TRANSFER", 0.25), ("BILL_PAYMENT", 0.15))
+MEDIAN_AMOUNTS = {"DEPOSIT": 300, "WITHDRAW": 60, "TRANSFER": 100, "BILL_PAYMENT": 80}
+LOAN_STATUSES = (("PENDING", 0.2), ("APPROVED", 0.1), ("REJECTED", 0.2), ("ACTIVE", 0.4), ("COMPLETED", 0.1))
+
+# Multiplier coprime to the 9e9 account-number space, so index -> number is one-to-one
+ACCOUNT_NUMBER_STRIDE = 2654435761
+
+
+@contextmanager
+def explicit_timestamps(*fields):
+    """Let bulk_create keep the timestamps we set on auto_now and auto_now_add fields"""
+    saved = [(field, field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+def account_number_for(seed, index):
+    return str(1000000000 + (index * ACCOUNT_NUMBER_STRIDE + seed) % 9000000000)
+
+
+def _pick(rng, weighted):
+    return rng.choices([value for value, _ in weighted], weights=[weight for _, weight in weighted])[0]
+
+
+def _amount(rng, kind):
+    # Log-normal: most payments are small, a few are large
+    value = rng.lognormvariate(math.log(MEDIAN_AMOUNTS[kind]), 0.9)
+    return Decimal(min(value, 99999)).quantize(Decimal("0.01"))
+
+
+def _uuid4(rng):
+    return uuid.UUID(int=rng.getrandbits(128), version=4)
+
+
+def _count(rng, mean):
+    """Heavy-tailed per-user count with the given mean"""
+    if mean <= 0:
+        return 0
+    sigma = 1.0
+    return int(rng.lognormvariate(math.log(mean) - sigma ** 2 / 2, sigma) + 0.5)
+
+
+def seed_chunk(seed, chunk, first_index, size, params):
+    """Write one chunk of users with all of their history, returns rows written per model"""
+    rng = random.Random(f"{seed}:{chunk}")
+    now = params["now"]
+    days = params["days"]
+    tag = f"S{seed}-{chunk}"
+
+    users, accounts = [], []
+    for offset in range(size):
+        index = first_index + offset
+        joined = now - timedelta(days=days)
+        user = User(
+            id=_uuid4(rng),
+            email=f"user{seed}-{index}@example.com",
+            password=params["password"],
+            pin=params["pin"],
+            first_name=f"User{index}",
+            last_name="Seeded",
+            is_approved=True,
+            date_joined=joined,
+        )
+        users.append(user)
+        accounts.append(BankAccount(
+            id=_uuid4(rng),
+            user=user,
+            account_number=account_number_for(seed, index),
+            account_type="CURRENT" if rng.random() < 0.3 else "SAVINGS",
+            created_at=joined,
+        ))
+
+    # Every ledger event of the chunk, replayed in time order so transfers
+    # and withdrawals only ever spend money that is already there
+    events = []
+    for position in range(size):
+        for _ in range(_count(rng, params["transactions_per_account"])):
+            events.append((now - timedelta(days=rng.uniform(0, days)), position, _pick(rng, EVENT_MIX)))
+    heapq.heapify(events)
+
+    balances = [Decimal("0")] * size
+    transactions, entries, postings, receipts, bills = [], [], [], [], []
+    serial = 0
+
+    def record(position, kind, amount, created_at, description, receipt_type, entry_type, legs, counterpart=""):
+        nonlocal serial
+        serial += 1
+        account = accounts[position]
+        receipt = Receipt(
+            id=generate_uuid7(created_at, rng),
+            user=account.user,
+            transaction_type=receipt_type,
+            reference_number=f"{receipt_type.upper()}-{tag}-{serial}",
+            amount=amount,
+            description=description,
+            from_account=account.account_number if receipt_type != "deposit" else "",
+            to_account=counterpart,
+            created_at=created_at,
+        )
+        receipts.append(receipt)
+        transactions.append(Transaction(
+            id=generate_uuid7(created_at, rng),
+            account=account, amount=amount, transaction_type=kind, timestamp=created_at,
+            description=description, receipt=receipt,
+        ))
+        entry = JournalEntry(id=generate_uuid7(created_at, rng), entry_type=entry_type, description=description, created_at=created_at)
+        entries.append(entry)
+        for leg_account, external_account, signed in legs:
+            postings.append(Posting(entry=entry, account=leg_account, external_account=external_account, amount=signed, created_at=created_at))
+
+    while events:
+        created_at, position, kind = heapq.heappop(events)
+        account = accounts[position]
+        amount = _amount(rng, kind)
+        if kind != "DEPOSIT" and (balances[position] < amount or (kind == "TRANSFER" and size == 1)):
+            kind, amount = "DEPOSIT", _amount(rng, "DEPOSIT")
+
+        if kind == "DEPOSIT":
+            balances[position] += amount
+            record(position, "DEPOSIT", amount, created_at, "Seeded deposit", "deposit",
+                   "DEPOSIT", [(account, "", amount), (None, "CASH", -amount)], account.account_number)
+        elif kind == "WITHDRAW":
+            balances[position] -= amount
+            record(position, "WITHDRAW", amount, created_at, "Seeded withdrawal", "withdraw",
+                   "WITHDRAW", [(account, "", -amount), (None, "CASH", amount)])
+        elif kind == "BILL_PAYMENT":
+            bill_type = rng.choice(BillPayment.BILL_TYPES)[0]
+            balances[position] -= amount
+            record(position, "WITHDRAW", amount, created_at, f"Bill Payment - Seeded Utility ({bill_type})", "bill_payment",
+                   "BILL_PAYMENT", [(account, "", -amount), (None, "BILLERS", amount)])
+            bills.append(BillPayment(
+                id=generate_uuid7(created_at, rng),
+                user=account.user,
+                bill_type=bill_type,
+                provider_name="Seeded Utility",
+                account_number=str(rng.randint(100000, 999999)),
+                amount=amount,
+                status="COMPLETED",
+                reference_number=f"BILL-{tag}-{serial}",
+                due_date=created_at.date(),
+                paid_at=created_at,
+                created_at=created_at,
+                updated_at=created_at,
+            ))
+        else:
+            other = rng.randrange(size - 1)
+            other += other >= position
+            receiver = accounts[other]
+            balances[position] -= amount
+            balances[other] += amount
+            record(position, "TRANSFER", amount, created_at, f"Sent to {receiver.account_number}. Seeded transfer",
+                   "transfer", "TRANSFER", [(account, "", -amount), (receiver, "", amount)], receiver.account_number)
+            # The receiving leg shares the sender's journal entry
+            transactions.append(Transaction(
+                id=generate_uuid7(created_at, rng),
+                account=receiver, amount=amount, transaction_type="TRANSFER", timestamp=created_at,
+                description=f"Received from {account.account_number}. Seeded transfer",
+            ))
+
+    for account, balance in zip(accounts, balances):
+        account.balance = balance
+
+    notifications = [
+        Notification(
+            user=user,
+            title="Seeded notification",
+            message="Synthetic notification for load testing.",
+            notification_type=rng.choice(Notification.NOTIFICATION_TYPES)[0],
+            is_read=rng.random() < 0.8,
+            created_at=now - timedelta(days=rng.uniform(0, days)),
+        )
+        for user in users
+        for _ in range(_count(rng, params["notifications_per_user"]))
+    ]
+
+    loans = []
+    for user in users:
+        if rng.random() >= params["loan_probability"]:
+            continue
+        loan = Loan(
+            id=_uuid4(rng),
+            user=user,
+            loan_type=rng.choice(Loan.LOAN_TYPES)[0],
+            loan_amount=Decimal(rng.randrange(1000, 50000, 500)),
+            interest_rate=Decimal(rng.randint(300, 1500)) / 100,
+            loan_term_months=rng.choice((12, 24, 36, 60)),
+            status=_pick(rng, LOAN_STATUSES),
+            purpose="Seeded",
+        )
+        loan.created_at = loan.updated_at = now - timedelta(days=rng.uniform(0, days))
+        loan.calculate_monthly_payment()
+        loans.append(loan)
+
+    with db_transaction.atomic(), explicit_timestamps(
+        User._meta.get_field("date_joined"),
+        BankAccount._meta.get_field("created_at"),
+        Transaction._meta.get_field("timestamp"),
+        Receipt._meta.get_field("created_at"),
+        Notification._meta.get_field("created_at"),
+        Loan._meta.get_field("created_at"),
+        Loan._meta.get_field("updated_at"),
+        BillPayment._meta.get_field("created_at"),
+        BillPayment._meta.get_field("updated_at"),
+    ):
+        User.objects.bulk_create(users, batch_size=BATCH_SIZE)
+        BankAccount.objects.bulk_create(accounts, batch_size=BATCH_SIZE)
+        Receipt.objects.bulk_create(receipts, batch_size=BATCH_SIZE)
+        Transaction.objects.bulk_create(transactions, batch_size=BATCH_SIZE)
+        JournalEntry.objects.bulk_create(entries, batch_size=BATCH_SIZE)
+        Posting.objects.bulk_create(postings, batch_size=BATCH_SIZE)
+        Notification.objects.bulk_create(notifications, batch_size=BATCH_SIZE)
+        Loan.objects.bulk_create(loans, batch_size=BATCH_SIZE)
+        BillPayment.objects.bulk_create(bills, batch_size=BATCH_SIZE)
+
+    return Counter({
+        "users": len(users),
+        "accounts": len(accounts),
+        "transactions": len(transactions),
+        "receipts": len(receipts),
+        "journal_entries": len(entries),
+        "postings": len(postings),
+        "notifications": len(notifications),
+        "loans": len(loans),
+        "bill_payments": len(bills),
+    })
+
+
+def _seed_chunk_job(job):
+    return seed_chunk(*job)
+
+
+def _init_worker():
+    import django
+    django.setup()
+
+
+def seed_bank(users=100, transactions_per_account=50, notifications_per_user=10, loan_probability=0.3,
+              days=365, seed=0, chunk_size=CHUNK_SIZE, workers=1, progress=None, now=None):
+    """Create a self-consistent synthetic bank ending at ``now``, returns the number of rows written per model"""
+    salt = f"seed{seed}"
+    params = {
+        "transactions_per_account": transactions_per_account,
+        "notifications_per_user": notifications_per_user,
+        "loan_probability": loan_probability,
+        "days": days,
+        "now": now or timezone.now(),
+        # Hashing once keeps a million users from costing a million PBKDF2 runs
+        "password": make_password(SEED_PASSWORD, salt=salt),
+        "pin": make_pin(SEED_PIN, salt=salt),
+    }
+    jobs = [
+        (seed, chunk, first_index, min(chunk_size, users - first_index), params)
+        for chunk, first_index in enumerate(range(0, users, chunk_size))
+    ]
+
+    totals = Counter()
+    if workers > 1:
+        # Children open their own connections
+        connections.close_all()
+        with multiprocessing.get_context("spawn").Pool(workers, initializer=_init_worker) as pool:
+            for rows in pool.imap_unordered(_seed_chunk_job, jobs):
+                totals.update(rows)
+                if progress:
+                    progress(totals)
+    else:
+        for job in jobs:
+            totals.update(seed_chunk(*job))
+            if progress:
+                progress(totals)
+    return dict(totals)
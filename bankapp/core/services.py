@@ -1,11 +1,26 @@
-from .models import BankAccount, Transaction, Receipt
+from .models import BankAccount, Transaction, Receipt, JournalEntry, Posting, Notification, Loan
+from .analytics import record_activity, record_activity_bulk, increment_fields
+from .fraud import screen_movement
+from . import fx
 from django.db import transaction as db_transaction
+from django.db.models import Count, Sum, Q, Value, DecimalField
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from collections import defaultdict
 from decimal import Decimal
 import uuid
 
+ZERO = Value(Decimal("0.00"), output_field=DecimalField(max_digits=12, decimal_places=2))
+# Composed descriptions ("Sent to ... <note>") can outgrow the column
+DESCRIPTION_LENGTH = Transaction._meta.get_field("description").max_length
+
+
+def receipt_reference(transaction_type):
+    return f"{transaction_type.upper()}-{str(uuid.uuid4())[:8].upper()}"
+
 def generate_receipt(user, transaction_type, amount, description, from_account="", to_account="", recipient_name="", status="completed"):
     """Generate a receipt for any transaction"""
-    reference_number = f"{transaction_type.upper()}-{str(uuid.uuid4())[:8].upper()}"
+    reference_number = receipt_reference(transaction_type)
     
     receipt = Receipt.objects.create(
         user=user,
@@ -20,38 +35,84 @@ def generate_receipt(user, transaction_type, amount, description, from_account="
     )
     return receipt
 
+def post_journal_entry(entry_type, description, legs):
+    """Write a balanced journal entry.
+
+    ``legs`` is a list of ``(account, external_account, amount)`` tuples with
+    signed amounts; exactly one of ``account``/``external_account`` is set.
+    """
+    if sum(amount for _, _, amount in legs) != 0:
+        raise ValueError("Journal entry does not balance")
+
+    entry = JournalEntry.objects.create(entry_type=entry_type, description=description[:255])
+    postings = Posting.objects.bulk_create([
+        Posting(entry=entry, account=account, external_account=external_account, amount=amount, created_at=entry.created_at)
+        for account, external_account, amount in legs
+    ])
+    record_activity(entry, postings)
+    return entry
+
 def deposit(account: BankAccount, amount: Decimal, description: str = ""):
     if amount <= 0:
         raise ValueError("Deposit amount must be positive")
 
     with db_transaction.atomic():
-        account.balance += amount
-        account.save()
+        # Batch writers add to balances in SQL, so only a locked row is safe to save
+        locked = lock_accounts([account.pk])[account.pk]
+        locked.balance += amount
+        locked.save(update_fields=["balance"])
+        account.balance = locked.balance
         txn = Transaction.objects.create(
-            account=account,
+            account=locked,
             amount=amount,
             transaction_type="DEPOSIT",
-            description=description
+            description=description[:DESCRIPTION_LENGTH]
         )
+        post_journal_entry("DEPOSIT", description, [
+            (locked, "", amount),
+            (None, "CASH", -amount),
+        ])
     return txn
 
-def withdraw(account: BankAccount, amount: Decimal, description: str = ""):
+def withdraw(account: BankAccount, amount: Decimal, description: str = "", entry_type: str = "WITHDRAW", counterpart: str = "CASH"):
     if amount <= 0:
         raise ValueError("Withdrawal amount must be positive")
     if account.balance < amount:
         raise ValueError("Insufficient balance")
 
     with db_transaction.atomic():
-        account.balance -= amount
-        account.save()
+        locked = lock_accounts([account.pk])[account.pk]
+        if locked.balance < amount:
+            raise ValueError("Insufficient balance")
+        locked.balance -= amount
+        locked.save(update_fields=["balance"])
+        account.balance = locked.balance
         txn = Transaction.objects.create(
-            account=account,
+            account=locked,
             amount=amount,
             transaction_type="WITHDRAW",
-            description=description
+            description=description[:DESCRIPTION_LENGTH]
         )
+        entry = post_journal_entry(entry_type, description, [
+            (locked, "", -amount),
+            (None, counterpart, amount),
+        ])
+        screen_movement(locked, amount, entry)
     return txn
 
+def transfer_legs(sender: BankAccount, receiver: BankAccount, amount: Decimal):
+    """Amount credited, description note and journal legs for sending ``amount`` of the sender's currency.
+
+    A transfer between currencies converts at the in-memory rate table and
+    goes through the FX account, so the entry still sums to zero.
+    """
+    if sender.currency == receiver.currency:
+        return amount, "", [(sender, "", -amount), (receiver, "", amount)]
+    rates = fx.rates()
+    credited, rate = rates.convert(amount, sender.currency, receiver.currency)
+    note = f" {amount} {sender.currency} = {credited} {receiver.currency} at {rate:.6f} (rates {rates.version})"
+    return credited, note, [(sender, "", -amount), (None, "FX", amount), (None, "FX", -credited), (receiver, "", credited)]
+
 def transfer(sender: BankAccount, receiver: BankAccount, amount: Decimal, description: str = ""):
     if sender == receiver:
         raise ValueError("Cannot transfer to the same account")
@@ -61,23 +122,212 @@ def transfer(sender: BankAccount, receiver: BankAccount, amount: Decimal, descri
         raise ValueError("Insufficient balance")
 
     with db_transaction.atomic():
-        sender.balance -= amount
-        receiver.balance += amount
-        sender.save()
-        receiver.save()
+        accounts = lock_accounts([sender.pk, receiver.pk])
+        locked_sender, locked_receiver = accounts[sender.pk], accounts[receiver.pk]
+        if locked_sender.balance < amount:
+            raise ValueError("Insufficient balance")
+        credited, note, legs = transfer_legs(locked_sender, locked_receiver, amount)
+        locked_sender.balance -= amount
+        locked_receiver.balance += credited
+        locked_sender.save(update_fields=["balance"])
+        locked_receiver.save(update_fields=["balance"])
+        sender.balance, receiver.balance = locked_sender.balance, locked_receiver.balance
 
         txn = Transaction.objects.create(
-            account=sender,
+            account=locked_sender,
             amount=amount,
             transaction_type="TRANSFER",
-            description=f"Sent to {receiver.account_number}. {description}"
+            description=f"Sent to {receiver.account_number}. {description}{note}"[:DESCRIPTION_LENGTH]
         )
 
         Transaction.objects.create(
-            account=receiver,
-            amount=amount,
+            account=locked_receiver,
+            amount=credited,
             transaction_type="TRANSFER",
-            description=f"Received from {sender.account_number}. {description}"
+            description=f"Received from {sender.account_number}. {description}{note}"[:DESCRIPTION_LENGTH]
         )
 
+        entry = post_journal_entry("TRANSFER", description, legs)
+        screen_movement(locked_sender, amount, entry, payee=locked_receiver)
+
     return txn
+
+def lock_accounts(account_ids):
+    """Lock accounts for the rest of the transaction, in primary key order so batches never deadlock"""
+    return {
+        account.pk: account
+        for account in BankAccount.objects.select_for_update().select_related("user").filter(pk__in=account_ids).order_by("pk")
+    }
+
+class LedgerBatch:
+    """Ledger writes for many money movements, written with a few bulk statements.
+
+    Callers lock the accounts involved with lock_accounts() inside an open
+    transaction, check balances against the locked rows and then record
+    movements here. ``post`` keeps the in-memory balances current, so later
+    movements in the same batch see earlier ones; ``flush`` writes the rows
+    and applies the balance changes in SQL.
+    """
+
+    def __init__(self, now=None):
+        self.now = now or timezone.now()
+        self.clear()
+
+    def clear(self):
+        self.entries = []
+        self.postings = []
+        self.transactions = []
+        self.receipts = []
+        self.notifications = []
+        self.balance_changes = defaultdict(Decimal)
+
+    def post(self, entry_type, description, legs):
+        """Batch version of post_journal_entry()"""
+        if sum(amount for _, _, amount in legs) != 0:
+            raise ValueError("Journal entry does not balance")
+        entry = JournalEntry(entry_type=entry_type, description=description[:255], created_at=self.now)
+        self.entries.append(entry)
+        for account, external_account, amount in legs:
+            self.postings.append(Posting(
+                entry=entry, account=account, external_account=external_account, amount=amount, created_at=self.now,
+            ))
+            if account is not None:
+                account.balance += amount
+                self.balance_changes[account.pk] += amount
+        return entry
+
+    def transaction(self, account, amount, transaction_type, description, receipt=None):
+        txn = Transaction(
+            account=account, amount=amount, transaction_type=transaction_type, description=description[:DESCRIPTION_LENGTH], receipt=receipt,
+        )
+        self.transactions.append(txn)
+        return txn
+
+    def receipt(self, user, transaction_type, amount, description, from_account="", to_account="", recipient_name="", status="completed"):
+        receipt = Receipt(
+            user=user,
+            transaction_type=transaction_type,
+            amount=amount,
+            reference_number=receipt_reference(transaction_type),
+            description=description,
+            from_account=from_account,
+            to_account=to_account,
+            recipient_name=recipient_name,
+            status=status,
+        )
+        self.receipts.append(receipt)
+        return receipt
+
+    def notify(self, user, title, message, notification_type="INFO", related_object_id=""):
+        self.notifications.append(Notification(
+            user=user, title=title, message=message, notification_type=notification_type, related_object_id=related_object_id,
+        ))
+
+    def transfer(self, sender, receiver, amount, description=""):
+        """Batch version of transfer(); returns the sender's Transaction"""
+        credited, note, legs = transfer_legs(sender, receiver, amount)
+        receipt = self.receipt(
+            sender.user, "transfer", amount, description or "Transfer",
+            from_account=sender.account_number,
+            to_account=receiver.account_number,
+            recipient_name=f"{receiver.user.first_name} {receiver.user.last_name}",
+        )
+        txn = self.transaction(sender, amount, "TRANSFER", f"Sent to {receiver.account_number}. {description}{note}", receipt=receipt)
+        self.transaction(receiver, credited, "TRANSFER", f"Received from {sender.account_number}. {description}{note}")
+        self.post("TRANSFER", description, legs)
+        return txn
+
+    def flush(self):
+        """Write everything recorded so far; call inside the transaction holding the locks"""
+        with db_transaction.atomic():
+            Receipt.objects.bulk_create(self.receipts, batch_size=2000)
+            Transaction.objects.bulk_create(self.transactions, batch_size=2000)
+            JournalEntry.objects.bulk_create(self.entries, batch_size=2000)
+            Posting.objects.bulk_create(self.postings, batch_size=2000)
+            Notification.objects.bulk_create(self.notifications, batch_size=2000)
+            increment_fields(BankAccount, {pk: {"balance": change} for pk, change in self.balance_changes.items() if change})
+            record_activity_bulk(self.entries, self.postings)
+        self.clear()
+
+def disburse_loans(loan_ids, chunk_size=1000, now=None):
+    """Pay approved loans into their borrowers' accounts through the ledger.
+
+    Each chunk locks its loans and then all their borrowers' accounts in one
+    go, so a loan cannot be paid out twice and balances cannot race, and
+    writes the LOAN_DISBURSAL entries, deposits, loan_disbursal receipts and
+    notifications with one LedgerBatch. Returns the disbursed Loans and a
+    ``{loan_id: error}`` dict for those that were not.
+    """
+    loan_ids = list(loan_ids)
+    disbursed, errors = [], {}
+    for start in range(0, len(loan_ids), chunk_size):
+        chunk_ids = loan_ids[start:start + chunk_size]
+        with db_transaction.atomic():
+            loans = list(Loan.objects.select_for_update().filter(pk__in=chunk_ids).order_by("pk"))
+            errors.update({loan.pk: "Only approved loans can be disbursed" for loan in loans if loan.status != "APPROVED"})
+            loans = [loan for loan in loans if loan.status == "APPROVED"]
+            account_ids = BankAccount.objects.filter(user_id__in={loan.user_id for loan in loans}).values_list("pk", flat=True)
+            accounts = {account.user_id: account for account in lock_accounts(account_ids).values()}
+            batch = LedgerBatch(now)
+            paid = []
+            for loan in loans:
+                account = accounts.get(loan.user_id)
+                if account is None:
+                    errors[loan.pk] = "Bank account not found for user"
+                    continue
+                if not account.is_active:
+                    errors[loan.pk] = "Bank account is not active"
+                    continue
+                user = account.user
+                description = f"{loan.get_loan_type_display()} disbursal"
+                receipt = batch.receipt(
+                    user, "loan_disbursal", loan.loan_amount, description,
+                    from_account="LOANS",
+                    to_account=account.account_number,
+                    recipient_name=f"{user.first_name} {user.last_name}",
+                )
+                batch.transaction(account, loan.loan_amount, "DEPOSIT", description, receipt=receipt)
+                batch.post("LOAN_DISBURSAL", description, [
+                    (account, "", loan.loan_amount),
+                    (None, "LOANS", -loan.loan_amount),
+                ])
+                batch.notify(
+                    user,
+                    "Loan Disbursed",
+                    f"Your {loan.get_loan_type_display()} of ${loan.loan_amount} has been disbursed to your account.",
+                    related_object_id=str(loan.id),
+                )
+                loan.status = "ACTIVE"
+                loan.disbursed_amount = loan.loan_amount
+                loan.disbursed_at = batch.now
+                loan.updated_at = batch.now
+                paid.append(loan)
+            batch.flush()
+            Loan.objects.bulk_update(paid, ["status", "disbursed_amount", "disbursed_at", "updated_at"])
+        disbursed.extend(paid)
+    return disbursed, errors
+
+def ledger_balance(account: BankAccount, until=None):
+    """Balance of an account according to its postings, optionally as of a moment"""
+    postings = account.postings.all()
+    if until is not None:
+        postings = postings.filter(created_at__lt=until)
+    return postings.aggregate(balance=Coalesce(Sum("amount"), ZERO))["balance"]
+
+def cash_flow(account: BankAccount, start, end):
+    """Money in, money out and posting count for an account in ``[start, end)``"""
+    return account.postings.filter(created_at__gte=start, created_at__lt=end).aggregate(
+        money_in=Coalesce(Sum("amount", filter=Q(amount__gt=0)), ZERO),
+        money_out=Coalesce(Sum("amount", filter=Q(amount__lt=0)), ZERO),
+        count=Count("id"),
+    )
+
+def statement_totals(account: BankAccount, start, end):
+    """Opening balance, closing balance and posting count for a statement period"""
+    totals = account.postings.aggregate(
+        opening_balance=Coalesce(Sum("amount", filter=Q(created_at__lt=start)), ZERO),
+        movement=Coalesce(Sum("amount", filter=Q(created_at__gte=start, created_at__lt=end)), ZERO),
+        count=Count("id", filter=Q(created_at__gte=start, created_at__lt=end)),
+    )
+    totals["closing_balance"] = totals["opening_balance"] + totals.pop("movement")
+    return totals
@@ -1,3 +1,499 @@
-from django.test import TestCase
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import caches
+from django.core.management import call_command
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.db.models import F, Sum
+from django.utils import timezone
+from datetime import date, datetime, time, timedelta
+from io import StringIO
+from unittest import mock, skipUnless
+import importlib
+import os
+import tempfile
+from decimal import Decimal
+from . import analytics, archive, feeds, fraud, fx, history, interest, pins, scheduling, seeding, services
+from .admin import EstimatedCountPaginator
+from .ratelimit import SlidingWindow
+from .models import (
+    BankAccount, DailyActivity, BillPayment, InterestAccrual, JournalEntry, Loan, Notification, Posting, Receipt, ScheduledTransfer, Transaction, User,
+    generate_uuid7,
+)
 
-# Create your tests here.
+
+def make_account(email, currency="USD", balance=Decimal("0.00")):
+    user = User.objects.create_user(email=email, password="password")
+    account, _ = BankAccount.objects.get_or_create(user=user)
+    account.currency, account.balance = currency, balance
+    account.save()
+    return account
+
+
+class CrossCurrencyFraudProfileTests(TestCase):
+    def setUp(self):
+        fx.reset()
+        fraud.profiles.clear()
+        self.sender = make_account("sender@example.com", "USD", Decimal("1000.00"))
+        self.receiver = make_account("receiver@example.com", "EUR", Decimal("0.00"))
+
+    def tearDown(self):
+        fraud.profiles.clear()
+
+    def test_profile_reload_after_cross_currency_transfer(self):
+        services.transfer(self.sender, self.receiver, Decimal("100.00"))
+        # A new worker, or an expired profile, loads the history from the ledger
+        fraud.profiles.clear()
+        services.transfer(self.sender, self.receiver, Decimal("50.00"))
+        self.sender.refresh_from_db()
+        self.assertEqual(self.sender.balance, Decimal("850.00"))
+
+    def test_fx_legs_are_not_payees(self):
+        services.transfer(self.sender, self.receiver, Decimal("100.00"))
+        profile = fraud.AccountProfile.load(self.sender.pk, 0)
+        self.assertEqual(profile.payees, {self.receiver.pk.int})
+
+
+class SlidingWindowTests(SimpleTestCase):
+    limits = {"amount_per_hour": Decimal("1000")}
+
+    def test_rejects_amounts_that_would_lower_the_hourly_sum(self):
+        window = SlidingWindow()
+        for amount in (Decimal("-1000000"), Decimal("0"), Decimal("NaN"), Decimal("-Infinity")):
+            with self.assertRaises(ValueError):
+                window.check_and_record("account", amount, self.limits, now=0)
+        self.assertIsNotNone(window.check_and_record("account", Decimal("900000"), self.limits, now=0))
+
+    def test_hourly_limit(self):
+        window = SlidingWindow()
+        self.assertIsNone(window.check_and_record("account", Decimal("600"), self.limits, now=0))
+        self.assertIsNotNone(window.check_and_record("account", Decimal("600"), self.limits, now=1))
+        self.assertIsNone(window.check_and_record("account", Decimal("600"), self.limits, now=3601))
+
+
+class ArchivedReceiptTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email="archived@example.com", password="password")
+        created_at = timezone.make_aware(datetime(2025, 3, 14, 12, 0))
+        self.receipt = Receipt.objects.create(
+            user=self.user,
+            transaction_type="deposit",
+            reference_number="DEP-ARCHIVED-1",
+            amount=Decimal("25.00"),
+            description="Old deposit",
+            id=generate_uuid7(created_at),
+        )
+        Receipt.objects.filter(pk=self.receipt.pk).update(created_at=created_at)
+        archive.archive_receipts(date(2025, 3, 1))
+        self.client.force_login(self.user)
+
+    def test_receipt_view_opens_archived_receipt(self):
+        self.assertFalse(Receipt.objects.filter(pk=self.receipt.pk).exists())
+        response = self.client.get(reverse("receipt_view", args=[self.receipt.id]))
+        self.assertContains(response, "DEP-ARCHIVED-1")
+
+    def test_receipts_list_opens_only_the_requested_month(self):
+        response = self.client.get(reverse("receipts_list"))
+        self.assertNotContains(response, "DEP-ARCHIVED-1")
+        self.assertContains(response, "?period=2025-03")
+        response = self.client.get(reverse("receipts_list"), {"period": "2025-03"})
+        self.assertContains(response, "DEP-ARCHIVED-1")
+
+    def test_download_includes_archived_receipts(self):
+        response = self.client.get(reverse("download_receipts"), {"start_date": "2025-03-01", "end_date": "2025-03-31"})
+        self.assertIn(b"DEP-ARCHIVED-1.html", b"".join(response.streaming_content))
+
+
+class LongDescriptionTests(TestCase):
+    def setUp(self):
+        fx.reset()
+        fraud.profiles.clear()
+        self.sender = make_account("long-sender@example.com", "USD", Decimal("100.00"))
+        self.receiver = make_account("long-receiver@example.com", "EUR", Decimal("0.00"))
+
+    def test_composed_descriptions_fit_the_column(self):
+        description = "x" * 255
+        services.transfer(self.sender, self.receiver, Decimal("10.00"), description)
+        with services.db_transaction.atomic():
+            accounts = services.lock_accounts([self.sender.pk, self.receiver.pk])
+            batch = services.LedgerBatch()
+            batch.transfer(accounts[self.sender.pk], accounts[self.receiver.pk], Decimal("10.00"), description)
+            batch.flush()
+        lengths = {len(text) for text in Transaction.objects.values_list("description", flat=True)}
+        self.assertEqual(lengths, {services.DESCRIPTION_LENGTH})
+
+
+class StaleBalanceTests(TestCase):
+    def setUp(self):
+        fx.reset()
+        fraud.profiles.clear()
+        self.account = make_account("stale@example.com", "USD", Decimal("100.00"))
+        self.other = make_account("stale-other@example.com", "USD", Decimal("0.00"))
+        # A batch writer adds to the balance behind the loaded objects' backs
+        BankAccount.objects.filter(pk=self.account.pk).update(balance=F("balance") + Decimal("50.00"))
+
+    def test_movements_keep_concurrent_increments(self):
+        services.deposit(self.account, Decimal("10.00"))
+        self.assertEqual(self.account.balance, Decimal("160.00"))
+        services.withdraw(self.account, Decimal("5.00"))
+        services.transfer(self.account, self.other, Decimal("15.00"))
+        self.account.refresh_from_db()
+        self.assertEqual(self.account.balance, Decimal("140.00"))
+
+    def test_balance_is_checked_against_the_locked_row(self):
+        BankAccount.objects.filter(pk=self.account.pk).update(balance=Decimal("1.00"))
+        with self.assertRaisesMessage(ValueError, "Insufficient balance"):
+            services.withdraw(self.account, Decimal("20.00"))
+        with self.assertRaisesMessage(ValueError, "Insufficient balance"):
+            services.transfer(self.account, self.other, Decimal("20.00"))
+        self.assertEqual(BankAccount.objects.get(pk=self.account.pk).balance, Decimal("1.00"))
+
+
+class ScheduledTransferRunTests(TestCase):
+    def setUp(self):
+        fx.reset()
+        fraud.profiles.clear()
+        self.sender = make_account("order-sender@example.com", "USD", Decimal("100.00"))
+        self.receiver = make_account("order-receiver@example.com", "USD", Decimal("0.00"))
+        self.now = timezone.now()
+
+    def order(self, amount, **fields):
+        order = ScheduledTransfer(
+            from_account=self.sender, to_account=self.receiver, amount=amount,
+            frequency="WEEKLY", start_at=self.now - timedelta(days=1), **fields,
+        )
+        scheduling.schedule(order)
+        order.save()
+        return order
+
+    def test_due_orders_are_paid_once_and_advanced(self):
+        order = self.order(Decimal("30.00"))
+        self.assertEqual(scheduling.run_due_transfers(self.now), {"paid": 1, "failed": 0, "completed": 0})
+        # Nothing is due until the next occurrence
+        self.assertEqual(scheduling.run_due_transfers(self.now), {"paid": 0, "failed": 0, "completed": 0})
+        order.refresh_from_db()
+        self.assertEqual((order.runs, order.occurrence, order.next_run_at), (1, 1, order.start_at + timedelta(weeks=1)))
+        self.sender.refresh_from_db()
+        self.receiver.refresh_from_db()
+        self.assertEqual((self.sender.balance, self.receiver.balance), (Decimal("70.00"), Decimal("30.00")))
+
+    def test_unpaid_orders_skip_the_occurrence(self):
+        order = self.order(Decimal("500.00"))
+        self.assertEqual(scheduling.run_due_transfers(self.now)["failed"], 1)
+        order.refresh_from_db()
+        self.assertEqual((order.runs, order.failures, order.last_error), (0, 1, "Insufficient balance"))
+        self.assertGreater(order.next_run_at, self.now)
+        self.assertTrue(Notification.objects.filter(user=self.sender.user, title="Standing Order Failed").exists())
+        self.assertEqual(BankAccount.objects.get(pk=self.sender.pk).balance, Decimal("100.00"))
+
+    def test_orders_claimed_by_another_run_are_skipped(self):
+        self.order(Decimal("30.00"))
+        with mock.patch.object(ScheduledTransfer.objects, "select_for_update", wraps=ScheduledTransfer.objects.select_for_update) as claim:
+            scheduling.run_due_transfers(self.now)
+        claim.assert_called_with(skip_locked=True)
+
+
+class ScheduledTransferViewTests(TestCase):
+    def setUp(self):
+        self.sender = make_account("order-view@example.com", "USD", Decimal("100.00"))
+        self.receiver = make_account("order-view-receiver@example.com", "USD", Decimal("0.00"))
+        self.client.force_login(self.sender.user)
+
+    def create(self, account_number):
+        return self.client.post(reverse("scheduled_transfers"), {
+            "recipient_account_number": account_number,
+            "amount": "10.00",
+            "frequency": "MONTHLY",
+            "start_date": timezone.localdate().isoformat(),
+        })
+
+    def test_rejects_inactive_and_own_accounts(self):
+        BankAccount.objects.filter(pk=self.receiver.pk).update(is_active=False)
+        self.assertContains(self.create(self.receiver.account_number), "Recipient account is not active")
+        self.assertContains(self.create(self.sender.account_number), "your own account")
+        self.assertFalse(ScheduledTransfer.objects.exists())
+
+    def test_cancel_only_touches_active_orders(self):
+        self.create(self.receiver.account_number)
+        order = ScheduledTransfer.objects.get()
+        ScheduledTransfer.objects.filter(pk=order.pk).update(status="COMPLETED")
+        self.client.post(reverse("cancel_scheduled_transfer", args=[order.pk]))
+        self.assertEqual(ScheduledTransfer.objects.get().status, "COMPLETED")
+        ScheduledTransfer.objects.filter(pk=order.pk).update(status="ACTIVE")
+        self.client.post(reverse("cancel_scheduled_transfer", args=[order.pk]))
+        order.refresh_from_db()
+        self.assertEqual((order.status, order.next_run_at), ("CANCELLED", None))
+
+
+class LedgerBatchTests(TestCase):
+    def setUp(self):
+        fx.reset()
+        self.sender = make_account("batch-sender@example.com", "USD", Decimal("100.00"))
+        self.receiver = make_account("batch-receiver@example.com", "USD", Decimal("0.00"))
+
+    def test_flush_writes_balanced_entries_and_adds_to_balances(self):
+        with services.db_transaction.atomic():
+            accounts = services.lock_accounts([self.sender.pk, self.receiver.pk])
+            batch = services.LedgerBatch()
+            for _ in range(3):
+                batch.transfer(accounts[self.sender.pk], accounts[self.receiver.pk], Decimal("10.00"), "Batched")
+            batch.post("DEPOSIT", "Cash in", [(accounts[self.receiver.pk], "", Decimal("5.00")), (None, "CASH", Decimal("-5.00"))])
+            # Written in SQL as balance + change, so increments made meanwhile are kept
+            BankAccount.objects.filter(pk=self.sender.pk).update(balance=F("balance") + Decimal("1.00"))
+            batch.flush()
+        self.assertEqual(JournalEntry.objects.count(), 4)
+        for entry in JournalEntry.objects.annotate(total=Sum("postings__amount")):
+            self.assertEqual(entry.total, 0)
+        self.sender.refresh_from_db()
+        self.receiver.refresh_from_db()
+        self.assertEqual((self.sender.balance, self.receiver.balance), (Decimal("71.00"), Decimal("35.00")))
+        self.assertEqual(services.ledger_balance(self.receiver), self.receiver.balance)
+        self.assertEqual(DailyActivity.objects.get(account=self.receiver, category="TRANSFER_IN").count, 3)
+
+    def test_unbalanced_entry_rolls_back_the_batch(self):
+        with self.assertRaisesMessage(ValueError, "Journal entry does not balance"):
+            with services.db_transaction.atomic():
+                accounts = services.lock_accounts([self.sender.pk, self.receiver.pk])
+                batch = services.LedgerBatch()
+                batch.transfer(accounts[self.sender.pk], accounts[self.receiver.pk], Decimal("10.00"))
+                batch.flush()
+                batch.post("DEPOSIT", "Unbalanced", [(accounts[self.receiver.pk], "", Decimal("5.00"))])
+        self.assertFalse(JournalEntry.objects.exists())
+        self.assertFalse(Transaction.objects.exists())
+        self.assertEqual(BankAccount.objects.get(pk=self.sender.pk).balance, Decimal("100.00"))
+
+    def test_increment_fields_across_batches(self):
+        analytics.increment_fields(BankAccount, {
+            self.sender.pk: {"balance": Decimal("-0.01")}, self.receiver.pk: {"balance": Decimal("2.50")},
+        }, batch_size=1)
+        balances = dict(BankAccount.objects.filter(pk__in=[self.sender.pk, self.receiver.pk]).values_list("pk", "balance"))
+        self.assertEqual(balances, {self.sender.pk: Decimal("99.99"), self.receiver.pk: Decimal("2.50")})
+
+
+class LoanDisbursalTests(TestCase):
+    def setUp(self):
+        self.account = make_account("borrower@example.com", "USD", Decimal("10.00"))
+        self.loan = Loan.objects.create(
+            user=self.account.user, loan_type=Loan.LOAN_TYPES[0][0], loan_amount=Decimal("1000.00"),
+            interest_rate=Decimal("5.00"), loan_term_months=12, status="APPROVED", purpose="Test",
+        )
+
+    def test_disburses_approved_loans_once(self):
+        disbursed, errors = services.disburse_loans([self.loan.pk])
+        self.assertEqual(([loan.pk for loan in disbursed], errors), ([self.loan.pk], {}))
+        self.loan.refresh_from_db()
+        self.assertEqual((self.loan.status, self.loan.disbursed_amount), ("ACTIVE", Decimal("1000.00")))
+        self.assertEqual(BankAccount.objects.get(pk=self.account.pk).balance, Decimal("1010.00"))
+        entry = JournalEntry.objects.get(entry_type="LOAN_DISBURSAL")
+        self.assertEqual(sorted(entry.postings.values_list("external_account", "amount")), [("", Decimal("1000.00")), ("LOANS", Decimal("-1000.00"))])
+        self.assertTrue(Receipt.objects.filter(user=self.account.user, transaction_type="loan_disbursal").exists())
+        # The loan is no longer APPROVED once its row lock is released
+        disbursed, errors = services.disburse_loans([self.loan.pk])
+        self.assertEqual((disbursed, errors), ([], {self.loan.pk: "Only approved loans can be disbursed"}))
+        self.assertEqual(BankAccount.objects.get(pk=self.account.pk).balance, Decimal("1010.00"))
+
+    def test_inactive_account_is_not_paid(self):
+        BankAccount.objects.filter(pk=self.account.pk).update(is_active=False)
+        disbursed, errors = services.disburse_loans([self.loan.pk])
+        self.assertEqual((disbursed, errors), ([], {self.loan.pk: "Bank account is not active"}))
+        self.assertEqual(Loan.objects.get(pk=self.loan.pk).status, "APPROVED")
+
+
+class HistoryWithoutRollupsTests(TestCase):
+    def setUp(self):
+        self.account = make_account("history@example.com")
+        services.deposit(self.account, Decimal("100.00"), "First")
+        services.withdraw(self.account, Decimal("40.00"), "Second")
+
+    def test_totals_and_balances_without_rollups(self):
+        with_rollups = history.totals(self.account)
+        DailyActivity.objects.filter(account=self.account).delete()
+        self.assertEqual(history.totals(self.account), with_rollups)
+        self.assertEqual(with_rollups["count"], 2)
+        self.assertEqual(with_rollups["net"], Decimal("60.00"))
+        postings, _ = history.page(self.account, end=timezone.localdate())
+        self.assertEqual([posting.balance for posting in postings], [Decimal("60.00"), Decimal("100.00")])
+
+
+@override_settings(PIN_PEPPER="pepper", PIN_PEPPER_FALLBACKS=[], PIN_MAX_ATTEMPTS=3, PIN_HASH_ITERATIONS=10)
+class PinTests(TestCase):
+    def setUp(self):
+        caches[settings.RATE_LIMIT_CACHE].clear()
+        self.user = User.objects.create_user(email="pin@example.com", password="password")
+        pins.set_pin(self.user, "1234")
+
+    def test_wrong_pins_lock_the_pin(self):
+        self.assertFalse(pins.check_pin(self.user, "0000"))
+        self.assertTrue(pins.check_pin(self.user, "1234"))
+        for _ in range(3):
+            self.assertFalse(pins.check_pin(self.user, "0000"))
+        with self.assertRaises(pins.PinLocked):
+            pins.check_pin(self.user, "1234")
+        self.assertEqual(Notification.objects.filter(user=self.user, title="PIN Locked").count(), 1)
+        pins.set_pin(self.user, "5678")
+        self.assertTrue(pins.check_pin(self.user, "5678"))
+
+    def test_pins_survive_a_new_pepper(self):
+        with override_settings(PIN_PEPPER=""):
+            pins.set_pin(self.user, "1234")
+        # SECRET_KEY was the pepper while PIN_PEPPER was unset
+        self.assertTrue(pins.check_pin(self.user, "1234"))
+        self.assertEqual(self.user.pin.split("$")[2], pins.pepper_id("pepper"))
+        with override_settings(PIN_PEPPER="rotated"):
+            self.assertFalse(pins.check_pin(self.user, "1234"))
+        with override_settings(PIN_PEPPER="rotated", PIN_PEPPER_FALLBACKS=["pepper"]):
+            self.assertTrue(pins.check_pin(self.user, "1234"))
+        self.assertEqual(User.objects.get(pk=self.user.pk).pin.split("$")[2], pins.pepper_id("rotated"))
+
+    def test_migration_hashes_plaintext_pins(self):
+        other = User.objects.create_user(email="no-pin@example.com", password="password")
+        User.objects.filter(pk=self.user.pk).update(pin="4321")
+        User.objects.filter(pk=other.pk).update(pin="12")
+        importlib.import_module("core.migrations.0019_hash_pins").hash_pins(apps, None)
+        self.assertEqual(User.objects.get(pk=other.pk).pin, "")
+        self.assertTrue(pins.check_pin(User.objects.get(pk=self.user.pk), "4321"))
+
+
+@skipUnless(connection.vendor == "sqlite", "max(rowid) estimates are SQLite's")
+class EstimatedCountPaginatorTests(TestCase):
+    def setUp(self):
+        user = User.objects.create_user(email="paginator@example.com", password="password")
+        Notification.objects.bulk_create([Notification(user=user, title=f"N{number}", message="") for number in range(10)])
+        # Archiving leaves gaps in the rowids
+        ids = list(Notification.objects.order_by("id").values_list("id", flat=True))
+        Notification.objects.filter(id__in=ids[2:8]).delete()
+        self.notifications = Notification.objects.order_by("id")
+
+    def test_overestimate_falls_back_to_the_last_page_with_rows(self):
+        paginator = EstimatedCountPaginator(self.notifications, 2)
+        paginator.exact_limit = paginator.estimate_threshold = 0
+        self.assertEqual(paginator.num_pages, 5)
+        page = paginator.page(5)
+        self.assertEqual((page.number, paginator.count, [notification.title for notification in page]), (2, 4, ["N8", "N9"]))
+
+    def test_small_tables_are_counted_exactly(self):
+        paginator = EstimatedCountPaginator(self.notifications, 2)
+        paginator.exact_limit = 0
+        self.assertEqual(paginator.count, 4)
+
+
+class SeedingTests(TestCase):
+    def seed(self):
+        with services.db_transaction.atomic():
+            seeding.seed_bank(users=4, transactions_per_account=6, notifications_per_user=2, loan_probability=0.5,
+                              days=30, seed=7, chunk_size=2, now=timezone.make_aware(datetime(2026, 1, 1)))
+            rows = {
+                model.__name__: sorted(model.objects.values_list(*fields))
+                for model, fields in (
+                    (User, ("id", "email", "password", "pin", "date_joined")),
+                    (BankAccount, ("id", "account_number", "balance", "created_at")),
+                    (Receipt, ("id", "reference_number", "amount", "created_at")),
+                    (Transaction, ("id", "amount", "timestamp")),
+                    (JournalEntry, ("id", "created_at")),
+                    (Loan, ("id", "loan_amount", "created_at", "updated_at")),
+                    (BillPayment, ("id", "amount", "created_at", "updated_at")),
+                )
+            }
+            services.db_transaction.set_rollback(True)
+        return rows
+
+    def test_same_seed_same_bank(self):
+        first = self.seed()
+        self.assertTrue(first["Receipt"])
+        self.assertEqual(self.seed(), first)
+
+
+class RollupBackfillTests(TestCase):
+    def setUp(self):
+        self.account = make_account("rollup@example.com")
+        services.deposit(self.account, Decimal("100.00"), "Old")
+        # History written before the rollups existed
+        self.old_day = timezone.localdate() - timedelta(days=10)
+        old = timezone.now() - timedelta(days=10)
+        JournalEntry.objects.update(created_at=old)
+        Posting.objects.update(created_at=old)
+        DailyActivity.objects.all().delete()
+        services.deposit(self.account, Decimal("20.00"), "New")
+
+    def test_default_run_backfills_days_without_rollups(self):
+        call_command("rollup_activity", stdout=StringIO())
+        rows = dict(DailyActivity.objects.filter(account=self.account, category="DEPOSIT").values_list("day", "money_in"))
+        self.assertEqual(rows, {self.old_day: Decimal("100.00"), timezone.localdate(): Decimal("20.00")})
+
+
+class FeedImportTests(TestCase):
+    def setUp(self):
+        fx.reset()
+        self.account = make_account("feed@example.com")
+        handle, self.path = tempfile.mkstemp(suffix=".csv")
+        self.addCleanup(os.remove, self.path)
+        with os.fdopen(handle, "w") as feed:
+            feed.write("reference,account_number,amount\n")
+            feed.write(f"R1,{self.account.account_number},10.00\n")
+            feed.write("R2,0000000000,5.00\n")
+            feed.write(f"R3,{self.account.account_number},2.50\n")
+
+    def test_rejects_are_reported_once_the_chunk_commits(self):
+        rejected = []
+        with self.captureOnCommitCallbacks() as callbacks:
+            feed = feeds.import_feed(self.path, "test", rejects=lambda row, reason: rejected.append(row["reference"]))
+        self.assertEqual(rejected, [])
+        for callback in callbacks:
+            callback()
+        self.assertEqual(rejected, ["R2"])
+        self.assertEqual((feed.posted, feed.rejected), (2, 1))
+        self.account.refresh_from_db()
+        self.assertEqual(self.account.balance, Decimal("12.50"))
+
+    def test_failed_chunk_reports_no_rejects(self):
+        rejected = []
+        with mock.patch.object(feeds.LedgerBatch, "flush", side_effect=RuntimeError("database went away")):
+            with self.captureOnCommitCallbacks(execute=True), self.assertRaises(RuntimeError):
+                feeds.import_feed(self.path, "test", rejects=lambda row, reason: rejected.append(row["reference"]))
+        self.assertEqual(rejected, [])
+
+
+@override_settings(SAVINGS_INTEREST_RATE=Decimal("1.825"), INTEREST_DAY_COUNT=365)
+class InterestTests(TestCase):
+    def setUp(self):
+        self.account = make_account("interest@example.com", balance=Decimal("0.10"))
+        self.account.account_type = "SAVINGS"
+        self.account.save()
+        self.day = timezone.localdate()
+
+    def test_accruals_round_like_decimals(self):
+        # 0.15 * 0.00005 is 0.0000075 exactly, a tie binary floats round down
+        BankAccount.objects.filter(pk=self.account.pk).update(balance=Decimal("0.15"))
+        interest.accrue(self.day)
+        self.assertEqual(InterestAccrual.objects.get(account=self.account).amount, Decimal("0.000008"))
+
+    def test_sub_cent_totals_carry_into_the_next_month(self):
+        interest.accrue(self.day)
+        self.assertEqual(InterestAccrual.objects.get(account=self.account).amount, Decimal("0.000005"))
+        self.assertEqual(interest.credit(self.day), (0, Decimal("0")))
+        self.assertFalse(InterestAccrual.objects.get(account=self.account).credited)
+        InterestAccrual.objects.filter(account=self.account).update(amount=Decimal("0.004"))
+        InterestAccrual.objects.create(account=self.account, day=self.day + timedelta(days=31), average_balance=Decimal("0.10"), amount=Decimal("0.002"))
+        self.assertEqual(interest.credit(self.day + timedelta(days=31)), (1, Decimal("0.01")))
+        self.assertFalse(InterestAccrual.objects.filter(account=self.account, credited=False).exists())
+
+
+class ReceiptETagTests(TestCase):
+    def setUp(self):
+        from web.views import receipt_template_version
+        self.addCleanup(receipt_template_version.cache_clear)
+        self.user = User.objects.create_user(email="etag@example.com", password="password")
+        self.receipt = services.generate_receipt(self.user, "deposit", Decimal("5.00"), "Deposit")
+        self.client.force_login(self.user)
+
+    def etag(self):
+        from web.views import receipt_template_version
+        receipt_template_version.cache_clear()
+        return self.client.get(reverse("receipt_view", args=[self.receipt.id]))["ETag"]
+
+    def test_etag_changes_with_the_cache_version(self):
+        with override_settings(RECEIPT_CACHE_VERSION="1"):
+            first = self.etag()
+        with override_settings(RECEIPT_CACHE_VERSION="2"):
+            self.assertNotEqual(self.etag(), first)
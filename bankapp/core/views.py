@@ -1,3 +1,17 @@
-from django.shortcuts import render
+from django.conf import settings
+from django.http import HttpResponse
+from django.utils.crypto import constant_time_compare
+from .metrics import render_prometheus
 
-# Create your views here.
+
+def metrics(request):
+    """Prometheus text exposition of this worker's request metrics"""
+    token = getattr(settings, "METRICS_TOKEN", "")
+    authorization = request.headers.get("Authorization", "")
+    if token:
+        allowed = constant_time_compare(authorization, f"Bearer {token}")
+    else:
+        allowed = request.user.is_authenticated and request.user.is_staff
+    if not allowed:
+        return HttpResponse("Forbidden", status=403, content_type="text/plain")
+    return HttpResponse(render_prometheus(), content_type="text/plain; version=0.0.4; charset=utf-8")
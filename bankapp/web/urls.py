@@ -7,8 +7,11 @@ urlpatterns = [
     path('deposit/', views.deposit_view, name='deposit'),
     path('withdraw/', views.withdraw_view, name='withdraw'),
     path('transfer/', views.transfer_view, name='transfer'),
+    path('transfer/scheduled/', views.scheduled_transfers, name='scheduled_transfers'),
+    path('transfer/scheduled/<uuid:order_id>/cancel/', views.cancel_scheduled_transfer, name='cancel_scheduled_transfer'),
     path('profile/', views.profile_view, name='profile'),
     path('profile/edit/', views.edit_profile_view, name='edit_profile'),
+    path('profile/pin/', views.change_pin_view, name='change_pin'),
     path('login/', views.login_view, name='login'),
     path('signup/', views.signup_view, name='signup'),
     path('logout/', views.logout_view, name='logout'),
@@ -34,5 +37,10 @@ urlpatterns = [
     # Receipt URLs
     path('receipt/<uuid:receipt_id>/', views.receipt_view, name='receipt_view'),
     path('receipts/', views.receipts_list, name='receipts_list'),
+    path('receipts/download/', views.download_receipts, name='download_receipts'),
+
+    # History
+    path('history/', views.transaction_history, name='transaction_history'),
+    path('history/search/', views.search_history, name='search_history'),
 ]
 
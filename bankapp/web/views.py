@@ -2,10 +2,28 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.decorators import login_required
 from django.utils import timezone
-from django.http import JsonResponse
-from core.models import BankAccount, User, ProfileUpdate, Notification, DebitCard, CardApplication, Loan, BankStatement, BillPayment, Review, Receipt
-from core.services import deposit, withdraw, transfer, generate_receipt
+from django.http import Http404, JsonResponse, HttpResponse, StreamingHttpResponse
+from django.core.paginator import Paginator
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import get_template, render_to_string
+from django.utils.cache import get_conditional_response, patch_cache_control
+from core.models import BankAccount, JournalEntry, User, ProfileUpdate, Notification, DebitCard, CardApplication, Loan, BankStatement, BillPayment, Review, Receipt, Transaction, ScheduledTransfer
+from core.services import deposit, withdraw, transfer, generate_receipt, statement_totals
+from core.archive import get_recent_transactions, get_archived_receipts, get_receipt_archive_periods, find_archived_receipt, iter_receipts
+from core import history
+from core.analytics import spending_insights
+from core.routers import replica_reads, use_replica
+from core.search import search, parse_amount, parse_date
+from core.scheduling import schedule
+from core.ratelimit import rate_limit, check_velocity, VelocityLimitExceeded
+from core.pins import check_pin, set_pin, is_valid_pin, PinLocked
+from datetime import datetime, time, timedelta
+from urllib.parse import urlencode
 from decimal import Decimal
+import functools
+import hashlib
+import zipfile
 
 
 def home(request):
@@ -46,6 +64,7 @@ def get_or_create_account(user):
     account, created = BankAccount.objects.get_or_create(user=user)
     return account
 
+@rate_limit("login")
 def login_view(request):
     if request.method == "POST":
         email = request.POST.get("username")
@@ -115,11 +134,13 @@ def signup_view(request):
     return render(request, "web/signup.html")
 
 @login_required
+@replica_reads
 def dashboard(request):
     account = get_or_create_account(request.user)
-    recent_transactions = account.transactions.all().order_by('-timestamp')[:10]
+    recent_transactions = get_recent_transactions(account)
     unread_notifications = Notification.objects.filter(user=request.user, is_read=False)
     debit_card = DebitCard.objects.filter(user=request.user).first()
+    insights = spending_insights(account)
     
     # Auto-mark notifications as read when dashboard is viewed
     # (but still show them for this page load)
@@ -131,6 +152,7 @@ def dashboard(request):
         "recent_transactions": recent_transactions,
         "unread_notifications": unread_notifications,
         "debit_card": debit_card,
+        "insights": insights,
     })
 
 @login_required
@@ -163,11 +185,15 @@ def deposit_view(request):
     return render(request, "web/deposit.html", {"account": account})
 
 @login_required
+@rate_limit("withdraw")
 def withdraw_view(request):
     account = get_or_create_account(request.user)
     if request.method == "POST":
         try:
             amount = Decimal(request.POST.get("amount"))
+            if not amount.is_finite() or amount <= 0:
+                raise ValueError("Amount must be greater than 0")
+            check_velocity(account, amount)
             txn = withdraw(account, amount, "Web withdrawal")
             
             # Generate receipt
@@ -191,12 +217,15 @@ def withdraw_view(request):
     return render(request, "web/withdraw.html", {"account": account})
 
 @login_required
+@rate_limit("transfer")
 def transfer_view(request):
     account = get_or_create_account(request.user)
     if request.method == "POST":
         try:
             recipient_account_number = request.POST.get("recipient_account_number", "").strip()
             amount = Decimal(request.POST.get("amount"))
+            if not amount.is_finite() or amount <= 0:
+                raise ValueError("Amount must be greater than 0")
             
             # Validate account number
             if not recipient_account_number:
@@ -213,6 +242,7 @@ def transfer_view(request):
             if not receiver_account.is_active:
                 raise ValueError("Recipient account is not active")
             
+            check_velocity(account, amount)
             txn = transfer(account, receiver_account, amount, "Web transfer")
             
             # Generate receipt
@@ -284,6 +314,39 @@ def edit_profile_view(request):
     return render(request, "web/edit_profile.html", context)
 
 
+@login_required
+@rate_limit("change_pin")
+def change_pin_view(request):
+    """Set or change the security PIN, confirmed with the account password"""
+    if request.method == "POST":
+        password = request.POST.get("password", "")
+        new_pin = request.POST.get("new_pin", "").strip()
+        confirm_pin = request.POST.get("confirm_pin", "").strip()
+        
+        errors = []
+        
+        if not request.user.check_password(password):
+            errors.append("Incorrect password")
+        
+        if not is_valid_pin(new_pin):
+            errors.append("PIN must be exactly 4 digits")
+        elif new_pin != confirm_pin:
+            errors.append("PINs do not match")
+        
+        if errors:
+            return render(request, "web/change_pin.html", {"errors": errors})
+        
+        set_pin(request.user, new_pin)
+        Notification.objects.create(
+            user=request.user,
+            title="Security PIN Changed",
+            message="Your security PIN was changed. If this wasn't you, please contact us right away.",
+            notification_type="SECURITY",
+        )
+        return render(request, "web/change_pin.html", {"success": True})
+    
+    return render(request, "web/change_pin.html")
+
 @login_required
 def mark_notification_as_read(request, notification_id):
     """API endpoint to mark a notification as read"""
@@ -371,6 +434,7 @@ def view_debit_card(request):
 
 
 @login_required
+@replica_reads
 def notifications_list(request):
     """View all notifications history"""
     notifications = Notification.objects.filter(user=request.user).order_by('-created_at')
@@ -510,6 +574,7 @@ def apply_for_loan(request):
 
 
 @login_required
+@replica_reads
 def loan_applications_list(request):
     """List all loan applications for the user"""
     loans = Loan.objects.filter(user=request.user).order_by('-created_at')
@@ -547,7 +612,6 @@ def request_bank_statement(request):
         errors = []
         
         try:
-            from datetime import datetime
             start = datetime.strptime(start_date, "%Y-%m-%d").date()
             end = datetime.strptime(end_date, "%Y-%m-%d").date()
             
@@ -564,22 +628,14 @@ def request_bank_statement(request):
         if errors:
             return render(request, "web/request_bank_statement.html", {"errors": errors})
         
-        # Get transactions in the date range
+        # Opening and closing balances come straight from the journal, on the replica if there is one
         account = get_or_create_account(request.user)
-        transactions = account.transactions.filter(
-            timestamp__date__gte=start,
-            timestamp__date__lte=end
-        ).order_by('timestamp')
-        
-        # Calculate opening and closing balance
-        opening_balance = account.balance
-        for txn in transactions.reverse():
-            if txn.transaction_type == "DEPOSIT":
-                opening_balance -= txn.amount
-            elif txn.transaction_type == "WITHDRAW":
-                opening_balance += txn.amount
-        
-        closing_balance = account.balance
+        with use_replica():
+            totals = statement_totals(
+                account,
+                timezone.make_aware(datetime.combine(start, time.min)),
+                timezone.make_aware(datetime.combine(end + timedelta(days=1), time.min)),
+            )
         
         # Create bank statement request
         statement = BankStatement.objects.create(
@@ -588,9 +644,9 @@ def request_bank_statement(request):
             end_date=end,
             format_type=format_type,
             status="GENERATED",
-            transaction_count=transactions.count(),
-            opening_balance=opening_balance,
-            closing_balance=closing_balance,
+            transaction_count=totals["count"],
+            opening_balance=totals["opening_balance"],
+            closing_balance=totals["closing_balance"],
             generated_at=timezone.now()
         )
         
@@ -611,6 +667,7 @@ def request_bank_statement(request):
 
 
 @login_required
+@replica_reads
 def bank_statements_list(request):
     """List all bank statements for the user"""
     statements = BankStatement.objects.filter(user=request.user).order_by('-requested_at')
@@ -624,6 +681,7 @@ def bank_statements_list(request):
 # ==================== BILL PAYMENT VIEWS ====================
 
 @login_required
+@rate_limit("pay_bill")
 def pay_bill(request):
     """Pay a bill"""
     if request.method == "POST":
@@ -647,20 +705,32 @@ def pay_bill(request):
         
         try:
             amount = Decimal(amount)
-            if amount <= 0:
+            if not amount.is_finite() or amount <= 0:
                 errors.append("Amount must be greater than 0")
         except:
             errors.append("Invalid amount")
         
         # Verify PIN
-        if pin != request.user.pin:
-            errors.append("Invalid PIN")
+        if not request.user.pin:
+            errors.append("Please set up your security PIN before paying bills")
+        else:
+            try:
+                if not check_pin(request.user, pin):
+                    errors.append("Invalid PIN")
+            except PinLocked as e:
+                errors.append(str(e))
         
         # Check balance
         account = get_or_create_account(request.user)
         if account.balance < amount:
             errors.append("Insufficient balance")
         
+        if not errors:
+            try:
+                check_velocity(account, amount)
+            except VelocityLimitExceeded as e:
+                errors.append(str(e))
+        
         if errors:
             return render(request, "web/pay_bill.html", {
                 "errors": errors,
@@ -684,18 +754,8 @@ def pay_bill(request):
             paid_at=timezone.now()
         )
         
-        # Deduct from account
-        account.balance -= amount
-        account.save()
-        
-        # Create transaction record
-        from core.models import Transaction
-        Transaction.objects.create(
-            account=account,
-            amount=amount,
-            transaction_type="WITHDRAW",
-            description=f"Bill Payment - {provider_name} ({bill_type})",
-        )
+        # Deduct from account and record the ledger entries
+        withdraw(account, amount, f"Bill Payment - {provider_name} ({bill_type})", entry_type="BILL_PAYMENT", counterpart="BILLERS")
         
         Notification.objects.create(
             user=request.user,
@@ -716,6 +776,7 @@ def pay_bill(request):
 
 
 @login_required
+@replica_reads
 def bill_payments_list(request):
     """List all bill payments for the user"""
     payments = BillPayment.objects.filter(user=request.user).order_by('-created_at')
@@ -726,15 +787,274 @@ def bill_payments_list(request):
     return render(request, 'web/bill_payments.html', context)
 
 
+# Completed receipts never change, so browsers may keep them for a year
+RECEIPT_MAX_AGE = 60 * 60 * 24 * 365
+RECEIPT_CACHE_TIMEOUT = 60 * 60 * 24
+RECEIPT_EXPORT_CHUNK_SIZE = 500
+RECEIPTS_PER_PAGE = 50
+
+
+@functools.cache
+def receipt_template_version():
+    """Hash of the receipt template's source and RECEIPT_CACHE_VERSION, read once per process"""
+    source = get_template('web/receipt.html').template.source
+    return hashlib.sha256(f"{settings.RECEIPT_CACHE_VERSION}|{source}".encode()).hexdigest()[:12]
+
+
+def receipt_digest(receipt):
+    """Hash of everything the receipt template renders that could ever change"""
+    parts = [
+        # Browsers keep completed receipts for a year, so a new template must change the ETag
+        receipt_template_version(),
+        str(receipt.id),
+        receipt.status,
+        receipt.user.first_name,
+        receipt.user.last_name,
+        receipt.user.email,
+    ]
+    return hashlib.sha256("|".join(parts).encode()).hexdigest()[:32]
+
+
+def render_receipt_html(receipt, digest=None):
+    """Render a receipt, memoising the HTML of completed receipts"""
+    if receipt.status != 'completed':
+        return render_to_string('web/receipt.html', {'receipt': receipt})
+
+    cache_key = f"receipt-html:{receipt.id}:{digest or receipt_digest(receipt)}"
+    html = cache.get(cache_key)
+    if html is None:
+        html = render_to_string('web/receipt.html', {'receipt': receipt})
+        cache.set(cache_key, html, RECEIPT_CACHE_TIMEOUT)
+    return html
+
+
 @login_required
+@replica_reads
 def receipt_view(request, receipt_id):
     """Display transaction receipt"""
-    receipt = get_object_or_404(Receipt, id=receipt_id, user=request.user)
-    return render(request, 'web/receipt.html', {'receipt': receipt})
+    receipt = Receipt.objects.select_related('user').filter(id=receipt_id, user=request.user).first()
+    if receipt is None:
+        try:
+            period = parse_date(f"{request.GET['period']}-01") if request.GET.get('period') else None
+        except ValueError:
+            period = None
+        receipt = find_archived_receipt(request.user, receipt_id, period)
+        if receipt is None:
+            raise Http404("Receipt not found")
+    digest = receipt_digest(receipt)
+    etag = f'"{digest}"'
+
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = HttpResponse(render_receipt_html(receipt, digest))
+
+    response['ETag'] = etag
+    if receipt.status == 'completed':
+        patch_cache_control(response, private=True, max_age=RECEIPT_MAX_AGE, immutable=True)
+    else:
+        patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+class _ZipStreamBuffer:
+    """Write-only file object that hands back whatever zipfile wrote so far"""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def stream_receipts_zip(receipts):
+    """Yield a ZIP archive of rendered receipts one member at a time"""
+    buffer = _ZipStreamBuffer()
+    with zipfile.ZipFile(buffer, mode='w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for receipt in receipts:
+            archive.writestr(f"{receipt.reference_number}.html", render_receipt_html(receipt))
+            yield buffer.drain()
+    yield buffer.drain()
 
 
 @login_required
+def download_receipts(request):
+    """Download all receipts for a period as a streamed ZIP archive"""
+    try:
+        start = datetime.strptime(request.GET.get("start_date", ""), "%Y-%m-%d").date()
+        end = datetime.strptime(request.GET.get("end_date", ""), "%Y-%m-%d").date()
+    except ValueError:
+        return HttpResponse("Invalid date format", status=400)
+
+    if start > end:
+        return HttpResponse("Start date cannot be after end date", status=400)
+
+    receipts = iter_receipts(request.user, start, end, chunk_size=RECEIPT_EXPORT_CHUNK_SIZE)
+
+    response = StreamingHttpResponse(stream_receipts_zip(receipts), content_type='application/zip')
+    response['Content-Disposition'] = f'attachment; filename="receipts_{start}_{end}.zip"'
+    return response
+
+
+@login_required
+@replica_reads
 def receipts_list(request):
-    """List all receipts for user"""
-    receipts = Receipt.objects.filter(user=request.user).order_by('-created_at')
-    return render(request, 'web/receipts_list.html', {'receipts': receipts})
+    """List a user's receipts a page at a time, or one archived month of them"""
+    context = {'archive_periods': get_receipt_archive_periods(request.user)}
+    try:
+        period = parse_date(f"{request.GET['period']}-01") if request.GET.get('period') else None
+    except ValueError:
+        period = None
+    if period:
+        context.update({'period': period, 'receipts': get_archived_receipts(request.user, period)})
+    else:
+        receipts = Receipt.objects.filter(user=request.user).select_related('user').order_by('-created_at', '-id')
+        page = Paginator(receipts, RECEIPTS_PER_PAGE).get_page(request.GET.get('page'))
+        context.update({'page': page, 'receipts': page.object_list})
+    return render(request, 'web/receipts_list.html', context)
+
+
+# Rows shown per section of the history search page
+SEARCH_RESULTS_LIMIT = 50
+
+@login_required
+@replica_reads
+def search_history(request):
+    """Search the user's receipts, transactions and bill payments"""
+    params = {key: request.GET.get(key, "").strip() for key in ("q", "reference", "account", "min_amount", "max_amount", "start_date", "end_date")}
+    context = {"params": params}
+    if any(params.values()):
+        try:
+            criteria = {
+                "text": params["q"],
+                "reference": params["reference"],
+                "counterpart": params["account"],
+                "min_amount": parse_amount(params["min_amount"]),
+                "max_amount": parse_amount(params["max_amount"]),
+                "start": parse_date(params["start_date"]),
+                "end": parse_date(params["end_date"]),
+            }
+        except ValueError as e:
+            context["errors"] = [str(e)]
+        else:
+            context.update({
+                "searched": True,
+                "receipts": search(Receipt.objects.filter(user=request.user), **criteria)[:SEARCH_RESULTS_LIMIT],
+                "transactions": search(
+                    Transaction.objects.filter(account__user=request.user), **criteria
+                ).order_by("-timestamp")[:SEARCH_RESULTS_LIMIT],
+                "bill_payments": search(BillPayment.objects.filter(user=request.user), **criteria)[:SEARCH_RESULTS_LIMIT],
+                "limit": SEARCH_RESULTS_LIMIT,
+            })
+    return render(request, "web/search_history.html", context)
+
+
+@login_required
+@replica_reads
+def transaction_history(request):
+    """Full account history with filters, running balances and totals"""
+    account = BankAccount.objects.filter(user=request.user).first()
+    if account is None:
+        return redirect("dashboard")
+    params = {key: request.GET.get(key, "").strip() for key in ("type", "start_date", "end_date", "min_amount", "max_amount")}
+    context = {"account": account, "params": params, "types": JournalEntry.ENTRY_TYPES}
+    try:
+        if params["type"] and params["type"] not in dict(JournalEntry.ENTRY_TYPES):
+            raise ValueError(f"Invalid type: {params['type']}")
+        filters = {
+            "entry_type": params["type"],
+            "start": parse_date(params["start_date"]),
+            "end": parse_date(params["end_date"]),
+            "min_amount": parse_amount(params["min_amount"]),
+            "max_amount": parse_amount(params["max_amount"]),
+        }
+        totals = history.totals(account, **filters)
+        # Nothing matches anywhere, so don't walk the whole history to find out
+        postings, cursor = history.page(account, cursor=request.GET.get("cursor"), **filters) if totals["count"] else ([], None)
+    except ValueError as e:
+        context["errors"] = [str(e)]
+    else:
+        context.update({
+            "postings": postings,
+            "totals": totals,
+            "next_query": urlencode({**{key: value for key, value in params.items() if value}, "cursor": cursor}) if cursor else "",
+            "filter_query": urlencode({key: value for key, value in params.items() if value}),
+            "paged": bool(request.GET.get("cursor")),
+        })
+    return render(request, "web/transaction_history.html", context)
+
+
+@login_required
+def scheduled_transfers(request):
+    """List the user's standing orders and set up new ones"""
+    account = get_or_create_account(request.user)
+    context = {"frequencies": ScheduledTransfer.FREQUENCIES, "form": {}}
+    if request.method == "POST":
+        form = {key: request.POST.get(key, "").strip() for key in (
+            "recipient_account_number", "amount", "frequency", "start_date", "end_date", "description",
+        )}
+        context["form"] = form
+        errors = []
+        receiver_account = BankAccount.objects.filter(account_number=form["recipient_account_number"]).first()
+        if receiver_account is None:
+            errors.append("Account number not found")
+        elif receiver_account.user_id == request.user.id:
+            errors.append("You cannot set up a standing order to your own account")
+        elif not receiver_account.is_active:
+            errors.append("Recipient account is not active")
+        try:
+            amount = parse_amount(form["amount"])
+            if amount is None or amount <= 0:
+                errors.append("Amount must be greater than 0")
+        except ValueError as e:
+            errors.append(str(e))
+        if form["frequency"] not in dict(ScheduledTransfer.FREQUENCIES):
+            errors.append("Invalid frequency")
+        try:
+            start_date = parse_date(form["start_date"])
+            end_date = parse_date(form["end_date"])
+            if start_date is None or start_date < timezone.localdate():
+                errors.append("The first payment date must be today or later")
+            elif end_date is not None and end_date < start_date:
+                errors.append("The end date must be after the first payment date")
+        except ValueError as e:
+            errors.append(str(e))
+
+        if errors:
+            context["errors"] = errors
+        else:
+            # Payments run with the next scheduler pass on their day
+            start_at = timezone.now() if start_date == timezone.localdate() else timezone.make_aware(
+                datetime.combine(start_date, time(6, 0))
+            )
+            order = ScheduledTransfer(
+                from_account=account,
+                to_account=receiver_account,
+                amount=amount,
+                frequency=form["frequency"],
+                start_at=start_at,
+                end_date=end_date,
+                description=form["description"][:255],
+            )
+            schedule(order)
+            order.save()
+            context.update({"success": True, "form": {}})
+
+    context["orders"] = account.scheduled_transfers.select_related("to_account__user").order_by("status", "next_run_at")
+    return render(request, "web/scheduled_transfers.html", context)
+
+@login_required
+def cancel_scheduled_transfer(request, order_id):
+    order = get_object_or_404(ScheduledTransfer, id=order_id, from_account__user=request.user)
+    if request.method == "POST":
+        # Conditional on the status, so it waits out a scheduler run holding the order and leaves a completed one alone
+        ScheduledTransfer.objects.filter(pk=order.pk, status="ACTIVE").update(status="CANCELLED", next_run_at=None)
+    return redirect("scheduled_transfers")